@@ -3,10 +3,13 @@ import json
 import time
 import random
 import math
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 import logging
 import os
+import threading
+import collections
+import statistics
 import paho.mqtt.client as mqtt
 
 
@@ -20,6 +23,23 @@ class MQTT_communicator:
         self.config = self.load_config(config_file)
         self.mqtt_client = None
         self.mqtt_connected = False
+        self.session_present = False
+        self._stopping = threading.Event()
+        self.on_connected = None  # optional callback, e.g. to flush queued publishes
+
+        # delivery tracking: mid → [event, sent_at, qos, acked_at] until on_publish confirms it
+        self.feed_qos = self.config["FEED_QOS"]
+        self.default_qos = self.config["DEFAULT_QOS"]
+        self.publish_timeout = self.config["PUBLISH_TIMEOUT"]
+        self._inflight = {}
+        self._early_acks = collections.OrderedDict()  # mid → ack time, confirmed before publish() returned
+        self._inflight_lock = threading.Lock()
+        self._latency = {0: collections.deque(maxlen=500), 1: collections.deque(maxlen=500)}
+        self.counters = {
+            "published": 0, "delivered": 0, "failed": 0,
+            "timeouts": 0, "lost": 0,
+        }
+
         self.setup_mqtt()
 
     def load_config(self, config_file):
@@ -34,7 +54,16 @@ class MQTT_communicator:
             "camera_enabled": True,
             "capturing_interval": 900,
             "flushing_interval": 10,
-            "sync_interval": 300
+            "sync_interval": 300,
+            # alerts must arrive (QoS 1, broker acknowledges); telemetry is fire-and-forget
+            "FEED_QOS": {"motion_feed": 1, "smoke_feed": 1},
+            "DEFAULT_QOS": 0,
+            "PUBLISH_TIMEOUT": 10,    # seconds to wait for a confirmation before the value is retried
+            "MQTT_CLIENT_ID": None,   # default: domisafe-<username>; must be stable for a persistent session
+            "MQTT_CLEAN_SESSION": False,
+            "RECONNECT_MIN_DELAY": 1,
+            "RECONNECT_MAX_DELAY": 120,
+            "ONLINE_FEED": "online_status"
         }
 
         try:
@@ -45,10 +74,19 @@ class MQTT_communicator:
             logger.warning(f"Config file {config_file} not found, using defaults")
             return default_config
 
+    def feed_topic(self, feed_name):
+        return f"{self.config['ADAFRUIT_IO_USERNAME']}/feeds/{feed_name}"
+
     def setup_mqtt(self):
-        """Setup MQTT client for Adafruit IO"""
+        """
+        Setup MQTT client for Adafruit IO and start paho's network thread.
+        Returns right away: connecting (and reconnecting) happens in the
+        background (connect_async + loop_start), so a Pi that boots before
+        Wi-Fi is up still connects once the network appears.
+        """
         try:
-            self.mqtt_client = mqtt.Client()
+            client_id = self.config["MQTT_CLIENT_ID"] or f"domisafe-{self.config['ADAFRUIT_IO_USERNAME']}"
+            self.mqtt_client = mqtt.Client(client_id=client_id, clean_session=self.config["MQTT_CLEAN_SESSION"])
             self.mqtt_client.username_pw_set(
                 self.config["ADAFRUIT_IO_USERNAME"],
                 self.config["ADAFRUIT_IO_KEY"]
@@ -56,16 +94,23 @@ class MQTT_communicator:
 
             self.mqtt_client.on_connect = self.on_mqtt_connect
             self.mqtt_client.on_disconnect = self.on_mqtt_disconnect
+            self.mqtt_client.on_connect_fail = self.on_mqtt_connect_fail
             self.mqtt_client.on_publish = self.on_mqtt_publish
 
+            # the broker marks us offline as soon as the connection drops without a clean disconnect
+            self.mqtt_client.will_set(self.feed_topic(self.config["ONLINE_FEED"]), "0", qos=1, retain=True)
 
-            self.mqtt_client.connect(
+            # paho waits min_delay before retrying, doubling up to max_delay; reset once connected.
+            # min_delay is picked at random once, so devices that lost the broker together
+            # don't all retry in step
+            min_delay = self.config["RECONNECT_MIN_DELAY"]
+            self.mqtt_client.reconnect_delay_set(random.uniform(min_delay, 2 * min_delay),
+                                                 self.config["RECONNECT_MAX_DELAY"])
+            self.mqtt_client.connect_async(
                 self.config["MQTT_BROKER"],
                 self.config["MQTT_PORT"],
                 self.config["MQTT_KEEPALIVE"]
             )
-
-
             self.mqtt_client.loop_start()
             logger.info("MQTT client setup completed")
 
@@ -73,11 +118,27 @@ class MQTT_communicator:
             logger.error(f"Failed to setup MQTT client: {e}")
             self.mqtt_connected = False
 
+    def shutdown(self):
+        """Publish offline status, disconnect cleanly and stop reconnecting."""
+        if self.mqtt_connected:
+            self.mqtt_client.publish(self.feed_topic(self.config["ONLINE_FEED"]), "0", qos=1, retain=True)
+        self._stopping.set()
+        self._release_waiters(lambda qos: True)
+        if self.mqtt_client:
+            self.mqtt_client.disconnect()
+            self.mqtt_client.loop_stop()
+
     def on_mqtt_connect(self, client, userdata, flags, rc):
         """Callback for when MQTT client connects"""
         if rc == 0:
             self.mqtt_connected = True
-            logger.info("Connected to MQTT broker")
+                # with a persistent session the broker kept our state: unacked QoS 1 messages resume
+            self.session_present = bool(flags.get("session present"))
+            logger.info(f"Connected to MQTT broker (session present: {self.session_present})")
+            # retained, so anyone subscribing later sees we're online
+            client.publish(self.feed_topic(self.config["ONLINE_FEED"]), "1", qos=1, retain=True)
+            if self.on_connected:
+                self.on_connected()
         else:
             self.mqtt_connected = False
             logger.error(f"Failed to connect to MQTT broker, return code {rc}")
@@ -85,29 +146,138 @@ class MQTT_communicator:
     def on_mqtt_disconnect(self, client, userdata, rc):
         """Callback for when MQTT client disconnects"""
         self.mqtt_connected = False
-        logger.warning("Disconnected from MQTT broker")
+        # paho drops unsent QoS 0 packets when it reconnects; only QoS 1 messages are re-sent
+        self._release_waiters(lambda qos: qos == 0)
+        if rc == 0 or self._stopping.is_set():
+            logger.info("Disconnected from MQTT broker")
+        else:
+            logger.warning(f"MQTT connection lost ({mqtt.error_string(rc)}), paho will reconnect")
+
+    def on_mqtt_connect_fail(self, client, userdata):
+        """Callback for when a (re)connect attempt fails, e.g. no network yet"""
+        self.mqtt_connected = False
+        if not self._stopping.is_set():
+            logger.warning("MQTT connect failed, paho will retry")
 
     def on_mqtt_publish(self, client, userdata, mid):
-        """Callback for when message is published"""
+        """Callback for when message is published (QoS 0: written out, QoS 1: PUBACK received)"""
+        now = time.monotonic()
+        with self._inflight_lock:
+            entry = self._inflight.pop(mid, None)
+            if entry is None:
+                # publish() hasn't returned the mid yet
+                self._early_acks[mid] = now
+                while self._early_acks and now - next(iter(self._early_acks.values())) > 5:
+                    self._early_acks.popitem(last=False)
+            else:
+                entry[3] = now
+        if entry is not None:
+            entry[0].set()
         logger.debug(f"Message {mid} published successfully")
 
+    @staticmethod
+    def payload(value, created_at=None):
+        """
+        The value alone, or Adafruit IO's JSON form carrying the time it was
+        measured (epoch seconds), so values sent late (after an outage)
+        are recorded at their real time rather than when they arrive.
+        """
+        if created_at is None:
+            return str(value)
+        ts = datetime.fromtimestamp(created_at, timezone.utc).isoformat(timespec="seconds")
+        return json.dumps({"value": value, "created_at": ts.replace("+00:00", "Z")})
+
+    def _release_waiters(self, which):
+        """Stop waiting for the in-flight publishes whose QoS matches `which`: they count as not delivered."""
+        with self._inflight_lock:
+            released = [mid for mid, entry in self._inflight.items() if which(entry[2])]
+            entries = [self._inflight.pop(mid) for mid in released]
+        for entry in entries:
+            entry[0].set()
+
+    def _publish_and_wait(self, topic, payload, qos):
+        """
+        Publish once and wait up to PUBLISH_TIMEOUT for on_publish. False
+        if it couldn't be queued, wasn't confirmed in time, or was lost to
+        a disconnect (QoS 0) or shutdown: the caller keeps the value and
+        retries it. A QoS 1 message stays with paho across a reconnect and
+        is re-sent by it (DUP flag), so a disconnect alone doesn't end the
+        wait for it; if it is confirmed only after the timeout, the retry
+        is a duplicate, which QoS 1 allows.
+        """
+        sent_at = time.monotonic()
+        result, mid = self.mqtt_client.publish(topic, payload, qos=qos)
+        # while offline paho still keeps a QoS 1 message, and sends it once connected
+        if result != mqtt.MQTT_ERR_SUCCESS and not (qos > 0 and result == mqtt.MQTT_ERR_NO_CONN):
+            logger.error(f"Failed to publish {payload} to {topic}, result={result}")
+            return False
+        self.counters["published"] += 1
+
+        entry = [threading.Event(), sent_at, qos, None]
+        with self._inflight_lock:
+            acked_at = self._early_acks.pop(mid, None)
+            if acked_at is None and qos == 0 and not self.mqtt_connected:
+                entry[0].set()  # disconnected before we got here: the packet is gone
+            elif acked_at is None:
+                self._inflight[mid] = entry
+
+        if acked_at is None:
+            if not entry[0].wait(self.publish_timeout):
+                with self._inflight_lock:
+                    self._inflight.pop(mid, None)
+            acked_at = entry[3]
+            if acked_at is None:
+                if entry[0].is_set():
+                    self.counters["lost"] += 1
+                    logger.warning(f"{payload} to {topic} (mid {mid}) lost to a disconnect, will retry")
+                else:
+                    self.counters["timeouts"] += 1
+                    logger.warning(f"No confirmation for {payload} to {topic} (mid {mid}) after "
+                                   f"{self.publish_timeout}s, will retry")
+                return False
+
+        latency = acked_at - sent_at
+        self._latency[qos].append(latency)
+        self.counters["delivered"] += 1
+        logger.info(f"Published {payload} to {topic} (qos {qos}, {latency * 1000:.0f} ms)")
+        return True
+
     # Send data to Adafruit IO
-    def send_to_adafruit_io(self, feed_name, value):
+    def send_to_adafruit_io(self, feed_name, value, created_at=None):
+        """
+        Publish and wait until it is confirmed: written to the socket for
+        QoS 0, acknowledged by the broker for QoS 1. Called from the
+        publish queue's single thread, one value at a time.
+        """
         if not self.mqtt_connected or not self.mqtt_client:
             logger.warning("MQTT client not connected")
             return False
 
-        try:   # send data to Adafruit using MQTT
+        qos = self.feed_qos.get(feed_name, self.default_qos)
+        topic = self.feed_topic(feed_name)
 
-            topic = f"{self.config['ADAFRUIT_IO_USERNAME']}/feeds/{feed_name}"
-            result, mid = self.mqtt_client.publish(topic, str(value))
-            if result == mqtt.MQTT_ERR_SUCCESS:
-                logger.info(f"Published {value} to {topic}")
-                return True
-            else:
-                logger.error(f"Failed to publish {value} to {topic}, result={result}")
-                return False
+        try:   # send data to Adafruit using MQTT
+            ok = self._publish_and_wait(topic, self.payload(value, created_at), qos)
+            if not ok:
+                self.counters["failed"] += 1
+            return ok
 
         except Exception as e:
+            self.counters["failed"] += 1
             logger.error(f"Error publishing to MQTT: {e}")
             return False
+
+    def publish_stats(self):
+        """Counters, in-flight count and delivery latency (ms) per QoS."""
+        stats = dict(self.counters, inflight=len(self._inflight))
+        for qos, samples in self._latency.items():
+            samples = sorted(samples)
+            if not samples:
+                continue
+            stats[f"qos{qos}_latency_ms"] = {
+                "n": len(samples),
+                "p50": round(statistics.median(samples) * 1000, 1),
+                "p95": round(samples[int(0.95 * (len(samples) - 1))] * 1000, 1),
+                "max": round(samples[-1] * 1000, 1),
+            }
+        return stats
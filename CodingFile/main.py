@@ -57,6 +57,9 @@ if __name__ == "__main__":
     from environmental_module import environmental_module
     from security_module import security_module
     from device_controle_module import device_controle_module
+    from publish_queue import PublishQueue
+    from outbox import Outbox
+    from scheduler import Scheduler
 
     # cloud feeds
     ENV_FEEDS = {
@@ -87,9 +90,25 @@ if __name__ == "__main__":
             self.security_data = security_module(config_file)
             self.device_controle = device_controle_module(config_file)
 
-            self.heartbeat_interval = 30
-            self.last_heartbeat = 0
-            self.online_feed = "online_status"
+            # publishes happen on their own thread, paced to Adafruit IO's rate limit;
+            # every reading goes through the on-disk outbox first, oldest sent first,
+            # so outages don't lose data.
+            outbox_path = self.config.get("OUTBOX_PATH")
+            self.publisher = PublishQueue(
+                self.mqtt_agent.send_to_adafruit_io,
+                rate_per_min=self.config.get("PUBLISH_RATE_PER_MIN", 30),
+                burst=self.config.get("PUBLISH_BURST", 5),
+                max_queue=self.config.get("PUBLISH_MAX_QUEUE", 100),
+                outbox=Outbox(outbox_path, max_rows=self.config.get("OUTBOX_MAX_ROWS", 50000)) if outbox_path else None,
+                max_age=self.config.get("OUTBOX_MAX_AGE"),
+            )
+            self.mqtt_agent.on_connected = self.publisher.wake  # drain right away on reconnect
+            self.publisher.start()
+            self.stats_interval = 300
+            self.security_counts = {"motion": 0, "smoke": 0}
+            self.alert_min_interval = self.config.get("ALERT_MIN_INTERVAL", 5)
+            self._last_alert = {}  # feed → monotonic time of the last immediate publish
+            self.scheduler = None
 
         def load_config(self, config_file):
             default_config = {
@@ -99,6 +118,13 @@ if __name__ == "__main__":
                 "MQTT_PORT": 1883,
                 "MQTT_KEEPALIVE": 60,
                 "flushing_interval": 10,
+                "PUBLISH_RATE_PER_MIN": 30,  # Adafruit IO free tier
+                "PUBLISH_BURST": 5,
+                "PUBLISH_MAX_QUEUE": 100,    # values held in memory: not yet on disk, or all when OUTBOX_PATH is null
+                "OUTBOX_PATH": "outbox.db",  # null: pending values kept in memory only
+                "OUTBOX_MAX_ROWS": 50000,
+                "OUTBOX_MAX_AGE": None,      # seconds: if set, older values are dropped instead of sent late
+                "ALERT_MIN_INTERVAL": 5,     # seconds between immediate alert publishes per feed
             }
             try:
                 with open(config_file, 'r') as f:
@@ -109,6 +135,7 @@ if __name__ == "__main__":
                 return default_config
 
         def send_to_cloud(self, data, feeds):
+            """Hand the fields to the publish queue; returns without waiting on the network."""
             ok = True
             ts = data.get("timestamp")
             logger.info(f"Processing reading from {ts}")
@@ -117,63 +144,74 @@ if __name__ == "__main__":
                 if field not in data:
                     continue
                 value = data[field]
-                sent = self.mqtt_agent.send_to_adafruit_io(feed_key, value)
-                if not sent:
-                    logger.warning(f"Failed to send {field}={value} to {feed_key}")
+                if not self.publisher.put(feed_key, value):
+                    logger.warning(f"Publish store unavailable, {field}={value} not queued for {feed_key}")
                     ok = False
-                time.sleep(0.5)
             return ok
 
-        def collect_environmental_data(self, current_time, timers, file_handle):
-            if current_time - timers["env_check"] >= self.env_interval:
-                env_data = self.env_data.get_environmental_data()
-                file_handle.write(json.dumps(env_data) + "\n")
-
-                if self.send_to_cloud(env_data, ENV_FEEDS):
-                    logger.info("Environmental data sent to cloud")
-                else:
-                    logger.info("Offline, env data saved locally. Will sync later.")
-                logger.info(f"Environmental data: {env_data}")
-
-                timers["env_check"] = current_time
-
-        def collect_security_data(self, current_time, timers, security_counts, file_handle):
-            if current_time - timers["security_check"] >= self.security_check_interval:
-                sec_data = self.security_data.get_security_data()
+        def collect_environmental_data(self, file_handle):
+            env_data = self.env_data.get_environmental_data()
+            file_handle.write(json.dumps(env_data) + "\n")
+
+            if self.send_to_cloud(env_data, ENV_FEEDS):
+                logger.info("Environmental data queued for cloud")
+            else:
+                logger.info("Publish store unavailable, env data only saved to the local file.")
+            logger.info(f"Environmental data: {env_data}")
+
+        def publish_alert(self, feed, count):
+            """
+            IMMEDIATE publish of a cumulative count so the dashboard updates right away,
+            at most every ALERT_MIN_INTERVAL s per feed: motion is reported on every 1 s
+            sample while something is in range, which alone would exceed the 30/min budget.
+            The count is cumulative, so skipping some of them loses nothing.
+            """
+            now = time.monotonic()
+            last = self._last_alert.get(feed)
+            if last is not None and now - last < self.alert_min_interval:
+                return
+            self._last_alert[feed] = now
+            self.publisher.put(feed, count)
+
+        def collect_security_data(self, file_handle):
+            security_counts = self.security_counts
+            sec_data = self.security_data.get_security_data()
 
             if sec_data.get("motion_detected"):
                 security_counts["motion"] += 1
-                # IMMEDIATE publish of cumulative count so dashboard updates right away
-                self.mqtt_agent.send_to_adafruit_io("motion_feed", security_counts["motion"])
+                self.publish_alert("motion_feed", security_counts["motion"])
                 logger.info(f"Motion detected! Total: {security_counts['motion']}")
 
             if sec_data.get("smoke_detected"):
                 security_counts["smoke"] += 1
-                self.mqtt_agent.send_to_adafruit_io("smoke_feed", security_counts["smoke"])
+                self.publish_alert("smoke_feed", security_counts["smoke"])
                 logger.info(f"Smoke detected! Total: {security_counts['smoke']}")
 
             if sec_data.get("motion_detected") or sec_data.get("smoke_detected"):
                 file_handle.write(json.dumps(sec_data) + "\n")
 
-            timers["security_check"] = current_time
+        def send_security_summary(self):
+            security_counts = self.security_counts
+            summary = {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "motion_count": security_counts["motion"],
+                "smoke_count": security_counts["smoke"],
+            }
 
-            if current_time - timers["security_send"] >= self.security_send_interval:
-                summary = {
-                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
-                    "motion_count": security_counts["motion"],
-                    "smoke_count": security_counts["smoke"],
-                }
+            if self.send_to_cloud(summary, SECURITY_FEEDS):
+                logger.info(
+                    f"Security summary queued: {security_counts['motion']} motion, {security_counts['smoke']} smoke"
+                )
+            else:
+                logger.warning("Failed to queue security summary")
 
-                if self.send_to_cloud(summary, SECURITY_FEEDS):
-                    logger.info(
-                        f"Security summary sent: {security_counts['motion']} motion, {security_counts['smoke']} smoke"
-                    )
-                else:
-                    logger.warning("Failed to send security summary")
+            security_counts["motion"] = 0
+            security_counts["smoke"] = 0
 
-                security_counts["motion"] = 0
-                security_counts["smoke"] = 0
-                timers["security_send"] = current_time
+        def log_stats(self):
+            logger.info(f"Publish queue: {self.publisher.stats()}")
+            logger.info(f"MQTT delivery: {self.mqtt_agent.publish_stats()}")
+            logger.info(f"Scheduler: {self.scheduler.stats()}")
 
         def data_collection_loop(self):
             timestamp = time.strftime("%Y%m%d")
@@ -192,43 +230,28 @@ if __name__ == "__main__":
                     open(sec_file, "a", buffering=1) as f_sec, \
                     open(dev_file, "a", buffering=1) as f_dev:
 
-                last_fsync = time.time()
-
-                timers = {
-                    "env_check": 0,
-                    "security_check": 0,
-                    "security_send": 0,
-                }
-
-                security_counts = {"motion": 0, "smoke": 0}
-
-                while self.running:
-                    try:
-                        now = time.time()
-
-                        self.collect_security_data(now, timers, security_counts, f_sec)
-                        self.collect_environmental_data(now, timers, f_env)
-
-                        flush_interval = self.config.get("flushing_interval", 10)
-                        if now - last_fsync > flush_interval:
-                            for fh in (f_env, f_sec, f_dev):
-                                fh.flush()
-                                os.fsync(fh.fileno())
-                            last_fsync = now
-                        # --- heartbeat every N seconds ---
-                        if now - self.last_heartbeat >= self.heartbeat_interval:
-                            # publish a simple heartbeat value; epoch time is handy
-                            self.mqtt_agent.send_to_adafruit_io("heartbeat", int(now))
-                            # optional explicit status (lets you use a green/red Indicator block)
-                            self.mqtt_agent.send_to_adafruit_io(self.online_feed, 1)
-                            self.last_heartbeat = now
-                        # ---------------------------------
-
-                        time.sleep(self.security_check_interval)
-
-                    except Exception as e:
-                        logger.error(f"Error in data collection loop: {e}", exc_info=True)
-                        time.sleep(5)
+                def fsync_files():
+                    for fh in (f_env, f_sec, f_dev):
+                        fh.flush()
+                        os.fsync(fh.fileno())
+
+                # security sampling and the summary (they share security_counts) stay on the
+                # scheduler thread; the DHT read (retries up to ~5 s) and fsync go to workers,
+                # so they can't delay motion checks
+                self.scheduler = Scheduler(workers=2)
+                self.scheduler.add("security", lambda: self.collect_security_data(f_sec),
+                                   period=self.security_check_interval)
+                self.scheduler.add("security_summary", self.send_security_summary,
+                                   period=self.security_send_interval, offset=self.security_send_interval)
+                self.scheduler.add("environment", lambda: self.collect_environmental_data(f_env),
+                                   period=self.env_interval, deadline=10, on_worker=True)
+                self.scheduler.add("fsync", fsync_files,
+                                   period=self.config.get("flushing_interval", 10), on_worker=True)
+                # online_status is handled by MQTT_communicator (retained message + Last Will)
+                self.scheduler.add("stats", self.log_stats,
+                                   period=self.stats_interval, offset=self.stats_interval)
+
+                self.scheduler.run(lambda: self.running)
 
         def start_background(self):
             t = threading.Thread(target=self.data_collection_loop, daemon=True)
@@ -373,8 +396,6 @@ if __name__ == "__main__":
     app = DomiSafeApp(config_file="./config.json")
     data_thread = app.start_background()
 
-    app.mqtt_agent.send_to_adafruit_io("online_status", 1)
-
     gpio_init_all()
     lcd = LCDManager(env_module=app.env_data, refresh_secs=5)
 
@@ -386,7 +407,8 @@ if __name__ == "__main__":
     finally:
         app.running = False
         data_thread.join(timeout=5)
+        app.publisher.stop()
 
         GPIO.cleanup()
 
-        app.mqtt_agent.send_to_adafruit_io("online_status", 0)
+        app.mqtt_agent.shutdown()  # retained online_status=0, clean disconnect
@@ -0,0 +1,123 @@
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Outbox:
+    """
+    Durable FIFO of feed values waiting to be published, in a SQLite file.
+
+    Every reading is kept, in one append-only table, and published oldest
+    first (by rowid, which follows created_at since values are appended
+    in the order they were taken). Nothing is merged or expired here.
+    Only if the file holds `max_rows` values (a very long outage) are the
+    oldest ones dropped, and counted.
+
+    WAL mode with synchronous=FULL: a committed row survives a power cut
+    and a half-written one never shows up. A row is deleted once the
+    broker has it (ack); compact() checkpoints the WAL back into the main
+    file and returns the freed pages, so the file doesn't keep growing
+    after a long outage has drained.
+
+    Safe to use from several threads (one connection behind a lock); in
+    PublishQueue only its writer thread appends and only its publisher
+    thread reads and acks.
+    """
+
+    def __init__(self, path, max_rows=50000, compact_every=500):
+        self.path = path
+        self.max_rows = max_rows
+        self.compact_every = compact_every
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # only effective on a new file
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " feed TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._adopt_latest_table()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+        self._acked = 0
+        if self._count:
+            logger.info(f"Outbox {path}: {self._count} unsent values from a previous run")
+
+    def _adopt_latest_table(self):
+        """Values left in the one-per-feed `latest` table of an older version join the FIFO."""
+        if not self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'latest'"
+        ).fetchone():
+            return
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._conn.execute(
+            "INSERT INTO outbox (feed, value, created_at) "
+            "SELECT feed, value, created_at FROM latest ORDER BY created_at"
+        )
+        self._conn.execute("DROP TABLE latest")
+        self._conn.execute("COMMIT")
+
+    def __len__(self):
+        return self._count
+
+    def put_many(self, items):
+        """
+        Append [(feed, value, created_at), ...] in one transaction.
+        Returns how many old rows were dropped to stay under max_rows.
+        """
+        if not items:
+            return 0
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.executemany(
+                    "INSERT INTO outbox (feed, value, created_at) VALUES (?, ?, ?)",
+                    [(feed, str(value), created_at) for feed, value, created_at in items],
+                )
+                dropped = max(0, self._count + len(items) - self.max_rows)
+                if dropped:
+                    # out of room after a very long outage: the oldest values go first
+                    cur.execute(
+                        "DELETE FROM outbox WHERE id IN (SELECT id FROM outbox ORDER BY id LIMIT ?)",
+                        (dropped,),
+                    )
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            self._count += len(items) - dropped
+            return dropped
+
+    def peek(self):
+        """(id, feed, value, created_at) of the oldest row, or None when empty."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, feed, value, created_at FROM outbox ORDER BY id LIMIT 1"
+            ).fetchone()
+
+    def ack(self, row_id):
+        """The row was published (or expired): remove it."""
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM outbox WHERE id = ?", (row_id,)).rowcount
+            self._count -= deleted
+            self._acked += deleted
+            due = self._acked >= self.compact_every
+        if due:
+            self.compact()
+
+    def compact(self):
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.execute("PRAGMA incremental_vacuum")
+            self._acked = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,258 @@
+import collections
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """`rate_per_min` tokens per minute, at most `burst` saved up."""
+
+    def __init__(self, rate_per_min=30, burst=5):
+        self.rate = rate_per_min / 60.0
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        """Seconds until a token is available (0 if one is available now)."""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def take(self):
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class MemoryStore:
+    """
+    In-memory pending values, same interface as outbox.Outbox minus the
+    durability: every value kept, oldest first. Beyond `max_rows` the
+    oldest are dropped.
+    """
+
+    def __init__(self, max_rows=100):
+        self.max_rows = max_rows
+        self._pending = collections.deque()  # (id, feed, value, created_at)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def put_many(self, items):
+        dropped = 0
+        with self._lock:
+            for feed, value, created_at in items:
+                self._pending.append((next(self._ids), feed, value, created_at))
+                if len(self._pending) > self.max_rows:
+                    self._pending.popleft()
+                    dropped += 1
+        return dropped
+
+    def peek(self):
+        with self._lock:
+            return self._pending[0] if self._pending else None
+
+    def ack(self, row_id):
+        with self._lock:
+            if self._pending and self._pending[0][0] == row_id:
+                self._pending.popleft()
+
+
+class PublishQueue:
+    """
+    Publishes feed values from background threads so the collection loop
+    never waits on the network, the disk or the rate limit.
+
+    - put(feed, value) only appends to a small staging list and returns
+    - a writer thread moves staged values into the store (an Outbox on
+      disk, or a MemoryStore) in batches, one transaction each
+    - the publisher thread sends every stored value, oldest first, with
+      the time it was put (created_at), so values sent after an outage
+      keep their real time
+    - sends are paced by a token bucket (Adafruit IO free tier: 30/min)
+    - a value is removed from the store only once `send_fn` confirmed it;
+      when a send fails, it is retried after `retry_delay`, or as soon as
+      wake() is called (on reconnect)
+    - nothing expires unless `max_age` (seconds) is set: then values older
+      than that are dropped instead of sent, and counted as "expired"
+
+    send_fn(feed, value, created_at) → True once delivered, False to retry.
+    """
+
+    def __init__(self, send_fn, rate_per_min=30, burst=5, max_queue=100, retry_delay=5.0, outbox=None,
+                 max_age=None):
+        self.send_fn = send_fn
+        self.bucket = TokenBucket(rate_per_min, burst)
+        self.store = outbox if outbox is not None else MemoryStore(max_queue)
+        self.max_queue = max_queue
+        self.retry_delay = retry_delay
+        self.max_age = max_age
+
+        self.sent = 0
+        self.dropped = 0
+        self.expired = 0
+        self.failed = 0
+
+        self._staged = []  # [(feed, value, created_at)] not yet in the store
+        self._staged_cond = threading.Condition()
+        self._retry_at = 0.0
+        self._woken = False  # stored or wake() since the publisher last looked
+        self._cond = threading.Condition()
+        self._running = False
+        self._writer = None
+        self._thread = None
+
+    def put(self, feed, value):
+        """Queue a value for `feed`. False if it was dropped (staging full)."""
+        with self._staged_cond:
+            if len(self._staged) >= self.max_queue:
+                self.dropped += 1
+                logger.warning(f"Publish queue full, dropped {feed}={value}")
+                return False
+            self._staged.append((feed, value, time.time()))
+            self._staged_cond.notify()
+            return True
+
+    def wake(self):
+        """Retry right away instead of waiting out `retry_delay` (e.g. after a reconnect)."""
+        with self._cond:
+            self._retry_at = 0.0
+            self._woken = True
+            self._cond.notify()
+
+    @property
+    def depth(self):
+        with self._staged_cond:
+            staged = len(self._staged)
+        return len(self.store) + staged
+
+    def stats(self):
+        return {
+            "depth": self.depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "expired": self.expired,
+            "failed": self.failed,
+        }
+
+    # ---------------------------------------------------------
+    def start(self):
+        self._running = True
+        self._writer = threading.Thread(target=self._write, name="publish-writer", daemon=True)
+        self._thread = threading.Thread(target=self._run, name="publish-queue", daemon=True)
+        self._writer.start()
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Store what is staged, then try to send what is left for up to `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        with self._staged_cond:
+            self._running = False
+            self._staged_cond.notify()
+        if self._writer is not None:
+            self._writer.join(timeout=timeout)
+        if self._thread is not None:
+            self._thread.join(timeout=max(0.0, deadline - time.monotonic()))
+
+    def _write(self):
+        while True:
+            with self._staged_cond:
+                while not self._staged and self._running:
+                    self._staged_cond.wait()
+                if not self._staged:
+                    break
+                items = list(self._staged)
+            try:
+                dropped = self.store.put_many(items)
+            except Exception as e:
+                logger.error(f"Publish store error: {e}")
+                with self._staged_cond:
+                    if self._running:
+                        self._staged_cond.wait(self.retry_delay)
+                        continue
+                    # shutting down and the store is failing: these are lost
+                    del self._staged[:len(items)]
+                    self.dropped += len(items)
+                    continue
+            with self._staged_cond:
+                del self._staged[:len(items)]
+            if dropped:
+                self.dropped += dropped
+                logger.warning(f"Publish store full, dropped {dropped} old values")
+            self._notify()
+        self._notify()  # the publisher may be waiting for this thread to finish
+
+    def _notify(self):
+        with self._cond:
+            self._woken = True
+            self._cond.notify()
+
+    def _wait(self, timeout=None):
+        with self._cond:
+            if self._woken:
+                self._woken = False
+                return
+            self._cond.wait(timeout)
+            self._woken = False
+
+    def _run(self):
+        while True:
+            try:
+                row = self.store.peek()
+            except Exception as e:
+                logger.error(f"Publish store error: {e}")
+                self._wait(self.retry_delay)
+                continue
+
+            if row is None:
+                if not self._running and not self._writer.is_alive():
+                    return  # everything staged was stored and sent
+                self._wait()
+                continue
+
+            row_id, feed, value, created_at = row
+            if self.max_age is not None and time.time() - created_at > self.max_age:
+                self.expired += 1
+                logger.warning(f"Dropped {feed}={value}, {time.time() - created_at:.0f}s old")
+                self.store.ack(row_id)
+                continue
+
+            offline_for = self._retry_at - time.monotonic()
+            if offline_for > 0 and not self._running:
+                return  # shutting down: what's left stays in the store
+            wait = max(offline_for, self.bucket.wait_time())
+            if wait > 0:
+                self._wait(wait)
+                continue
+            self.bucket.take()
+
+            ok = False
+            try:
+                ok = self.send_fn(feed, value, created_at)
+            except Exception as e:
+                logger.error(f"Publishing {feed}={value} failed: {e}")
+
+            if ok:
+                self.sent += 1
+                self.store.ack(row_id)
+            else:
+                self.failed += 1
+                self._retry_at = time.monotonic() + self.retry_delay
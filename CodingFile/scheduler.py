@@ -0,0 +1,128 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class Task:
+    def __init__(self, name, fn, period, deadline=None, on_worker=False):
+        self.name = name
+        self.fn = fn
+        self.period = period
+        self.deadline = deadline if deadline is not None else period
+        self.on_worker = on_worker
+
+        self.running = False  # worker tasks: previous run not finished yet
+        self.runs = 0
+        self.errors = 0
+        self.overruns = 0     # took longer than `deadline`
+        self.skipped = 0      # periods dropped because it was late or still running
+        self.max_late = 0.0   # worst start delay after the due time (jitter)
+        self.total_late = 0.0
+        self.max_duration = 0.0
+        self.last_duration = 0.0
+
+    def stats(self):
+        return {
+            "runs": self.runs,
+            "errors": self.errors,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "avg_late_ms": round(self.total_late / self.runs * 1000, 1) if self.runs else None,
+            "max_late_ms": round(self.max_late * 1000, 1),
+            "last_ms": round(self.last_duration * 1000, 1),
+            "max_ms": round(self.max_duration * 1000, 1),
+        }
+
+
+class Scheduler:
+    """
+    Runs periodic tasks off a heap of due times on the monotonic clock.
+
+    Due times advance by exactly one period from the previous due time,
+    so a task's cadence doesn't drift with how long it or the others
+    take; periods that were missed entirely are skipped (and counted)
+    rather than run back to back. Quick tasks run on the scheduler
+    thread; `on_worker` tasks (slow I/O: sensor retries, fsync...) go
+    to a small thread pool so they can't hold the quick ones up. A
+    worker task that is still running when it comes due again is
+    skipped.
+    """
+
+    def __init__(self, workers=2):
+        self._heap = []
+        self._seq = itertools.count()
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="task")
+
+    def add(self, name, fn, period, deadline=None, offset=0.0, on_worker=False):
+        """Run `fn()` every `period` seconds, first after `offset` seconds."""
+        task = Task(name, fn, period, deadline, on_worker)
+        self._tasks[name] = task
+        heapq.heappush(self._heap, (time.monotonic() + offset, next(self._seq), task))
+        return task
+
+    def stats(self):
+        with self._lock:
+            return {name: task.stats() for name, task in self._tasks.items()}
+
+    def run(self, keep_running, max_sleep=1.0):
+        """Run tasks until `keep_running()` is false (checked at least every `max_sleep` s)."""
+        try:
+            while keep_running():
+                due, _, task = self._heap[0]
+                now = time.monotonic()
+                if due > now:
+                    time.sleep(min(due - now, max_sleep))
+                    continue
+                heapq.heappop(self._heap)
+
+                if task.on_worker:
+                    if task.running:
+                        with self._lock:
+                            task.skipped += 1
+                    else:
+                        task.running = True
+                        self._pool.submit(self._execute, task, due)
+                else:
+                    self._execute(task, due)
+
+                # next due time from the schedule, not from now: no drift
+                next_due = due + task.period
+                now = time.monotonic()
+                if next_due <= now:
+                    missed = int((now - next_due) // task.period) + 1
+                    next_due += missed * task.period
+                    with self._lock:
+                        task.skipped += missed
+                heapq.heappush(self._heap, (next_due, next(self._seq), task))
+        finally:
+            self._pool.shutdown(wait=True)  # let running worker tasks finish
+
+    def _execute(self, task, due):
+        start = time.monotonic()
+        try:
+            task.fn()
+            failed = False
+        except Exception as e:
+            failed = True
+            logger.error(f"Task {task.name} failed: {e}", exc_info=True)
+        duration = time.monotonic() - start
+
+        with self._lock:
+            late = start - due
+            task.runs += 1
+            task.errors += failed
+            task.total_late += late
+            task.max_late = max(task.max_late, late)
+            task.last_duration = duration
+            task.max_duration = max(task.max_duration, duration)
+            if duration > task.deadline:
+                task.overruns += 1
+                logger.warning(f"Task {task.name} overran its {task.deadline}s deadline ({duration:.2f}s)")
+            task.running = False
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules import each other flat (`from outbox import Outbox`), as main.py runs them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,129 @@
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+import pytest
+
+from MQTT_communicator import MQTT_communicator
+
+
+class FakeClient:
+    """Records publishes; confirms them only when told to (or right away with `ack_inline`)."""
+
+    def __init__(self, comm, ack_inline=False):
+        self.comm = comm
+        self.ack_inline = ack_inline
+        self.published = []
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        mid = len(self.published) + 1
+        self.published.append((topic, payload, qos))
+        if self.ack_inline:
+            self.comm.on_mqtt_publish(self, None, mid)
+        return mqtt.MQTT_ERR_SUCCESS, mid
+
+    def disconnect(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+
+@pytest.fixture
+def comm(monkeypatch, tmp_path):
+    monkeypatch.setattr(MQTT_communicator, "setup_mqtt", lambda self: None)
+    comm = MQTT_communicator(str(tmp_path / "missing.json"))
+    comm.mqtt_client = FakeClient(comm)
+    comm.mqtt_connected = True
+    comm.publish_timeout = 0.2
+    return comm
+
+
+def _send_in_background(comm, feed):
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("ok", comm.send_to_adafruit_io(feed, 1)))
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not comm.mqtt_client.published and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return thread, result
+
+
+def test_unconfirmed_publish_times_out_and_is_left_for_a_retry(comm):
+    started = time.monotonic()
+    assert comm.send_to_adafruit_io("temperature", 21) is False
+    assert time.monotonic() - started < 2
+    assert len(comm.mqtt_client.published) == 1   # not re-published from here
+    assert comm.counters["timeouts"] == 1
+    assert comm._inflight == {}
+
+
+def test_qos0_wait_ends_on_disconnect(comm):
+    comm.publish_timeout = 30
+    thread, result = _send_in_background(comm, "temperature")
+    comm.on_mqtt_disconnect(comm.mqtt_client, None, mqtt.MQTT_ERR_CONN_LOST)
+    thread.join(timeout=5)
+    assert result == {"ok": False}
+    assert comm.counters["lost"] == 1
+
+
+def test_qos1_is_confirmed_after_a_reconnect(comm):
+    comm.publish_timeout = 30
+    thread, result = _send_in_background(comm, "motion_feed")
+    comm.on_mqtt_disconnect(comm.mqtt_client, None, mqtt.MQTT_ERR_CONN_LOST)
+    assert thread.is_alive()   # paho re-sends it after reconnecting
+    comm.on_mqtt_publish(comm.mqtt_client, None, 1)
+    thread.join(timeout=5)
+    assert result == {"ok": True}
+    assert comm.mqtt_client.published[0][2] == 1
+
+
+def test_confirmation_before_publish_returns(comm):
+    comm.mqtt_client.ack_inline = True
+    assert comm.send_to_adafruit_io("temperature", 21, created_at=0) is True
+    assert comm.mqtt_client.published == [
+        ("username/feeds/temperature", '{"value": 21, "created_at": "1970-01-01T00:00:00Z"}', 0)]
+    assert comm.counters["delivered"] == 1
+
+
+def test_shutdown_releases_waiters(comm):
+    comm.publish_timeout = 30
+    thread, result = _send_in_background(comm, "motion_feed")
+    comm.shutdown()
+    thread.join(timeout=5)
+    assert result == {"ok": False}
+
+
+class SetupClient:
+    """Stands in for mqtt.Client in setup_mqtt: records the calls, never connects."""
+
+    def __init__(self, *args, **kwargs):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args))
+
+
+def test_reconnect_backoff_is_left_to_paho_with_a_random_min_delay(monkeypatch, tmp_path):
+    import MQTT_communicator as module
+
+    monkeypatch.setattr(module.mqtt, "Client", SetupClient)
+    delays = set()
+    for _ in range(5):
+        comm = MQTT_communicator(str(tmp_path / "missing.json"))
+        (args,) = [args for name, args in comm.mqtt_client.calls if name == "reconnect_delay_set"]
+        min_delay, max_delay = args
+        assert 1 <= min_delay <= 2 and max_delay == 120
+        delays.add(min_delay)
+        assert [name for name, _ in comm.mqtt_client.calls][-2:] == ["connect_async", "loop_start"]
+    assert len(delays) > 1
+
+
+def test_connection_callbacks_do_not_block(comm):
+    comm.config["RECONNECT_MIN_DELAY"] = 60
+    started = time.monotonic()
+    for _ in range(3):
+        comm.on_mqtt_disconnect(comm.mqtt_client, None, mqtt.MQTT_ERR_CONN_LOST)
+        comm.on_mqtt_connect_fail(comm.mqtt_client, None)
+    assert time.monotonic() - started < 0.5
+    assert comm.mqtt_connected is False
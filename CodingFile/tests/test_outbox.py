@@ -0,0 +1,182 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from outbox import Outbox
+from publish_queue import MemoryStore, PublishQueue
+
+
+@pytest.fixture(params=["outbox", "memory"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryStore(max_rows=100)
+        return
+    outbox = Outbox(str(tmp_path / "outbox.db"), max_rows=100)
+    yield outbox
+    outbox.close()
+
+
+def _drain(store):
+    sent = []
+    while (row := store.peek()) is not None:
+        row_id, feed, value, created_at = row
+        sent.append((feed, str(value)))
+        store.ack(row_id)
+    return sent
+
+
+def test_every_reading_is_kept_in_order(store):
+    store.put_many([
+        ("temperature", 21, 1.0),
+        ("motion_feed", 1, 2.0),
+        ("temperature", 22, 3.0),
+        ("temperature", 23, 4.0),
+    ])
+    assert len(store) == 4
+    assert _drain(store) == [
+        ("temperature", "21"),
+        ("motion_feed", "1"),
+        ("temperature", "22"),
+        ("temperature", "23"),
+    ]
+    assert len(store) == 0
+
+
+def test_oldest_values_are_dropped_when_full(store):
+    dropped = store.put_many([("temperature", i, float(i)) for i in range(120)])
+    assert dropped == 20
+    assert [v for _, v in _drain(store)] == [str(i) for i in range(20, 120)]
+
+
+def test_outbox_replays_after_restart(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    outbox = Outbox(path)
+    outbox.put_many([("motion_feed", 1, 10.0), ("temperature", 21.5, 11.0)])
+    row_id = outbox.peek()[0]
+    outbox.close()   # crashed before the broker acked
+
+    outbox = Outbox(path)
+    assert len(outbox) == 2
+    assert outbox.peek() == (row_id, "motion_feed", "1", 10.0)
+    assert _drain(outbox) == [("motion_feed", "1"), ("temperature", "21.5")]
+    outbox.close()
+    assert len(Outbox(path)) == 0
+
+
+def test_values_of_the_old_latest_table_are_kept(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE latest (feed TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)")
+    conn.executemany("INSERT INTO latest VALUES (?, ?, ?)", [("humidity", "40", 2.0), ("temperature", "21", 1.0)])
+    conn.commit()
+    conn.close()
+
+    outbox = Outbox(path)
+    assert _drain(outbox) == [("temperature", "21"), ("humidity", "40")]
+    outbox.close()
+    tables = sqlite3.connect(path).execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+    assert ("latest",) not in tables
+
+
+class RecordingStore(MemoryStore):
+    def __init__(self):
+        super().__init__(max_rows=1000)
+        self.writers = set()
+
+    def put_many(self, items):
+        self.writers.add(threading.current_thread().name)
+        return super().put_many(items)
+
+
+def _queue(store, send, **kwargs):
+    kwargs.setdefault("rate_per_min", 6000)
+    kwargs.setdefault("burst", 100)
+    kwargs.setdefault("retry_delay", 0.05)
+    return PublishQueue(send, outbox=store, **kwargs)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_put_does_not_write_on_the_callers_thread():
+    store = RecordingStore()
+    queue = _queue(store, lambda feed, value, created_at: True)
+    for i in range(5):
+        assert queue.put("temperature", i)
+    assert len(store) == 0 and queue.depth == 5   # only staged so far
+
+    queue.start()
+    assert _wait_for(lambda: queue.sent == 5)
+    queue.stop()
+    assert store.writers == {"publish-writer"}
+
+
+def test_staging_is_bounded():
+    queue = _queue(RecordingStore(), lambda feed, value, created_at: True, max_queue=3)
+    assert [queue.put("temperature", i) for i in range(5)] == [True, True, True, False, False]
+    assert queue.dropped == 2
+
+
+def test_queue_replays_every_value_with_its_timestamp_once_online(store):
+    online = threading.Event()
+    sent = []
+
+    def send(feed, value, created_at):
+        if not online.is_set():
+            return False
+        sent.append((feed, value, created_at))
+        return True
+
+    queue = _queue(store, send)
+    queue.start()
+    for i in range(10):
+        queue.put("temperature", i)
+    queue.put("motion_feed", 1)
+    assert _wait_for(lambda: len(store) == 11)
+    stamp = store.peek()[3]
+    time.sleep(0.1)
+    assert sent == [] and len(store) == 11   # nothing is removed until it was delivered
+
+    online.set()
+    queue.wake()
+    assert _wait_for(lambda: len(sent) == 11)
+    assert [(f, str(v)) for f, v, _ in sent] == [("temperature", str(i)) for i in range(10)] + [("motion_feed", "1")]
+    assert sent[0][2] == stamp
+    assert _wait_for(lambda: queue.depth == 0)
+    queue.stop()
+
+
+def test_old_values_are_sent_unless_max_age_is_set(store):
+    store.put_many([("motion_feed", 1, time.time() - 3600), ("motion_feed", 2, time.time())])
+    sent = []
+    queue = _queue(store, lambda feed, value, created_at: sent.append(str(value)) or True)
+    queue.start()
+    assert _wait_for(lambda: queue.depth == 0)
+    queue.stop()
+    assert sent == ["1", "2"] and queue.expired == 0
+
+    store.put_many([("motion_feed", 3, time.time() - 3600), ("motion_feed", 4, time.time())])
+    sent.clear()
+    queue = _queue(store, lambda feed, value, created_at: sent.append(str(value)) or True, max_age=600)
+    queue.start()
+    assert _wait_for(lambda: queue.depth == 0)
+    queue.stop()
+    assert sent == ["4"] and queue.expired == 1
+
+
+def test_stop_stores_what_is_staged(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    outbox = Outbox(path)
+    queue = _queue(outbox, lambda feed, value, created_at: False)
+    queue.start()
+    queue.put("temperature", 21)
+    queue.stop(timeout=0.5)
+    outbox.close()
+
+    assert _drain(Outbox(path)) == [("temperature", "21")]
@@ -0,0 +1,36 @@
+import time
+
+from publish_queue import PublishQueue, TokenBucket
+
+
+def test_bucket_allows_a_burst_then_paces():
+    bucket = TokenBucket(rate_per_min=60, burst=3)
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+    assert 0 < bucket.wait_time() <= 1.0
+
+    bucket.updated -= 1.0   # a second later: one more token
+    assert bucket.take() is True
+    assert bucket.take() is False
+
+
+def test_bucket_saves_up_at_most_burst():
+    bucket = TokenBucket(rate_per_min=60, burst=2)
+    bucket.updated -= 3600
+    assert bucket.wait_time() == 0.0
+    assert [bucket.take() for _ in range(3)] == [True, True, False]
+
+
+def test_sends_are_paced_by_the_rate_limit():
+    sent = []
+    queue = PublishQueue(lambda feed, value, created_at: sent.append(time.monotonic()) or True,
+                         rate_per_min=600, burst=1)   # one every 0.1 s
+    queue.start()
+    for i in range(4):
+        queue.put("temperature", i)
+    deadline = time.monotonic() + 5
+    while len(sent) < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    queue.stop()
+
+    assert len(sent) == 4
+    assert sent[-1] - sent[0] >= 0.25
@@ -0,0 +1,76 @@
+import threading
+import time
+
+from scheduler import Scheduler
+
+
+def _run_until(scheduler, done, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    scheduler.run(lambda: not done() and time.monotonic() < deadline, max_sleep=0.01)
+
+
+def test_tasks_run_in_due_time_order():
+    calls = []
+    scheduler = Scheduler()
+    scheduler.add("a", lambda: calls.append("a"), period=0.1)
+    scheduler.add("b", lambda: calls.append("b"), period=0.1, offset=0.03)
+    scheduler.add("c", lambda: calls.append("c"), period=0.1, offset=0.06)
+    _run_until(scheduler, lambda: len(calls) >= 9)
+
+    assert calls[:9] == ["a", "b", "c"] * 3
+
+
+def test_faster_task_runs_more_often():
+    calls = []
+    scheduler = Scheduler()
+    scheduler.add("fast", lambda: calls.append("fast"), period=0.02)
+    scheduler.add("slow", lambda: calls.append("slow"), period=0.1, offset=0.01)
+    _run_until(scheduler, lambda: calls.count("slow") >= 3)
+
+    assert calls.count("fast") >= 3 * calls.count("slow") - 5
+
+
+def test_missed_periods_are_skipped_not_replayed():
+    calls = []
+    scheduler = Scheduler()
+    # the slow task holds the scheduler thread for 5 periods of "tick"
+    scheduler.add("tick", lambda: calls.append("tick"), period=0.02)
+    scheduler.add("slow", lambda: time.sleep(0.1), period=10, offset=0.005)
+    _run_until(scheduler, lambda: len(calls) >= 3)
+
+    stats = scheduler.stats()
+    assert stats["tick"]["skipped"] >= 3
+    assert stats["tick"]["runs"] == len(calls)
+
+
+def test_worker_task_still_running_is_skipped():
+    release = threading.Event()
+    starts = []
+    scheduler = Scheduler(workers=2)
+    scheduler.add("io", lambda: starts.append(1) or release.wait(5), period=0.02, on_worker=True)
+    task = scheduler._tasks["io"]
+
+    def done():
+        if task.skipped < 3:
+            return False
+        release.set()   # run() waits for worker tasks before returning
+        return True
+
+    _run_until(scheduler, done)
+
+    assert len(starts) == 1
+    assert scheduler.stats()["io"]["runs"] == 1
+
+
+def test_failing_task_is_counted_and_keeps_its_schedule():
+    calls = []
+
+    def boom():
+        calls.append(1)
+        raise RuntimeError("sensor gone")
+
+    scheduler = Scheduler()
+    scheduler.add("boom", boom, period=0.02)
+    _run_until(scheduler, lambda: len(calls) >= 3)
+
+    assert scheduler.stats()["boom"]["errors"] == len(calls)
@@ -1,5 +1,4 @@
-from flask import Flask, render_template, jsonify, request
-import requests
+from flask import Flask, Blueprint, render_template, jsonify, request, Response, stream_with_context, url_for, send_file
 import json
 import datetime as dt
 from datetime import timedelta
@@ -7,18 +6,39 @@ import pytz
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import os
 
-from db import SessionLocal, init_db
-from models import EnvironmentData, MotionEvent
-
-
+from sqlalchemy import text
+
+import db as database
+from db import get_db, session_scope, init_db, get_engine
+from models import MotionEvent
+from feed_cache import FeedCache
+from feed_history import FeedHistory
+from upstream import AdafruitClient, CircuitBreaker
+from live_stream import LiveBroadcaster
+from ingest import FeedIngestor
+from write_behind import WriteBehindBuffer
+from response_cache import ResponseCache
+from shared_state import make_state_store
+from commands import CommandDispatcher, MqttPublisher
+import metrics
+import rollups
+import downsample
+import export
+import retention
+import migrations
+import images
+
+
+import atexit
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # -------------------------------------------------------------
 # INIT
 # -------------------------------------------------------------
-app = Flask(__name__)
-init_db()
+# Routes live on a blueprint; the Flask app itself is built by create_app()
+bp = Blueprint("main", __name__)
 
 # Try Windows-safe timezone load
 try:
@@ -42,6 +62,9 @@ try:
         CONFIG = json.load(f)
 except FileNotFoundError:
     CONFIG = {}  # no local file → fine, we'll use env vars / defaults
+except ValueError as e:
+    print("[CONFIG] config.json is not valid JSON, ignoring it:", e)
+    CONFIG = {}
 
 # Adafruit credentials:
 #   - first try config.json (local dev)
@@ -57,6 +80,24 @@ DEVICES = CONFIG.get("devices") or DEFAULT_DEVICES
 BASE_URL = f"https://io.adafruit.com/api/v2/{USERNAME}"
 HEADERS = {"X-AIO-Key": AIO_KEY}
 
+# Upstream client tuning (seconds / counts), config.json or env vars
+UPSTREAM_CONNECT_TIMEOUT = float(CONFIG.get("UPSTREAM_CONNECT_TIMEOUT") or os.getenv("UPSTREAM_CONNECT_TIMEOUT") or 3.05)
+UPSTREAM_READ_TIMEOUT = float(CONFIG.get("UPSTREAM_READ_TIMEOUT") or os.getenv("UPSTREAM_READ_TIMEOUT") or 10)
+UPSTREAM_MAX_RETRIES = int(CONFIG.get("UPSTREAM_MAX_RETRIES") or os.getenv("UPSTREAM_MAX_RETRIES") or 2)
+UPSTREAM_BREAKER_THRESHOLD = int(CONFIG.get("UPSTREAM_BREAKER_THRESHOLD") or os.getenv("UPSTREAM_BREAKER_THRESHOLD") or 5)
+UPSTREAM_BREAKER_RESET = float(CONFIG.get("UPSTREAM_BREAKER_RESET") or os.getenv("UPSTREAM_BREAKER_RESET") or 30)
+
+upstream = metrics.InstrumentedClient(AdafruitClient(
+    BASE_URL,
+    HEADERS,
+    connect_timeout=UPSTREAM_CONNECT_TIMEOUT,
+    read_timeout=UPSTREAM_READ_TIMEOUT,
+    max_retries=UPSTREAM_MAX_RETRIES,
+    breaker=CircuitBreaker(UPSTREAM_BREAKER_THRESHOLD, UPSTREAM_BREAKER_RESET),
+))
+
+ENV_SENSORS = ("temperature", "humidity", "pressure")
+
 # Correct feed names from your dashboard
 FEED_MAP = {
     "temperature": "temperature",
@@ -65,156 +106,228 @@ FEED_MAP = {
     "motion": "motion-feed"
 }
 
-last_motion_ts = None
-last_env_store_ts = None
+# Feed cache: every dashboard tab polls every 5 s, so share upstream reads.
+#   - FEED_CACHE_TTL: seconds a read is served as fresh
+#   - FEED_CACHE_STALE: extra seconds a read is served while refreshing in background
+FEED_CACHE_TTL = float(CONFIG.get("FEED_CACHE_TTL") or os.getenv("FEED_CACHE_TTL") or 4)
+FEED_CACHE_STALE = float(CONFIG.get("FEED_CACHE_STALE") or os.getenv("FEED_CACHE_STALE") or 30)
+
+# Live push stream: one producer per process, polling at these intervals (seconds)
+LIVE_STREAM_INTERVAL = float(CONFIG.get("LIVE_STREAM_INTERVAL") or os.getenv("LIVE_STREAM_INTERVAL") or 1)
+LIVE_STREAM_SECURITY_INTERVAL = float(CONFIG.get("LIVE_STREAM_SECURITY_INTERVAL") or os.getenv("LIVE_STREAM_SECURITY_INTERVAL") or 5)
+LIVE_STREAM_MAX_SECONDS = float(CONFIG.get("LIVE_STREAM_MAX_SECONDS") or os.getenv("LIVE_STREAM_MAX_SECONDS") or 300)
+
+# MQTT ingestion (Adafruit IO → DB), independent of page views
+MQTT_BROKER = CONFIG.get("MQTT_BROKER") or os.getenv("MQTT_BROKER") or "io.adafruit.com"
+MQTT_PORT = int(CONFIG.get("MQTT_PORT") or os.getenv("MQTT_PORT") or 1883)
+INGEST_ENABLED = str(CONFIG.get("INGEST_ENABLED") or os.getenv("INGEST_ENABLED") or "true").lower() == "true"
+INGEST_FLUSH_INTERVAL = float(CONFIG.get("INGEST_FLUSH_INTERVAL") or os.getenv("INGEST_FLUSH_INTERVAL") or 5)
+INGEST_FLUSH_ROWS = int(CONFIG.get("INGEST_FLUSH_ROWS") or os.getenv("INGEST_FLUSH_ROWS") or 500)
+INGEST_MAX_QUEUE = int(CONFIG.get("INGEST_MAX_QUEUE") or os.getenv("INGEST_MAX_QUEUE") or 10000)
 ENV_STORE_INTERVAL_MIN = 5
 
-motion_active_until = None
-current_motion_bucket = None
-motion_bucket_count = 0
-
-is_armed = False
+# Device commands: published over one persistent MQTT connection (REST when it's down)
+COMMANDS_VIA_MQTT = str(CONFIG.get("COMMANDS_VIA_MQTT") or os.getenv("COMMANDS_VIA_MQTT") or "true").lower() == "true"
+COMMAND_PUBLISH_TIMEOUT = float(CONFIG.get("COMMAND_PUBLISH_TIMEOUT") or os.getenv("COMMAND_PUBLISH_TIMEOUT") or 5)
+
+# History responses: closed days are immutable, cache them hard (bytes / minutes / seconds)
+HISTORY_CACHE_MAX_BYTES = int(CONFIG.get("HISTORY_CACHE_MAX_BYTES") or os.getenv("HISTORY_CACHE_MAX_BYTES") or 8 * 1024 * 1024)
+HISTORY_CLOSED_GRACE_MIN = int(CONFIG.get("HISTORY_CLOSED_GRACE_MIN") or os.getenv("HISTORY_CLOSED_GRACE_MIN") or 10)
+HISTORY_CLOSED_MAX_AGE = 7 * 24 * 3600
+HISTORY_OPEN_MAX_AGE = 30
+
+# History ranges: longest range accepted (days, rollups are kept 90) and points per chart
+HISTORY_MAX_RANGE_DAYS = int(CONFIG.get("HISTORY_MAX_RANGE_DAYS") or os.getenv("HISTORY_MAX_RANGE_DAYS") or 90)
+HISTORY_DEFAULT_POINTS = int(CONFIG.get("HISTORY_DEFAULT_POINTS") or os.getenv("HISTORY_DEFAULT_POINTS") or 300)
+HISTORY_MIN_POINTS = 10
+HISTORY_MAX_POINTS = 2000
+
+# Export: rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = int(CONFIG.get("EXPORT_BATCH_SIZE") or os.getenv("EXPORT_BATCH_SIZE") or 1000)
+
+# Captured images (the Pi's captured_images, or a copy kept in sync, see README)
+# and where their resized versions are cached
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_DIR = CONFIG.get("IMAGE_DIR") or os.getenv("IMAGE_DIR") or os.path.join(APP_DIR, "captured_images")
+IMAGE_CACHE_DIR = CONFIG.get("IMAGE_CACHE_DIR") or os.getenv("IMAGE_CACHE_DIR") or os.path.join(APP_DIR, "image_cache")
+IMAGE_MAX_AGE = 365 * 24 * 3600  # versioned URLs (?v=<name/mtime/size tag>) never change
+IMAGE_PAGE_MAX = 100
+
+# DB warm keeper: connections kept hot (0 = off) and ping interval in seconds.
+# Keeps the first query after idle fast, but also keeps Neon from suspending.
+DB_WARM_CONNECTIONS = int(CONFIG.get("DB_WARM_CONNECTIONS") or os.getenv("DB_WARM_CONNECTIONS") or 0)
+DB_WARM_INTERVAL = float(CONFIG.get("DB_WARM_INTERVAL") or os.getenv("DB_WARM_INTERVAL") or 240)
+
+# Retention: raw rows (daily partitions on Postgres) and 5-min rollups, in days
+RETENTION_DAYS = int(CONFIG.get("RETENTION_DAYS") or os.getenv("RETENTION_DAYS") or 7)
+ROLLUP_RETENTION_DAYS = int(CONFIG.get("ROLLUP_RETENTION_DAYS") or os.getenv("ROLLUP_RETENTION_DAYS") or 90)
+# run once a day (claimed through the shared state, so by one worker); checked hourly
+RETENTION_INTERVAL = 24 * 3600
+RETENTION_CHECK_INTERVAL = 3600
+
+# Shared state: "db" keeps armed flag / ingest claims consistent across gunicorn workers,
+# "memory" is enough for a single process (flask run)
+STATE_BACKEND = str(CONFIG.get("STATE_BACKEND") or os.getenv("STATE_BACKEND") or "db").lower()
+
+# Metrics of every worker added up on /metrics: a directory shared by the workers
+# (set by gunicorn.conf.py); unset → this process only
+METRICS_MULTIPROC_DIR = CONFIG.get("METRICS_MULTIPROC_DIR") or os.getenv("METRICS_MULTIPROC_DIR")
+
+# Schema: applied by `python migrations.py` (deploy step); set true to also run it at startup
+# (in the background warm-up, never on import)
+MIGRATE_ON_STARTUP = str(CONFIG.get("MIGRATE_ON_STARTUP") or os.getenv("MIGRATE_ON_STARTUP") or "false").lower() == "true"
+
+# Process-wide services, wired by create_app()
+state = None
+ingestor = None
+commands = None
 
 
 # -------------------------------------------------------------
 # HELPERS
 # -------------------------------------------------------------
+def fetch_latest(feed_key):
+    """Uncached upstream read of the newest data point of a feed."""
+    r = upstream.get(f"feeds/{feed_key}/data", params={"limit": 1})
+    r.raise_for_status()
+    arr = r.json()
+    return arr[0] if arr else None
+
+
+feed_cache = FeedCache(fetch_latest, ttl=FEED_CACHE_TTL, stale_ttl=FEED_CACHE_STALE)
+
+# one thread per feed so a combined refresh costs ~one upstream round trip
+live_pool = ThreadPoolExecutor(max_workers=len(FEED_MAP), thread_name_prefix="live-feed")
+
+
 def get_latest(feed_key, max_age_minutes=5):
     try:
-        url = f"{BASE_URL}/feeds/{feed_key}/data?limit=1"
-        r = requests.get(url, headers=HEADERS)
-        if r.status_code == 200:
-            arr = r.json()
-            if not arr:
-                return None
-
-            latest = arr[0]
-            ts = latest.get("created_at")
-            if not ts:
-                return latest  # no timestamp, just return
-
-            created = dt.datetime.fromisoformat(ts.replace("Z", "+00:00")).astimezone(LOCAL_TZ)
-            age_sec = (dt.datetime.now(LOCAL_TZ) - created).total_seconds()
-
-            if age_sec > max_age_minutes * 60:
-                # too old → treat as offline
-                return None
-
-            return latest
-        return None
+        latest = feed_cache.get(feed_key)
+        if not latest:
+            return None
+
+        ts = latest.get("created_at")
+        if not ts:
+            return latest  # no timestamp, just return
+
+        created = dt.datetime.fromisoformat(ts.replace("Z", "+00:00")).astimezone(LOCAL_TZ)
+        age_sec = (dt.datetime.now(LOCAL_TZ) - created).total_seconds()
+
+        if age_sec > max_age_minutes * 60:
+            # too old → treat as offline
+            return None
+
+        return latest
     except Exception as e:
         print("get_latest error:", e)
         return None
 
 
-def get_last_hour_from_feed(feed_key):
-    url = f"{BASE_URL}/feeds/{feed_key}/data"
-    params = {"limit": 200, "include": "created_at,value"}
-    r = requests.get(url, headers=HEADERS, params=params)
-    if r.status_code != 200:
-        return []
-
-    raw = r.json()
-    out = []
-
-    now = dt.datetime.now(LOCAL_TZ)
-    one_hour_ago = now - dt.timedelta(hours=1)
+def get_latest_many(sensors):
+    """get_latest() for several sensors at once → {sensor: latest or None}."""
+    futures = {s: live_pool.submit(get_latest, FEED_MAP[s]) for s in sensors}
+    return {s: f.result() for s, f in futures.items()}
 
-    for row in raw:
-        ts = row.get("created_at")
-        if not ts:
-            continue
 
-        dt_utc = dt.datetime.fromisoformat(ts.replace("Z", "+00:00"))
-        dt_local = dt_utc.astimezone(LOCAL_TZ)
+def format_buckets(buckets, ndigits=None, time_format="%H:%M"):
+    """[(bucket_start_utc, value), ...] → [{"time": "HH:MM" local, "value": ...}, ...]"""
+    return [{
+        "time": b.astimezone(LOCAL_TZ).strftime(time_format),
+        "value": round(v, ndigits) if ndigits is not None else v
+    } for b, v in buckets]
 
-        if dt_local < one_hour_ago:
-            continue
 
-        try:
-            value = float(row["value"])
-        except ValueError:
-            value = row["value"]
+feed_history = FeedHistory(upstream, window=dt.timedelta(hours=1), min_interval=FEED_CACHE_TTL)
 
-        out.append({
-            "time": dt_local.strftime("%H:%M"),
-            "value": value
-        })
 
-    out.sort(key=lambda x: x["time"])
+def get_last_hour_from_feed(feed_key):
+    """Last hour of a feed straight from Adafruit, first point of each 5-min bucket."""
+    now = dt.datetime.now(LOCAL_TZ)
+    try:
+        points = feed_history.points_since(feed_key, now - dt.timedelta(hours=1))
+    except Exception as e:
+        print("get_last_hour_from_feed error:", e)
+        return []
 
-    # 5-min bucket
     filtered = []
     used = set()
 
-    for p in out:
-        minute = int(p["time"].split(":")[1])
-        bucket = (minute // 5) * 5
-        bucket_key = (p["time"].split(":")[0], bucket)
+    for ts, value in points:
+        local = ts.astimezone(LOCAL_TZ)
+        bucket_key = (local.hour, (local.minute // 5) * 5)
 
         if bucket_key not in used:
-            filtered.append(p)
+            filtered.append({
+                "time": local.strftime("%H:%M"),
+                "value": value
+            })
             used.add(bucket_key)
 
     return filtered
 
 
-def store_environment_snapshot(values):
-    global last_env_store_ts
-    now = dt.datetime.now(LOCAL_TZ)
-
-    if last_env_store_ts and (now - last_env_store_ts).total_seconds() < ENV_STORE_INTERVAL_MIN * 60:
-        return
-
-    last_env_store_ts = now
-
-    db = SessionLocal()
-    db.add(EnvironmentData(
-        temperature=values["temperature"],
-        humidity=values["humidity"],
-        pressure=values["pressure"]
-    ))
-    db.commit()
-    db.close()
-
+def on_feed_reading(sensor, latest):
+    """MQTT push from the ingestor → refresh the cache and the live stream now."""
+    feed_cache.put(FEED_MAP[sensor], latest)
+    live_broadcaster.refresh("live")
 
-def store_motion_event(image_path=None):
-    global last_motion_ts
-    now = dt.datetime.now(LOCAL_TZ)
 
-    if last_motion_ts and (now - last_motion_ts).total_seconds() < 15:
-        return
+def start_ingest():
+    if not INGEST_ENABLED or not USERNAME or not AIO_KEY:
+        print("[INGEST] Disabled (INGEST_ENABLED=false or missing Adafruit credentials)")
+        return None
 
-    last_motion_ts = now
-    db = SessionLocal()
-    db.add(MotionEvent(timestamp=now, image_path=image_path))
-    db.commit()
-    db.close()
+    writer = WriteBehindBuffer(
+        get_engine(),
+        max_batch=INGEST_FLUSH_ROWS,
+        max_delay=INGEST_FLUSH_INTERVAL,
+        max_queue=INGEST_MAX_QUEUE,
+        on_flush=rollups.apply,
+    )
+    ingestor = FeedIngestor(
+        USERNAME,
+        AIO_KEY,
+        FEED_MAP,
+        writer,
+        LOCAL_TZ,
+        broker=MQTT_BROKER,
+        port=MQTT_PORT,
+        env_store_interval_min=ENV_STORE_INTERVAL_MIN,
+        on_reading=on_feed_reading,
+        state=state,
+    )
+    writer.start()
+    ingestor.start()
+
+    # atexit runs in reverse: stop receiving first, then flush what is queued
+    atexit.register(writer.stop)
+    atexit.register(ingestor.stop)
+    return ingestor
 
 
 # -------------------------------------------------------------
 # ROUTES — HTML PAGES
 # -------------------------------------------------------------
-@app.route("/")
+@bp.route("/")
 def home_page():
     return render_template("home.html")
 
 
-@app.route("/environment")
+@bp.route("/environment")
 def environment_page():
     return render_template("environment.html")
 
 
-@app.route("/security")
+@bp.route("/security")
 def security_page():
     return render_template("security.html")
 
 
-@app.route("/controls")
+@bp.route("/controls")
 def controls_page():
     return render_template("controls.html")
 
-@app.route("/about")
+@bp.route("/about")
 def about_page():
     # Pass datetime for dynamic copyright year in footer
     return render_template("about.html", project_name=PROJECT_NAME, now=dt.datetime.now)
@@ -223,7 +336,7 @@ def about_page():
 # -------------------------------------------------------------
 # LIVE SENSOR API
 # -------------------------------------------------------------
-@app.route("/api/live/<sensor>")
+@bp.route("/api/live/<sensor>")
 def api_live(sensor):
     if sensor not in FEED_MAP:
         return jsonify({"error": "invalid sensor"}), 400
@@ -233,107 +346,53 @@ def api_live(sensor):
     if latest is None:
         return jsonify({"value": None})
 
-    if sensor in ("temperature", "humidity", "pressure"):
-        try:
-            store_environment_snapshot({
-                "temperature": float(get_latest(FEED_MAP["temperature"])["value"]),
-                "humidity": float(get_latest(FEED_MAP["humidity"])["value"]),
-                "pressure": float(get_latest(FEED_MAP["pressure"])["value"])
-            })
-        except:
-            pass
-
-    if sensor == "motion":
-        try:
-            motion_value = float(latest["value"])
-            now = dt.datetime.now(LOCAL_TZ)
-
-            global motion_active_until, current_motion_bucket, motion_bucket_count
-
-            # ----------- 5–MIN BUCKET (always fixed by the clock) -----------
-            bucket_minute = (now.minute // 5) * 5
-            new_bucket = f"{now.hour:02d}:{bucket_minute:02d}"
-
-            # If bucket changed → reset everything including cooldown
-            if new_bucket != current_motion_bucket:
-                current_motion_bucket = new_bucket
-                motion_bucket_count = 0
-                motion_active_until = None  # <<< IMPORTANT FIX
+    return jsonify(latest)
 
-            if motion_value > 0:
-                # NEW motion detected → store
-                store_motion_event()
-                motion_bucket_count += 1
-                motion_active_until = now + dt.timedelta(seconds=15)
 
-            elif motion_active_until and now <= motion_active_until:
-                # STILL SAME session → ignore, no new store
-                pass
+@bp.route("/api/live/all")
+def api_live_all():
+    """Latest value of every feed in one payload, fetched in parallel."""
+    return jsonify(live_snapshot())
 
-        except Exception as e:
-            print("Motion logic error:", e)
 
-    return jsonify(latest)
+def live_snapshot():
+    return get_latest_many(FEED_MAP)
 
 
 # -------------------------------------------------------------
 # LIVE LAST HOUR (Adafruit → DB)
 # -------------------------------------------------------------
-@app.route("/api/live/hour/<sensor>")
+@bp.route("/api/live/hour/<sensor>")
 def api_live_hour(sensor):
     if sensor not in FEED_MAP:
         return jsonify({"error": "invalid sensor"}), 400
 
+    # ?source=adafruit → the feed itself (e.g. ingest not running), kept in memory
+    if request.args.get("source") == "adafruit":
+        return jsonify(get_last_hour_from_feed(FEED_MAP[sensor]))
+
     now = dt.datetime.now(LOCAL_TZ)
     start = now - dt.timedelta(hours=1)
 
-    db = SessionLocal()
+    db = get_db()
 
-    # --- MOTION SPECIAL LOGIC ---
+    # --- MOTION: count per 5-min bucket, including current unfinished one ---
     if sensor == "motion":
-        rows = db.query(MotionEvent).filter(
-            MotionEvent.timestamp >= start,
-            MotionEvent.timestamp <= now
-        ).all()
-        db.close()
-
-        # Build dynamic buckets, including current unfinished one
-        buckets = {}
-
-        for r in rows:
-            ts = r.timestamp.astimezone(LOCAL_TZ)
-            bucket = ts.replace(
-                minute=(ts.minute // 5) * 5,
-                second=0,
-                microsecond=0
-            )
-            key = bucket.strftime("%H:%M")
-            buckets[key] = buckets.get(key, 0) + 1
-
-        result = [{
-            "time": k,
-            "value": v
-        } for k, v in sorted(buckets.items())]
-
-        return jsonify(result)
-
-    # --- ENVIRONMENT (unchanged) ---
-    rows = db.query(EnvironmentData).filter(
-        EnvironmentData.timestamp >= start,
-        EnvironmentData.timestamp <= now
-    ).all()
-    db.close()
-
-    return jsonify([{
-        "time": r.timestamp.astimezone(LOCAL_TZ).strftime("%H:%M"),
-        "value": getattr(r, sensor)
-    } for r in rows])
-
-
-@app.route("/api/status/security")
+        buckets = rollups.motion_buckets(db, start, now)
+        return jsonify(format_buckets(buckets))
+
+    # --- ENVIRONMENT: average per 5-min bucket ---
+    buckets = rollups.environment_buckets(db, sensor, start, now)
+    return jsonify(format_buckets(buckets, ndigits=2))
+
+
+@bp.route("/api/status/security")
 def api_status_security():
     """Returns the current armed state and recent event counts for the Home page summary (3 min max)."""
-    db = SessionLocal()
+    return jsonify(security_status())
+
+
+def security_status():
     now = dt.datetime.now(LOCAL_TZ)
 
     # OLD: one_day_ago = now - dt.timedelta(days=1)
@@ -341,33 +400,33 @@ def api_status_security():
     three_minutes_ago = now - dt.timedelta(minutes=3)
 
     # Get motion event count in the last 3 minutes
-    motion_count = db.query(MotionEvent).filter(
-        MotionEvent.timestamp >= three_minutes_ago,
-        MotionEvent.timestamp <= now
-    ).count()
-    db.close()
+    # (also called from the live stream thread, outside any request)
+    with session_scope() as db:
+        motion_count = db.query(MotionEvent).filter(
+            MotionEvent.timestamp >= three_minutes_ago,
+            MotionEvent.timestamp <= now
+        ).count()
 
     # Smoke count is a placeholder since no smoke feed/model was provided
     smoke_count = 0
 
-    return jsonify({
-        "armed_status": is_armed,
+    return {
+        "armed_status": state.get("security.armed", False),
         "motion_count": motion_count,
         "smoke_count": smoke_count,
-    })
+    }
 
 
-@app.post("/api/control/security")
+@bp.post("/api/control/security")
 def api_control_security():
     """Sets the armed state of the security system."""
-    global is_armed
     action = request.args.get("action")
 
     if action == "arm":
-        is_armed = True
+        armed = True
         message = "Security system armed."
     elif action == "disarm":
-        is_armed = False
+        armed = False
         message = "Security system disarmed."
     else:
         return jsonify({
@@ -375,96 +434,331 @@ def api_control_security():
             "error": "Invalid action. Must be 'arm' or 'disarm'."
         }), 400
 
+    state.set("security.armed", armed)
     print(f"[SECURITY] Status changed to: {action.upper()}")
+    if live_broadcaster.client_count:
+        live_broadcaster.publish("security", security_status())
     return jsonify({
         "success": True,
         "message": message,
-        "armed_status": is_armed
+        "armed_status": armed
     })
 
 # -------------------------------------------------------------
-# DB HISTORY BY DATE — ENVIRONMENT
+# LIVE PUSH STREAM (SSE)
 # -------------------------------------------------------------
-@app.get("/api/history_db/environment")
-def history_db_environment():
+def last_command():
+    """Newest device command status change, whichever worker made it."""
+    return state.get("command.last") if state is not None else None
+
+
+live_broadcaster = LiveBroadcaster({
+    "live": (live_snapshot, LIVE_STREAM_INTERVAL),
+    "security": (security_status, LIVE_STREAM_SECURITY_INTERVAL),
+    "command": (last_command, LIVE_STREAM_INTERVAL),
+})
+
+
+@bp.route("/api/stream")
+def api_stream():
+    """
+    Server-Sent Events: `live` (same payload as /api/live/all),
+    `security` (same payload as /api/status/security) and `command`
+    (latest device command status), pushed on change.
+    Connections are recycled every LIVE_STREAM_MAX_SECONDS; EventSource
+    reconnects by itself. Each open stream holds a server thread: run
+    under threaded workers (gunicorn.conf.py), never sync ones.
+    """
+    return Response(
+        stream_with_context(live_broadcaster.stream(LIVE_STREAM_MAX_SECONDS)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    sensor = request.args.get("sensor")
-    date = request.args.get("date")
 
-    if not sensor or not date:
-        return jsonify({"error": "sensor and date required"}), 400
+# -------------------------------------------------------------
+# HISTORY RESPONSE CACHE
+# -------------------------------------------------------------
+history_cache = ResponseCache(max_bytes=HISTORY_CACHE_MAX_BYTES)
+
+
+def history_response(key, end, compute):
+    """
+    JSON response for a history query covering data up to `end`.
+
+    Once `end` is more than HISTORY_CLOSED_GRACE_MIN in the past, nothing
+    new can land in that window: the body is cached server-side (LRU,
+    memory bound) and sent with a long, immutable Cache-Control. Windows
+    still open get a short max-age. Both carry a strong content ETag, so
+    repeat requests with If-None-Match get a 304.
+    """
+    closed = dt.datetime.now(LOCAL_TZ) >= end + dt.timedelta(minutes=HISTORY_CLOSED_GRACE_MIN)
+
+    hit = history_cache.get(key) if closed else None
+    if hit is not None:
+        body, etag = hit
+    else:
+        body = json.dumps(compute()).encode("utf-8")
+        etag = history_cache.put(key, body) if closed else ResponseCache.etag_for(body)
+
+    resp = Response(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.cache_control.public = True
+    if closed:
+        resp.cache_control.max_age = HISTORY_CLOSED_MAX_AGE
+        resp.cache_control.immutable = True
+    else:
+        resp.cache_control.max_age = HISTORY_OPEN_MAX_AGE
+    return resp.make_conditional(request)
+
 
-    session = SessionLocal()
+# -------------------------------------------------------------
+# HISTORY RANGE PARAMETERS
+# -------------------------------------------------------------
+def _parse_bound(value, is_end):
+    """'YYYY-MM-DD' → local midnight (the day after, for an inclusive end); full ISO → as is."""
+    parsed = dt.datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=LOCAL_TZ)
+    if is_end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def history_range():
+    """
+    (start, end, points, time_format) from the query string, or raises ValueError.
+
+    Either ?date=YYYY-MM-DD (one local day) or ?start=...&end=... (dates,
+    end inclusive, or ISO datetimes). ?points caps the number of points
+    returned; multi-day ranges get dated labels.
+    """
+    args = request.args
+    date = args.get("date")
+    start_arg = args.get("start") or date
+    end_arg = args.get("end") or date
+    if not start_arg or not end_arg:
+        raise ValueError("date, or start and end, required")
 
     try:
-        start = dt.datetime.fromisoformat(date).replace(tzinfo=LOCAL_TZ)
-        end = start + timedelta(days=1)
+        start = _parse_bound(start_arg, is_end=False)
+        end = _parse_bound(end_arg, is_end=True)
+    except ValueError:
+        raise ValueError("invalid date")
 
-        rows = session.query(EnvironmentData).filter(
-            EnvironmentData.timestamp >= start,
-            EnvironmentData.timestamp < end
-        ).order_by(EnvironmentData.timestamp).all()
+    if end <= start:
+        raise ValueError("end must be after start")
+    if end - start > timedelta(days=HISTORY_MAX_RANGE_DAYS):
+        raise ValueError(f"range limited to {HISTORY_MAX_RANGE_DAYS} days")
 
-        buckets = {}
+    try:
+        points = int(args.get("points") or HISTORY_DEFAULT_POINTS)
+    except ValueError:
+        raise ValueError("invalid points")
+    points = max(HISTORY_MIN_POINTS, min(points, HISTORY_MAX_POINTS))
 
-        for r in rows:
-            ts = r.timestamp.astimezone(LOCAL_TZ)
-            bucket = ts.replace(minute=(ts.minute // 5) * 5, second=0, microsecond=0)
-            key = bucket.strftime("%H:%M")
+    time_format = "%H:%M" if end - start <= timedelta(days=1) else "%m-%d %H:%M"
+    return start, end, points, time_format
 
-            value = getattr(r, sensor)
-            if value is None:
-                continue
 
-            buckets.setdefault(key, []).append(value)
+# -------------------------------------------------------------
+# DB HISTORY BY DATE / RANGE — ENVIRONMENT
+# -------------------------------------------------------------
+@bp.get("/api/history_db/environment")
+def history_db_environment():
 
-        result = [{
-            "time": k,
-            "value": round(sum(v) / len(v), 2)
-        } for k, v in sorted(buckets.items())]
+    sensor = request.args.get("sensor")
+    if not sensor:
+        return jsonify({"error": "sensor required"}), 400
+
+    if sensor not in ENV_SENSORS:
+        return jsonify({"error": "invalid sensor"}), 400
+
+    try:
+        start, end, points, time_format = history_range()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        return jsonify(result)
+    def compute():
+        session = get_db()
+        # days without rollups (recorded before they existed) → GROUP BY over the raw rows
+        buckets = rollups.environment_history(session, sensor, start, end)
+        # LTTB keeps the shape of the curve (peaks, dips) within the point budget
+        return format_buckets(downsample.lttb(buckets, points), ndigits=2, time_format=time_format)
 
-    finally:
-        session.close()
+    key = ("environment", sensor, start.isoformat(), end.isoformat(), points)
+    return history_response(key, end, compute)
 
 
 # -------------------------------------------------------------
 # DB HISTORY — MOTION
 # -------------------------------------------------------------
-@app.get("/api/history_db/motion")
+@bp.get("/api/history_db/motion")
 def api_history_motion_db():
 
-    date = request.args.get("date")
-    if not date:
-        return jsonify({"error": "date required"}), 400
+    try:
+        start, end, points, time_format = history_range()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def compute():
+        db = get_db()
+        # days without rollups (recorded before they existed) → GROUP BY over the raw rows
+        buckets = rollups.motion_history(db, start, end)
+        # counts: merge into wider buckets (summed) rather than picking samples
+        buckets, _ = downsample.sum_rebucket(buckets, start, end, points, rollups.BUCKET_SECONDS)
+        return format_buckets(buckets, time_format=time_format)
+
+    key = ("motion", None, start.isoformat(), end.isoformat(), points)
+    return history_response(key, end, compute)
+
+
+# -------------------------------------------------------------
+# RAW EXPORT (streamed NDJSON / CSV)
+# -------------------------------------------------------------
+@bp.get("/api/export/<kind>")
+def api_export(kind):
+    """
+    /api/export/environment|motion?start=&end=&format=ndjson|csv&gzip=1
+
+    Every raw row in the range (both bounds optional), streamed from a
+    server-side cursor; nothing is buffered beyond one fetch batch.
+    """
+    if kind not in export.EXPORT_MODELS:
+        return jsonify({"error": "invalid export"}), 400
+
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in export.FORMATS:
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+
+    try:
+        start = _parse_bound(request.args["start"], is_end=False) if request.args.get("start") else None
+        end = _parse_bound(request.args["end"], is_end=True) if request.args.get("end") else None
+    except ValueError:
+        return jsonify({"error": "invalid date"}), 400
+
+    compress = request.args.get("gzip", "").lower() in ("1", "true", "yes")
+    filename = f"{kind}.{fmt}" + (".gz" if compress else "")
+
+    body = export.stream(get_engine(), kind, fmt, start, end, compress, batch_size=EXPORT_BATCH_SIZE)
+    resp = Response(stream_with_context(body),
+                    mimetype="application/gzip" if compress else export.FORMATS[fmt])
+    resp.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+# -------------------------------------------------------------
+# CAPTURED IMAGES
+# -------------------------------------------------------------
+image_store = images.ImageStore(IMAGE_DIR, IMAGE_CACHE_DIR)
+
+
+def image_info(name, mtime, size_bytes):
+    # from the directory listing alone: no file is opened to list a page
+    version = images.version_of(name, mtime, size_bytes)
+    return {
+        "name": name,
+        "taken_at": dt.datetime.fromtimestamp(mtime, LOCAL_TZ).isoformat(),
+        "bytes": size_bytes,
+        "urls": {
+            size: url_for(".api_image", name=name, size=size, v=version)
+            for size in (*images.SIZES, "original")
+        },
+    }
+
+
+@bp.get("/api/images")
+def api_images():
+    """Newest first: ?page=1&per_page=24"""
+    try:
+        page = max(1, int(request.args.get("page", 1)))
+        per_page = max(1, min(int(request.args.get("per_page", 24)), IMAGE_PAGE_MAX))
+    except ValueError:
+        return jsonify({"error": "invalid page"}), 400
+
+    entries, total = image_store.page(page, per_page)
+    return jsonify({
+        "images": [image_info(*e) for e in entries],
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "pages": (total + per_page - 1) // per_page,
+    })
 
-    start = dt.datetime.fromisoformat(date).replace(tzinfo=LOCAL_TZ)
-    end = start + timedelta(days=1)
 
-    db = SessionLocal()
-    rows = db.query(MotionEvent).filter(
-        MotionEvent.timestamp >= start,
-        MotionEvent.timestamp < end
-    ).order_by(MotionEvent.timestamp).all()
-    db.close()
+@bp.get("/api/images/<name>")
+def api_image(name):
+    """
+    ?size=thumb|medium|original (default medium). Conditional GET
+    (ETag / Last-Modified) and Range requests are handled by send_file.
+    """
+    size = request.args.get("size", "medium")
+    if size != "original" and size not in images.SIZES:
+        return jsonify({"error": "size must be thumb, medium or original"}), 400
 
-    buckets = {}
+    original = image_store.original_path(name)
+    if original is None:
+        return jsonify({"error": "unknown image"}), 404
 
-    for r in rows:
-        ts = r.timestamp.astimezone(LOCAL_TZ)
-        bucket = ts.replace(minute=(ts.minute // 5) * 5, second=0, microsecond=0)
-        key = bucket.strftime("%H:%M")
-        buckets[key] = buckets.get(key, 0) + 1
+    version = image_store.version(original)
+    if size == "original":
+        path = original
+    else:
+        path, _ = image_store.derivative(original, size)
+
+    resp = send_file(path, conditional=True, etag=f"{version}-{size}")
+    resp.cache_control.no_cache = None
+    resp.cache_control.public = True
+    if request.args.get("v") == version:
+        resp.cache_control.max_age = IMAGE_MAX_AGE
+        resp.cache_control.immutable = True
+    else:
+        resp.cache_control.max_age = 300
+    return resp
+
+
+# -------------------------------------------------------------
+# DEVICE COMMANDS
+# -------------------------------------------------------------
+def post_device_value(device, value):
+    """REST fallback for the dispatcher: one blocking POST to the device feed."""
+    # Adafruit feed name is EXACTLY the device name
+    r = upstream.post(f"feeds/{device}/data", json={"value": value})
+    if r.status_code not in (200, 201):
+        raise RuntimeError(f"Adafruit responded {r.status_code}")
+
+
+def on_command_update(command):
+    if live_broadcaster.client_count:
+        live_broadcaster.publish("command", command)
+
+
+def start_commands():
+    publisher = None
+    if COMMANDS_VIA_MQTT and USERNAME and AIO_KEY:
+        publisher = MqttPublisher(USERNAME, AIO_KEY, broker=MQTT_BROKER, port=MQTT_PORT)
+        publisher.start()
 
-    result = [{
-        "time": k,
-        "value": v
-    } for k, v in sorted(buckets.items())]
+    dispatcher = CommandDispatcher(
+        state,
+        publisher=publisher,
+        fallback=post_device_value,
+        publish_timeout=COMMAND_PUBLISH_TIMEOUT,
+        on_update=on_command_update,
+    )
+    dispatcher.start()
 
-    return jsonify(result)
+    atexit.register(dispatcher.stop)
+    if publisher is not None:
+        atexit.register(publisher.stop)
+    return dispatcher
 
-@app.post("/api/device/<device>")
+
+def accepted(command):
+    return dict(command, status_url=url_for(".api_device_command", command_id=command["id"]))
+
+
+@bp.post("/api/device/<device>")
 def device_control(device):
 
     # Validate device from config.json
@@ -479,71 +773,210 @@ def device_control(device):
     if not data or "value" not in data:
         return jsonify({"success": False, "error": "Missing 'value' field"}), 400
 
-    value = data["value"]
-
-    # Send to Adafruit feed matching the device name
-    feed_name = device  # EXACT SAME as feed name in Adafruit
-
-    url = f"{BASE_URL}/feeds/{feed_name}/data"
-    try:
-        r = requests.post(url, headers=HEADERS, json={"value": value})
+    # queued, sent in the background; a newer command for the same device replaces it
+    command = accepted(commands.submit(device, data["value"]))
+    resp = jsonify({"success": True, "command": command})
+    resp.headers["Location"] = command["status_url"]
+    return resp, 202
 
-        if r.status_code not in (200, 201):
-            return jsonify({
-                "success": False,
-                "error": f"Adafruit responded {r.status_code}"
-            }), 500
 
-        return jsonify({"success": True})
+@bp.post("/api/devices")
+def devices_control():
+    """Set several devices in one call: {"devices": {"led1-control": 1, "relay-control": 0}}"""
+    data = request.get_json(silent=True) or {}
+    values = data.get("devices")
+    if not isinstance(values, dict) or not values:
+        return jsonify({"success": False, "error": "Missing 'devices' object"}), 400
 
-    except Exception as e:
-        print("Device control failed:", e)
-        return jsonify({"success": False, "error": "Internal error"}), 500
+    unknown = [d for d in values if d not in DEVICES]
+    if unknown:
+        return jsonify({"success": False, "error": f"Unknown devices {unknown}"}), 400
 
-def cleanup_old_entries():
-    print("[DB CLEANUP] Running cleanup for entries older than 7 days...")
+    queued = [accepted(commands.submit(device, value)) for device, value in values.items()]
+    return jsonify({"success": True, "commands": queued}), 202
 
-    db = SessionLocal()
-
-    try:
-        now = dt.datetime.now(LOCAL_TZ)
-        cutoff = now - dt.timedelta(days=7)
 
-        # Cleanup EnvironmentData
-        env_deleted = db.query(EnvironmentData)\
-            .filter(EnvironmentData.timestamp < cutoff)\
-            .delete()
+@bp.get("/api/device/commands/<command_id>")
+def api_device_command(command_id):
+    command = commands.get(command_id)
+    if command is None:
+        return jsonify({"success": False, "error": "Unknown command"}), 404
+    return jsonify(command)
 
-        # Cleanup MotionEvent
-        motion_deleted = db.query(MotionEvent)\
-            .filter(MotionEvent.timestamp < cutoff)\
-            .delete()
 
-        db.commit()
+def cleanup_old_entries():
+    print(f"[DB CLEANUP] Running cleanup for entries older than {RETENTION_DAYS} days...")
 
-        print(f"[DB CLEANUP] Environment deleted: {env_deleted}, Motion deleted: {motion_deleted}")
+    try:
+        report = retention.run_retention(
+            get_engine(),
+            raw_days=RETENTION_DAYS,
+            rollup_days=ROLLUP_RETENTION_DAYS,
+        )
+        print(f"[DB CLEANUP] {report}")
+        print(f"[DB CLEANUP] {commands.prune()} old device command entries removed")
 
     except Exception as e:
         print("[DB CLEANUP ERROR]", e)
 
-    finally:
-        db.close()
-
 def start_cleanup_scheduler():
     def run():
         while True:
-            cleanup_old_entries()
-            time.sleep(24 * 3600)  # run every 24 hours
+            # every worker wakes up, only the one that claims the interval runs it
+            try:
+                claimed = state.claim_interval("retention", dt.datetime.now(dt.timezone.utc), RETENTION_INTERVAL)
+            except Exception as e:
+                print("[DB CLEANUP ERROR] claim failed:", e)
+                claimed = False
+            if claimed:
+                cleanup_old_entries()
+            time.sleep(RETENTION_CHECK_INTERVAL)
 
     t = threading.Thread(target=run, daemon=True)
     t.start()
 
 # -------------------------------------------------------------
-# RUN
+# METRICS (Prometheus text format)
 # -------------------------------------------------------------
-if __name__ == "__main__":
-    if os.environ.get("RENDER") != "true":
+def cache_counts(attr):
+    return {
+        ("feed",): getattr(feed_cache, attr, None),
+        ("history",): getattr(history_cache, attr, None),
+    }
+
+
+metrics.REGISTRY.gauge("cache_hits_total", "Cache hits (feed: fresh only)", lambda: cache_counts("hits"), ("cache",),
+                       type="counter")
+metrics.REGISTRY.gauge("cache_stale_hits_total", "Feed cache hits served stale while revalidating",
+                       lambda: feed_cache.stale_hits, type="counter")
+metrics.REGISTRY.gauge("cache_misses_total", "Cache misses", lambda: cache_counts("misses"), ("cache",),
+                       type="counter")
+metrics.REGISTRY.gauge("history_cache_bytes", "Bytes held by the history response cache", lambda: history_cache.size)
+metrics.REGISTRY.gauge("db_pool_connections", "SQLAlchemy pool connections by state",
+                       lambda: metrics.pool_stats(get_engine()), ("state",))
+metrics.REGISTRY.gauge("upstream_circuit_open", "1 while the Adafruit circuit breaker is open",
+                       lambda: int(upstream.breaker.state == "open"), mode="max")
+metrics.REGISTRY.gauge("live_stream_clients", "Connected SSE clients", lambda: live_broadcaster.client_count)
+metrics.REGISTRY.gauge("ingest_queue_depth", "Rows waiting in the write-behind buffer",
+                       lambda: ingestor.writer.depth if ingestor else None)
+metrics.REGISTRY.gauge("ingest_rows_dropped_total", "Rows dropped by the write-behind buffer",
+                       lambda: ingestor.writer.dropped if ingestor else None, type="counter")
+metrics.REGISTRY.gauge("command_queue_depth", "Device commands waiting to be sent", lambda: commands.depth)
+
+
+@bp.get("/metrics")
+def api_metrics():
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+# -------------------------------------------------------------
+# READINESS
+# -------------------------------------------------------------
+readiness = {"db": None, "schema": None, "upstream": None, "done": False}
+
+
+def warm_up():
+    """
+    Runs once in the background after startup: first DB connection (and
+    migrations if MIGRATE_ON_STARTUP), schema check, then one read of
+    every feed to open the upstream connections and fill the feed cache.
+    """
+    try:
+        with get_engine().connect() as conn:
+            conn.execute(text("SELECT 1"))
+        readiness["db"] = "ok"
+
+        if MIGRATE_ON_STARTUP:
+            init_db()
+        pending = migrations.pending_versions()
+        readiness["schema"] = "ok" if not pending else f"pending migrations {pending}, run python migrations.py"
+    except Exception as e:
+        readiness["db"] = f"error: {e}"
+
+    futures = {feed: live_pool.submit(feed_cache.get, feed) for feed in FEED_MAP.values()}
+    failed = []
+    for feed, future in futures.items():
+        try:
+            future.result()
+        except Exception:
+            failed.append(feed)
+    readiness["upstream"] = "ok" if not failed else f"unavailable: {failed}"
+
+    readiness["done"] = True
+    print(f"[READY] {readiness}")
+
+
+@bp.get("/readyz")
+def readyz():
+    """200 once warm-up finished with a reachable, migrated DB; 503 before that."""
+    ready = readiness["done"] and readiness["db"] == "ok" and readiness["schema"] == "ok"
+    # Adafruit being down degrades the live views but doesn't make us unready
+    return jsonify(dict(readiness, ready=ready)), 200 if ready else 503
+
+
+# -------------------------------------------------------------
+# APPLICATION FACTORY
+# -------------------------------------------------------------
+_services_lock = threading.Lock()
+
+
+def start_services(start_background):
+    """Process-wide pieces shared by every app instance, created once."""
+    global state, ingestor, commands
+
+    with _services_lock:
+        if state is not None:
+            return
+
+        if METRICS_MULTIPROC_DIR:
+            metrics.REGISTRY.enable_multiprocess(METRICS_MULTIPROC_DIR)
+        if database.DATABASE_URL:
+            metrics.instrument_engine(get_engine())
+        state = make_state_store(STATE_BACKEND, get_engine() if STATE_BACKEND == "db" else None)
+        commands = start_commands()
+
+        if not start_background:
+            return
+        ingestor = start_ingest()
+        if DB_WARM_CONNECTIONS > 0:
+            database.PoolWarmer(get_engine(), DB_WARM_CONNECTIONS, DB_WARM_INTERVAL).start()
         start_cleanup_scheduler()
+        threading.Thread(target=warm_up, daemon=True).start()
+
+
+def create_app(start_background=True):
+    """
+    Build the Flask app. Nothing here touches the network: no DB
+    connection, no schema work (see migrations.py / MIGRATE_ON_STARTUP).
+    With `start_background`, ingest, retention and the warm-up reported
+    by /readyz start in background threads.
+    """
+    flask_app = Flask(__name__)
+    flask_app.register_blueprint(bp)
+    database.init_app(flask_app)
+    metrics.instrument_flask(flask_app, exclude=("main.api_metrics", "main.readyz", "static"))
+
+    start_services(start_background)
+    return flask_app
 
+
+# -------------------------------------------------------------
+# RUN
+# -------------------------------------------------------------
+_app_lock = threading.Lock()
+
+
+def __getattr__(name):
+    # `gunicorn app:app` / `flask --app app run` build the app on first access,
+    # so a bare `import app` stays free of side effects
+    if name != "app":
+        raise AttributeError(name)
+    with _app_lock:
+        if "app" not in globals():
+            globals()["app"] = create_app()
+    return globals()["app"]
+
+
+if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
-    app.run(host="0.0.0.0", port=port, debug=True)
+    create_app().run(host="0.0.0.0", port=port, debug=True)
@@ -0,0 +1,66 @@
+# bench_startup.py
+"""
+Cold-start benchmark: fresh interpreter → import app → first response.
+
+    python bench_startup.py [runs]
+
+Every run is a new process, so nothing is warm between runs. Reported
+per run (ms): `import app`, create_app(), the first GET / and the time
+until /readyz answers 200 (DB + upstream warm-up done), then medians.
+Uses the same environment (.env, DATABASE_URL...) as the app.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+CHILD = r"""
+import json, time
+t0 = time.perf_counter()
+import app as module
+t1 = time.perf_counter()
+flask_app = module.create_app()
+t2 = time.perf_counter()
+client = flask_app.test_client()
+status = client.get("/").status_code
+t3 = time.perf_counter()
+ready = None
+while time.perf_counter() - t0 < 60:
+    if client.get("/readyz").status_code == 200:
+        ready = time.perf_counter()
+        break
+    time.sleep(0.05)
+ms = lambda a, b: round((b - a) * 1000, 1) if b is not None else None
+print(json.dumps({
+    "import": ms(t0, t1),
+    "create_app": ms(t1, t2),
+    "first_response": ms(t0, t3),
+    "ready": ms(t0, ready),
+    "status": status,
+}))
+"""
+
+
+def run_once():
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True,
+    ).stdout
+    # the app prints its own log lines; the result is the last one
+    return json.loads(out.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    results = []
+    for i in range(runs):
+        r = run_once()
+        results.append(r)
+        print(f"run {i + 1}: {r}")
+
+    print("median (ms):")
+    for key in ("import", "create_app", "first_response", "ready"):
+        values = [r[key] for r in results if r[key] is not None]
+        print(f"  {key:15s} {statistics.median(values) if values else 'n/a'}")
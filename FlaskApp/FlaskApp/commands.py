@@ -0,0 +1,295 @@
+# commands.py
+import collections
+import datetime as dt
+import threading
+import uuid
+
+import paho.mqtt.client as mqtt
+
+
+class MqttPublisher:
+    """
+    One long-lived MQTT connection to Adafruit IO used to publish device
+    commands (no TLS/HTTP handshake per click). Connects and reconnects
+    in the background; `connected` tells whether it can be used right now.
+    """
+
+    def __init__(self, username, key, broker="io.adafruit.com", port=1883, keepalive=60, qos=1):
+        self.username = username
+        self.key = key
+        self.broker = broker
+        self.port = port
+        self.keepalive = keepalive
+        self.qos = qos
+
+        self.connected = False
+        self.client = None
+
+    def start(self):
+        self.client = mqtt.Client()
+        self.client.username_pw_set(self.username, self.key)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+
+        self.client.reconnect_delay_set(min_delay=1, max_delay=60)
+        self.client.connect_async(self.broker, self.port, self.keepalive)
+        self.client.loop_start()
+
+    def stop(self):
+        if self.client is not None:
+            self.client.loop_stop()
+            self.client.disconnect()
+        self.connected = False
+
+    def _on_connect(self, client, userdata, flags, rc):
+        self.connected = rc == 0
+        if rc != 0:
+            print(f"[COMMANDS] MQTT connect failed, rc={rc}")
+
+    def _on_disconnect(self, client, userdata, rc):
+        self.connected = False
+
+    def publish(self, feed_key, value):
+        """Queue one publish; returns the paho MQTTMessageInfo to wait on."""
+        return self.client.publish(f"{self.username}/feeds/{feed_key}", str(value), qos=self.qos)
+
+
+class CommandDispatcher:
+    """
+    Device commands, off the request thread.
+
+    submit() only queues the command in memory and returns at once (the
+    route answers 202 with its id); no state store round trip happens on
+    the request thread. A worker thread records it in the shared state
+    store (see shared_state.py), where any worker can then report its
+    status, and sends everything pending in one pass: over the MQTT
+    publisher when it's connected (all publishes go out back to back,
+    then their acks are awaited), otherwise one by one through
+    `fallback(device, value)` (REST).
+
+    Commands to the same device coalesce, last write wins, across workers:
+    each command takes the next number of a per-device sequence in the
+    store, and is only sent while holding that device's lease. Under the
+    lease, a command whose device already has a newer number is marked
+    "superseded" and never sent, so an older command can't be published
+    after a newer one, whichever worker each went through.
+
+    Statuses: queued → sending → sent | failed, or superseded. Command
+    records (`command.rec.<id>`) are kept in the store until prune()
+    (`keep` seconds); the per-device sequences and leases are never
+    pruned. `on_update(command)` is called on every status change made
+    by this worker.
+    """
+
+    def __init__(self, state, publisher=None, fallback=None, publish_timeout=5.0, lease=30.0,
+                 keep=24 * 3600, on_update=None):
+        self.state = state
+        self.publisher = publisher
+        self.fallback = fallback
+        self.publish_timeout = publish_timeout
+        self.lease = lease
+        self.keep = keep
+        self.on_update = on_update
+
+        self._pending = collections.OrderedDict()    # device → command dict, not sent yet
+        self._unsaved = {}                           # id → command not in the store yet
+        self._superseded = []                        # replaced before they were saved
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    # ---------------------------------------------------------
+    def submit(self, device, value):
+        now = _utc_now()
+        command = {
+            "id": uuid.uuid4().hex,
+            "device": device,
+            "value": value,
+            "seq": None,  # taken from the store by the worker thread
+            "status": "queued",
+            "created_at": now,
+            "updated_at": now,
+        }
+
+        with self._cond:
+            older = self._pending.pop(device, None)
+            self._pending[device] = command
+            self._unsaved[command["id"]] = command
+            if older is not None:
+                older.update(status="superseded", superseded_by=command["id"], updated_at=now)
+                self._superseded.append(older)
+            self._cond.notify()
+
+        if older is not None:
+            self._notify(older)
+        self._notify(command)
+        return dict(command)
+
+    def get(self, command_id):
+        with self._cond:
+            command = self._unsaved.get(command_id)
+            if command is not None:
+                return dict(command)
+        return self.state.get(f"command.rec.{command_id}")
+
+    def prune(self):
+        """Forget command records older than `keep`."""
+        return self.state.prune("command.rec.", self.keep)
+
+    @property
+    def depth(self):
+        with self._cond:
+            return len(self._pending)
+
+    # ---------------------------------------------------------
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=self.publish_timeout + 5)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not (self._pending or self._superseded):
+                    self._cond.wait()
+                if not self._running and not (self._pending or self._superseded):
+                    return
+                batch = list(self._pending.values())
+                self._pending.clear()
+                superseded, self._superseded = self._superseded, []
+
+            try:
+                self._record(superseded, batch)
+                ready, busy = self._claim(batch)
+                self._send(ready)
+            except Exception as e:
+                print("[COMMANDS] state store error:", e)
+                busy = [c for c in batch if c["status"] in ("queued", "sending")]
+                with self._cond:
+                    self._superseded[:0] = [c for c in superseded if c["id"] in self._unsaved]
+
+            if busy:
+                # another worker is sending to these devices: retry once its lease is gone
+                self._requeue(busy)
+                with self._cond:
+                    if self._running:
+                        self._cond.wait(0.2)
+
+    def _requeue(self, commands):
+        superseded = []
+        with self._cond:
+            for command in commands:
+                if command["device"] in self._pending:
+                    superseded.append(command)  # a newer one was submitted meanwhile
+                else:
+                    self._pending[command["device"]] = command
+        for command in superseded:
+            self._update(command, "superseded")
+
+    def _record(self, superseded, batch):
+        """Put newly submitted commands in the store: a sequence number and a first record each."""
+        for command in superseded:
+            self._save(command)
+        for command in batch:
+            if command["seq"] is None:
+                command["seq"] = self.state.increment(f"command.seq.{command['device']}")
+                self._save(command)
+
+    def _claim(self, batch):
+        """Take the lease of each command's device → (commands to send, devices busy elsewhere)."""
+        now = dt.datetime.now(dt.timezone.utc)
+        ready, busy = [], []
+        for command in batch:
+            device = command["device"]
+            if not self.state.claim_interval(f"command.lock.{device}", now, self.lease):
+                busy.append(command)
+                continue
+            if self.state.get(f"command.seq.{device}", 0) > command["seq"]:
+                self._update(command, "superseded")
+                self.state.release(f"command.lock.{device}")
+                continue
+            self._update(command, "sending")
+            ready.append(command)
+        return ready, busy
+
+    def _send(self, batch):
+        if not batch:
+            return
+        try:
+            if self.publisher is not None and self.publisher.connected:
+                via, results = "mqtt", self._send_mqtt(batch)
+            else:
+                via, results = "rest", [self._send_fallback(c) for c in batch]
+
+            for command, error in zip(batch, results):
+                if error is None:
+                    self._update(command, "sent", via=via)
+                else:
+                    self._update(command, "failed", error=error)
+                    print(f"[COMMANDS] {command['device']}={command['value']} failed: {error}")
+        finally:
+            for command in batch:
+                self.state.release(f"command.lock.{command['device']}")
+
+    def _send_mqtt(self, batch):
+        infos = []
+        for command in batch:
+            try:
+                infos.append(self.publisher.publish(command["device"], command["value"]))
+            except Exception as e:
+                infos.append(e)
+
+        results = []
+        for info in infos:
+            if isinstance(info, Exception):
+                results.append(str(info))
+                continue
+            try:
+                info.wait_for_publish(timeout=self.publish_timeout)
+            except Exception as e:
+                results.append(str(e))
+                continue
+            results.append(None if info.is_published() else "publish not acknowledged")
+        return results
+
+    def _send_fallback(self, command):
+        if self.fallback is None:
+            return "no publisher available"
+        try:
+            self.fallback(command["device"], command["value"])
+            return None
+        except Exception as e:
+            return str(e)
+
+    # ---------------------------------------------------------
+    def _update(self, command, status, **extra):
+        command["status"] = status
+        command["updated_at"] = _utc_now()
+        command.update(extra)
+        self._save(command)
+        self._notify(command)
+
+    def _save(self, command):
+        self.state.set(f"command.rec.{command['id']}", command)
+        # the newest status change, for the live streams of every worker
+        self.state.set("command.last", command)
+        with self._cond:
+            self._unsaved.pop(command["id"], None)
+
+    def _notify(self, command):
+        if self.on_update is not None:
+            try:
+                self.on_update(dict(command))
+            except Exception as e:
+                print("[COMMANDS] on_update failed:", e)
+
+
+def _utc_now():
+    return dt.datetime.now(dt.timezone.utc).isoformat().replace("+00:00", "Z")
@@ -1,31 +1,152 @@
 # db.py
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import contextlib
 import os
+import threading
+
 from dotenv import load_dotenv
+from flask import g
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker, declarative_base
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-if DATABASE_URL is None:
-    raise Exception("DATABASE_URL is missing in .env")
+# Pool sizing (per worker). Neon closes idle connections on its side after a few
+# minutes, so recycle before that instead of finding out on the next query.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE") or 5)
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW") or 5)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT") or 10)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE") or 280)
+
 
-# Create engine
-engine = create_engine(
-    DATABASE_URL,
-    echo=False,
-    pool_pre_ping=True,
-)
+def _pool_options(url):
+    if url.startswith("sqlite"):
+        return {}  # SQLite picks its own pool class
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_use_lifo": True,  # reuse the hottest connection, let extra ones age out
+    }
 
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+# Created on first use (get_engine), so importing this module needs no
+# DATABASE_URL and opens no connection
+engine = None
+_engine_lock = threading.Lock()
+
+SessionLocal = sessionmaker(autoflush=False, autocommit=False)
 
 Base = declarative_base()
 
 
+def get_engine():
+    """The process-wide engine, created (not connected) on first call."""
+    global engine
+    if engine is None:
+        with _engine_lock:
+            if engine is None:
+                if DATABASE_URL is None:
+                    raise Exception("DATABASE_URL is missing in .env")
+                engine = create_engine(
+                    DATABASE_URL,
+                    echo=False,
+                    pool_pre_ping=True,
+                    **_pool_options(DATABASE_URL),
+                )
+                SessionLocal.configure(bind=engine)
+    return engine
+
+
 def init_db():
     """
-    Import models and create tables.
+    Bring the schema up to date (see migrations.py).
+    """
+    from migrations import migrate
+    migrate(get_engine())
+
+
+# -------------------------------------------------------------
+# SESSIONS
+# -------------------------------------------------------------
+def get_db():
+    """The session of the current request; closed by close_db() at teardown."""
+    if "db" not in g:
+        get_engine()
+        g.db = SessionLocal()
+    return g.db
+
+
+def close_db(exc=None):
+    db = g.pop("db", None)
+    if db is not None:
+        if exc is not None:
+            db.rollback()
+        db.close()
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
+
+
+@contextlib.contextmanager
+def session_scope():
+    """Session for code running outside a request (threads, scripts)."""
+    get_engine()
+    db = SessionLocal()
+    try:
+        yield db
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# -------------------------------------------------------------
+# WARM KEEPER
+# -------------------------------------------------------------
+class PoolWarmer:
+    """
+    Keeps `connections` pooled connections alive by pinging them every
+    `interval` seconds, so the first query after an idle period doesn't
+    pay for a new TLS + auth handshake (or a Neon compute wake-up).
+
+    Note: this also keeps a Neon compute from auto-suspending.
     """
-    from models import EnvironmentData, MotionEvent
-    Base.metadata.create_all(bind=engine)
+
+    def __init__(self, engine, connections=1, interval=240):
+        self.engine = engine
+        self.connections = connections
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def ping(self):
+        # check out several at once so each of them gets exercised
+        conns = []
+        try:
+            for _ in range(self.connections):
+                conn = self.engine.connect()
+                conns.append(conn)
+                conn.execute(text("SELECT 1"))
+        finally:
+            for conn in conns:
+                conn.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.ping()
+            except Exception as e:
+                print("[DB WARMER] Ping failed:", e)
+            self._stop.wait(self.interval)
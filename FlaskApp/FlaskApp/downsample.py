@@ -0,0 +1,75 @@
+# downsample.py
+"""
+Reduce a time series to a fixed number of points before it goes to the
+charts, so the payload and the Chart.js render time stay the same
+whether the range is one day or ninety.
+
+Series are [(datetime, value), ...], oldest first.
+"""
+import datetime as dt
+import math
+
+
+def lttb(points, threshold):
+    """
+    Largest-Triangle-Three-Buckets: keep `threshold` points that preserve
+    the visual shape of the line (peaks and dips survive, flat stretches
+    collapse). First and last points are always kept.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+
+    xs = [p[0].timestamp() for p in points]
+    ys = [p[1] for p in points]
+
+    out = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # average of the *next* bucket is the third corner of the triangle
+        nxt_start = int((i + 1) * every) + 1
+        nxt_end = min(int((i + 2) * every) + 1, n)
+        span = nxt_end - nxt_start
+        avg_x = sum(xs[nxt_start:nxt_end]) / span
+        avg_y = sum(ys[nxt_start:nxt_end]) / span
+
+        # pick the point of the current bucket forming the largest triangle
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+
+        out.append(points[best])
+        a = best
+
+    out.append(points[-1])
+    return out
+
+
+def sum_rebucket(points, start, end, threshold, step):
+    """
+    Merge count buckets (e.g. motion per 5 min) into wider ones so at most
+    `threshold` remain between `start` and `end`. Widths stay a multiple
+    of `step` seconds and counts are summed, so totals are unchanged.
+    Returns (points, bucket_seconds).
+    """
+    span = (end - start).total_seconds()
+    width = max(1, math.ceil(span / threshold / step)) * step
+    if width == step:
+        return list(points), step
+
+    origin = start.timestamp()
+    merged = {}
+    for ts, count in points:
+        idx = int((ts.timestamp() - origin) // width)
+        merged[idx] = merged.get(idx, 0) + count
+
+    # labels from epoch seconds: aware-datetime arithmetic is wall-clock time and
+    # would shift every bucket after a DST change by an hour
+    return [(dt.datetime.fromtimestamp(origin + idx * width, start.tzinfo), merged[idx])
+            for idx in sorted(merged)], width
@@ -0,0 +1,103 @@
+# export.py
+"""
+Bulk export of the raw tables as NDJSON or CSV.
+
+Rows come from a server-side cursor (stream_results + yield_per), are
+serialized in ~64 KB chunks and optionally gzip-compressed on the fly:
+memory stays flat however many months are exported.
+"""
+import csv
+import io
+import json
+import zlib
+
+from sqlalchemy import select
+
+from models import EnvironmentData, MotionEvent
+from rollups import as_utc
+
+EXPORT_MODELS = {
+    "environment": EnvironmentData,
+    "motion": MotionEvent,
+}
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+CHUNK_BYTES = 64 * 1024
+
+
+def columns(model):
+    return [c.name for c in model.__table__.columns]
+
+
+def iter_rows(engine, model, start=None, end=None, batch_size=1000):
+    """Yield the rows of `model` in [start, end) as dicts, oldest first, `batch_size` per fetch."""
+    query = select(model.__table__).order_by(model.timestamp, model.id)
+    if start is not None:
+        query = query.where(model.timestamp >= as_utc(start))
+    if end is not None:
+        query = query.where(model.timestamp < as_utc(end))
+
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+        for row in result.mappings():
+            yield {k: _jsonable(v) for k, v in row.items()}
+
+
+def _jsonable(value):
+    if hasattr(value, "isoformat"):
+        return as_utc(value).isoformat().replace("+00:00", "Z")
+    return value
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, separators=(",", ":")) + "\n"
+
+
+def csv_lines(rows, fieldnames):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fieldnames, lineterminator="\n")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    # header only when there were no rows
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def chunked(lines, size=CHUNK_BYTES):
+    """Join text lines into byte chunks of about `size` (one yield per chunk, not per row)."""
+    parts, length = [], 0
+    for line in lines:
+        data = line.encode("utf-8")
+        parts.append(data)
+        length += len(data)
+        if length >= size:
+            yield b"".join(parts)
+            parts, length = [], 0
+    if parts:
+        yield b"".join(parts)
+
+
+def gzipped(chunks, level=6):
+    """Compress a stream of byte chunks into one gzip member, incrementally."""
+    comp = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 → gzip header/trailer
+    for chunk in chunks:
+        data = comp.compress(chunk)
+        if data:
+            yield data
+    yield comp.flush()
+
+
+def stream(engine, kind, fmt="ndjson", start=None, end=None, compress=False, batch_size=1000):
+    """Byte chunks of the `kind` export ('environment' / 'motion') in `fmt`."""
+    model = EXPORT_MODELS[kind]
+    rows = iter_rows(engine, model, start, end, batch_size)
+    lines = csv_lines(rows, columns(model)) if fmt == "csv" else ndjson_lines(rows)
+    chunks = chunked(lines)
+    return gzipped(chunks) if compress else chunks
@@ -0,0 +1,122 @@
+# feed_cache.py
+import threading
+import time
+
+
+class _Entry:
+    __slots__ = ("value", "fetched_at")
+
+    def __init__(self, value, fetched_at):
+        self.value = value
+        self.fetched_at = fetched_at
+
+
+class _Flight:
+    """One in-progress upstream fetch that other callers can wait on."""
+
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class FeedCache:
+    """
+    In-process cache for Adafruit feed reads, keyed by feed key.
+
+    - fresh for `ttl` seconds → served straight from memory
+    - stale for another `stale_ttl` seconds → served from memory while
+      one background thread refreshes it (stale-while-revalidate)
+    - older / missing → fetched; concurrent callers for the same key
+      share a single upstream request (single-flight)
+
+    `loader(key)` does the real fetch and may raise; errors are not
+    cached, and a stale value is preferred over an error when we have one.
+    """
+
+    def __init__(self, loader, ttl=5.0, stale_ttl=30.0):
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+        # fresh hits / stale hits (served while revalidating) / misses (caller waited)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+        self._entries = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.fetched_at
+                if age < self.ttl:
+                    self.hits += 1
+                    return entry.value
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    self._start_flight(key, background=True)
+                    return entry.value
+
+            self.misses += 1
+            flight, leader = self._start_flight(key)
+
+        if leader:
+            self._run_flight(key, flight)
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            # upstream failed → fall back to whatever we had
+            if entry is not None:
+                return entry.value
+            raise flight.error
+        return flight.value
+
+    def put(self, key, value):
+        """Store a value we learned about some other way (e.g. an MQTT push)."""
+        with self._lock:
+            self._entries[key] = _Entry(value, time.monotonic())
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    # ---------------------------------------------------------
+    def _start_flight(self, key, background=False):
+        """Must be called with the lock held. Returns (flight, is_leader)."""
+        flight = self._flights.get(key)
+        if flight is not None:
+            return flight, False
+
+        flight = _Flight()
+        self._flights[key] = flight
+
+        if background:
+            t = threading.Thread(target=self._run_flight, args=(key, flight), daemon=True)
+            t.start()
+            return flight, False
+        return flight, True
+
+    def _run_flight(self, key, flight):
+        try:
+            flight.value = self.loader(key)
+        except Exception as e:
+            flight.error = e
+
+        with self._lock:
+            if flight.error is None:
+                self._entries[key] = _Entry(flight.value, time.monotonic())
+            self._flights.pop(key, None)
+
+        flight.done.set()
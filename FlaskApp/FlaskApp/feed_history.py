@@ -0,0 +1,123 @@
+# feed_history.py
+import collections
+import datetime as dt
+import threading
+import time
+from urllib.parse import urlparse, parse_qsl
+
+PAGE_LIMIT = 1000  # Adafruit IO maximum per page
+
+
+def parse_created_at(ts):
+    return dt.datetime.fromisoformat(ts.replace("Z", "+00:00"))
+
+
+def _iso(ts):
+    return ts.astimezone(dt.timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class _Feed:
+    def __init__(self, max_points):
+        self.points = collections.deque(maxlen=max_points)  # (created_at, id, value), oldest first
+        self.cursor = None        # newest created_at we hold
+        self.fetched_at = None    # monotonic time of the last delta fetch
+        self.lock = threading.Lock()
+
+
+class FeedHistory:
+    """
+    Recent data points of Adafruit feeds, kept in memory and topped up
+    incrementally.
+
+    Each feed has a bounded ring of points and a cursor (newest
+    created_at held). A read asks Adafruit only for what came after the
+    cursor (start_time), following pagination until it has everything,
+    and appends it; the first read back-fills `window`. Reads within
+    `min_interval` seconds of the previous fetch are served from memory.
+
+    `client` is the upstream client (get(path, params=...)).
+    """
+
+    def __init__(self, client, window=dt.timedelta(hours=1), max_points=7200, min_interval=5.0):
+        self.client = client
+        self.window = window
+        self.max_points = max_points
+        self.min_interval = min_interval
+
+        self._feeds = {}
+        self._lock = threading.Lock()
+
+    def _feed(self, feed_key):
+        with self._lock:
+            feed = self._feeds.get(feed_key)
+            if feed is None:
+                feed = self._feeds[feed_key] = _Feed(self.max_points)
+            return feed
+
+    def points_since(self, feed_key, since, now=None):
+        """[(created_at_utc, value), ...] newer than `since`, oldest first."""
+        now = now or dt.datetime.now(dt.timezone.utc)
+        feed = self._feed(feed_key)
+
+        with feed.lock:  # one delta fetch per feed at a time, others wait and reuse it
+            fresh = feed.fetched_at is not None and time.monotonic() - feed.fetched_at < self.min_interval
+            if not fresh:
+                self._fetch_delta(feed_key, feed, now)
+
+            # drop what fell out of the window
+            horizon = now - self.window
+            while feed.points and feed.points[0][0] < horizon:
+                feed.points.popleft()
+
+            return [(ts, value) for ts, _, value in feed.points if ts >= since]
+
+    def _fetch_delta(self, feed_key, feed, now):
+        start = feed.cursor or (now - self.window)
+        params = {"start_time": _iso(start), "limit": PAGE_LIMIT, "include": "id,created_at,value"}
+
+        new = []
+        seen = set()
+        while True:
+            r = self.client.get(f"feeds/{feed_key}/data", params=params)
+            r.raise_for_status()
+            page = r.json()
+
+            for row in page:
+                if not row.get("created_at") or row.get("id") in seen:
+                    continue
+                seen.add(row.get("id"))
+                new.append((parse_created_at(row["created_at"]), row.get("id"), _number(row["value"])))
+
+            next_params = _next_page(r, params, page)
+            if next_params is None:
+                break
+            params = next_params
+
+        # the cursor point itself comes back (start_time is inclusive): skip what we hold
+        held = {pid for ts, pid, _ in feed.points if feed.cursor and ts >= feed.cursor}
+        new = sorted(p for p in new if p[1] not in held)
+        feed.points.extend(new)
+        if new:
+            feed.cursor = new[-1][0]
+        feed.fetched_at = time.monotonic()
+
+
+def _next_page(r, params, page):
+    """Params for the next (older) page, or None when this was the last one."""
+    link = r.links.get("next", {}).get("url")
+    if link:
+        return dict(parse_qsl(urlparse(link).query))
+    if len(page) < int(params.get("limit", PAGE_LIMIT)):
+        return None
+    # no Link header: results are newest first, continue below the oldest one
+    oldest = min(row["created_at"] for row in page if row.get("created_at"))
+    if oldest == params.get("end_time"):
+        return None  # a full page of one timestamp: can't page any further this way
+    return dict(params, end_time=oldest)
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
@@ -0,0 +1,35 @@
+# gunicorn.conf.py
+"""
+Read by gunicorn from the working directory, so the plain start command
+(`gunicorn app:app`, see Procfile) picks it up.
+
+Every dashboard page keeps an /api/stream (SSE) connection open for up to
+LIVE_STREAM_MAX_SECONDS. Under the default sync worker that one request
+holds the whole worker, so a single open tab blocks the site: requests are
+served by threads instead (gthread), one per connection.
+"""
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+# per worker: open tabs (one stream each) + concurrent API / page requests
+threads = int(os.getenv("GUNICORN_THREADS", 32))
+
+# gthread heartbeats from its main loop, so long-lived streams don't trip this
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+keepalive = 5
+
+# /metrics adds up every worker's samples from this directory (see metrics.py);
+# set here, before the workers are forked, so they all inherit it
+metrics_dir = os.environ.setdefault(
+    "METRICS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "domisafe-metrics")
+)
+
+
+def on_starting(server):
+    # counters from a previous run must not be added to this one
+    shutil.rmtree(metrics_dir, ignore_errors=True)
@@ -0,0 +1,164 @@
+# images.py
+"""
+Captured intruder images and their resized derivatives.
+
+Originals sit in one directory (IMAGE_DIR). Nothing in this app copies
+them there from the Pi: point IMAGE_DIR at the Pi's captured_images, or
+keep a copy of it in sync (see README).
+
+URLs and ETags carry a version built from (name, mtime, size), so
+listing images never reads them. Thumbnail / medium versions are
+generated once with OpenCV, on first request, and cached on disk as
+<content sha256>_<size>.jpg, so a re-uploaded or renamed file with the
+same bytes reuses them and a changed file never serves a stale one.
+Without OpenCV installed the originals are served instead.
+"""
+import collections
+import hashlib
+import os
+import threading
+
+try:
+    import cv2
+except ImportError:  # optional: only needed to generate derivatives
+    cv2 = None
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+SIZES = {"thumb": 160, "medium": 640}  # longest side, pixels
+JPEG_QUALITY = 80
+
+
+def version_of(name, mtime, size_bytes):
+    """Short version tag of a file: changes whenever it is replaced or modified."""
+    return hashlib.sha1(f"{name}\0{mtime}\0{size_bytes}".encode()).hexdigest()[:16]
+
+
+class ImageStore:
+    def __init__(self, root, cache_dir, sizes=SIZES, max_entries=2048):
+        self.root = root
+        self.cache_dir = cache_dir
+        self.sizes = sizes
+        self.max_entries = max_entries
+
+        self._index = []          # [(name, mtime, bytes)], newest first
+        self._index_mtime = None  # directory mtime the index was built from
+        self._hashes = collections.OrderedDict()     # (path, mtime, bytes) → sha256, LRU
+        self._lock = threading.Lock()
+        self._key_locks = collections.OrderedDict()  # derivative path → lock, LRU
+
+    # ---------------------------------------------------------
+    # LISTING
+    # ---------------------------------------------------------
+    def index(self):
+        """All images, newest first. Rescanned only when the directory changed."""
+        try:
+            mtime = os.stat(self.root).st_mtime
+        except FileNotFoundError:
+            return []
+
+        with self._lock:
+            if mtime != self._index_mtime:
+                entries = []
+                with os.scandir(self.root) as it:
+                    for e in it:
+                        if e.is_file() and e.name.lower().endswith(IMAGE_EXTENSIONS):
+                            st = e.stat()
+                            entries.append((e.name, st.st_mtime, st.st_size))
+                entries.sort(key=lambda x: x[1], reverse=True)
+                self._index = entries
+                self._index_mtime = mtime
+            return self._index
+
+    def page(self, page=1, per_page=24):
+        """(entries of that page, total count)."""
+        entries = self.index()
+        start = (page - 1) * per_page
+        return entries[start:start + per_page], len(entries)
+
+    # ---------------------------------------------------------
+    # FILES
+    # ---------------------------------------------------------
+    def original_path(self, name):
+        """Path of an original image, or None (unknown name / path tricks)."""
+        if os.path.basename(name) != name or not name.lower().endswith(IMAGE_EXTENSIONS):
+            return None
+        path = os.path.join(self.root, name)
+        return path if os.path.isfile(path) else None
+
+    def version(self, path):
+        """version_of() the file at `path` (one stat, no read)."""
+        st = os.stat(path)
+        return version_of(os.path.basename(path), st.st_mtime, st.st_size)
+
+    def content_hash(self, path):
+        st = os.stat(path)
+        key = (path, st.st_mtime, st.st_size)
+        with self._lock:
+            digest = self._hashes.get(key)
+            if digest is not None:
+                self._hashes.move_to_end(key)
+                return digest
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+
+        with self._lock:
+            self._hashes[key] = digest
+            while len(self._hashes) > self.max_entries:
+                self._hashes.popitem(last=False)
+        return digest
+
+    def derivative(self, path, size):
+        """
+        (path, sha256) of the `size` version of the original at `path`,
+        generating it on first use. Falls back to the original itself
+        when OpenCV is missing or the file can't be decoded.
+        """
+        digest = self.content_hash(path)
+        if size not in self.sizes or cv2 is None:
+            return path, digest
+
+        out = os.path.join(self.cache_dir, f"{digest}_{size}.jpg")
+        if os.path.exists(out):
+            return out, digest
+
+        with self._key_lock(out):
+            if not os.path.exists(out) and not self._render(path, out, self.sizes[size]):
+                return path, digest
+        return out, digest
+
+    def _render(self, src, out, longest):
+        img = cv2.imread(src)
+        if img is None:
+            return False
+
+        h, w = img.shape[:2]
+        scale = longest / max(h, w)
+        if scale < 1:
+            img = cv2.resize(img, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{out}.{threading.get_ident()}.tmp"
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        if not ok:
+            return False
+        with open(tmp, "wb") as f:
+            f.write(buf.tobytes())
+        os.replace(tmp, out)  # atomic: readers never see a half-written file
+        return True
+
+    def _key_lock(self, key):
+        # an evicted lock still in use at worst lets two threads render the
+        # same file, and the atomic replace in _render keeps that harmless
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+                while len(self._key_locks) > self.max_entries:
+                    self._key_locks.popitem(last=False)
+            else:
+                self._key_locks.move_to_end(key)
+            return lock
@@ -0,0 +1,182 @@
+# ingest.py
+import datetime as dt
+import json
+
+import paho.mqtt.client as mqtt
+
+from models import EnvironmentData, MotionEvent
+from shared_state import MemoryStateStore
+
+ENV_SENSORS = ("temperature", "humidity", "pressure")
+MOTION_DEDUP_SEC = 15
+
+
+def parse_payload(text):
+    """
+    (value, created_at or None) of a feed message: a plain value, or the
+    {"value": ..., "created_at": ...} form the device uses for values it
+    sends late (after an outage), stamped with when they were measured.
+    """
+    text = text.strip()
+    if not text.startswith("{"):
+        return text, None
+    data = json.loads(text)
+    created_at = data.get("created_at")
+    if created_at:
+        created_at = dt.datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    return str(data["value"]), created_at or None
+
+
+class FeedIngestor:
+    """
+    Subscribes to the Adafruit IO MQTT feeds and records them in the DB,
+    whether or not anyone has the dashboard open.
+
+    - environment: latest temperature/humidity/pressure are kept in memory,
+      one EnvironmentData snapshot is stored every `env_store_interval_min`
+    - motion: any value > 0 stores a MotionEvent (MOTION_DEDUP_SEC de-duplication)
+
+    Rows are handed to `writer` (a WriteBehindBuffer), which batches the
+    actual INSERTs off the MQTT thread.
+
+    Every gunicorn worker runs its own ingestor and receives every message;
+    the store interval and the motion de-duplication are claimed through
+    `state` (see shared_state.py) so only one of them writes each row.
+    The claim is a DB round trip on paho's network thread, so it is only
+    attempted once the interval is due by this worker's own clock
+    (`_next_claim`); every other message is decided in memory.
+
+    `on_reading(sensor, latest)` is called for every message with the same
+    {"value", "created_at", ...} shape the REST API returns.
+    """
+
+    def __init__(self, username, key, feed_map, writer, tz,
+                 broker="io.adafruit.com", port=1883, keepalive=60,
+                 env_store_interval_min=5, on_reading=None, state=None):
+        self.username = username
+        self.key = key
+        self.feed_map = feed_map
+        self.sensor_by_feed = {feed: sensor for sensor, feed in feed_map.items()}
+        self.writer = writer
+        self.tz = tz
+
+        self.broker = broker
+        self.port = port
+        self.keepalive = keepalive
+
+        self.env_store_interval_min = env_store_interval_min
+        self.on_reading = on_reading
+        self.state = state or MemoryStateStore()
+
+        self.latest_env = {}
+        self.client = None
+        self._next_claim = {}  # claim key → timestamp before which it can't succeed
+
+    # ---------------------------------------------------------
+    # LIFECYCLE
+    # ---------------------------------------------------------
+    def start(self):
+        self.client = mqtt.Client()
+        self.client.username_pw_set(self.username, self.key)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
+
+        # connect_async + loop_start → connects (and reconnects) in the background
+        self.client.reconnect_delay_set(min_delay=1, max_delay=60)
+        self.client.connect_async(self.broker, self.port, self.keepalive)
+        self.client.loop_start()
+        print(f"[INGEST] Subscribing to {len(self.feed_map)} feeds on {self.broker}:{self.port}")
+
+    def stop(self):
+        if self.client is not None:
+            self.client.loop_stop()
+            self.client.disconnect()
+
+    # ---------------------------------------------------------
+    # MQTT CALLBACKS
+    # ---------------------------------------------------------
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            print(f"[INGEST] MQTT connect failed, rc={rc}")
+            return
+        for feed_key in self.feed_map.values():
+            client.subscribe(f"{self.username}/feeds/{feed_key}", qos=1)
+        print("[INGEST] Connected to MQTT broker")
+
+    def _on_disconnect(self, client, userdata, rc):
+        if rc != 0:
+            print(f"[INGEST] MQTT disconnected (rc={rc}), reconnecting...")
+
+    def _on_message(self, client, userdata, msg):
+        feed_key = msg.topic.rsplit("/", 1)[-1]
+        sensor = self.sensor_by_feed.get(feed_key)
+        if sensor is None:
+            return
+
+        try:
+            raw_value, created_at = parse_payload(msg.payload.decode("utf-8"))
+            self.handle_reading(sensor, raw_value, created_at.astimezone(self.tz) if created_at else None)
+        except Exception as e:
+            print("[INGEST] Error handling message:", e)
+
+    # ---------------------------------------------------------
+    # INGEST LOGIC (broker independent)
+    # ---------------------------------------------------------
+    def handle_reading(self, sensor, raw_value, now=None):
+        now = now or dt.datetime.now(self.tz)
+        latest = {
+            "value": raw_value,
+            "created_at": now.astimezone(dt.timezone.utc).isoformat().replace("+00:00", "Z"),
+            "feed_key": self.feed_map[sensor],
+        }
+
+        if sensor in ENV_SENSORS:
+            self.latest_env[sensor] = float(raw_value)
+            self.record_environment(now)
+        elif sensor == "motion":
+            self.record_motion(float(raw_value), now)
+
+        if self.on_reading is not None:
+            self.on_reading(sensor, latest)
+
+    def record_environment(self, now):
+        if all(s in self.latest_env for s in ENV_SENSORS):
+            self.store_environment_snapshot(dict(self.latest_env), now)
+
+    def _claim(self, key, now, interval):
+        """
+        state.claim_interval(), skipped while it can't succeed. Won or lost,
+        the interval was just claimed (every worker sees the same messages),
+        so the next attempt is one interval later.
+        """
+        ts = now.timestamp()
+        if ts < self._next_claim.get(key, float("-inf")):
+            return False
+        self._next_claim[key] = ts + interval
+        return self.state.claim_interval(key, now, interval)
+
+    def store_environment_snapshot(self, values, now):
+        if not self._claim("ingest.env_store", now, self.env_store_interval_min * 60):
+            return
+
+        self.writer.add(EnvironmentData, {
+            "timestamp": now.astimezone(dt.timezone.utc),
+            "temperature": values["temperature"],
+            "humidity": values["humidity"],
+            "pressure": values["pressure"],
+        })
+
+    def record_motion(self, motion_value, now):
+        # per-5-minute counts live in motion_rollup_5m, nothing to track here
+        if motion_value > 0:
+            self.store_motion_event(now)
+
+    def store_motion_event(self, now, image_path=None):
+        if not self._claim("ingest.motion", now, MOTION_DEDUP_SEC):
+            return
+
+        self.writer.add(MotionEvent, {
+            "timestamp": now.astimezone(dt.timezone.utc),
+            "image_path": image_path,
+        })
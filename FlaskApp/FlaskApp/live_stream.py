@@ -0,0 +1,121 @@
+# live_stream.py
+import json
+import queue
+import threading
+import time
+
+
+class LiveBroadcaster:
+    """
+    One shared producer → many Server-Sent Events clients.
+
+    `sources` maps an event name to (read_fn, interval_sec). While at least
+    one client is connected, a single background thread calls each read_fn
+    on its own interval and pushes the result to every client, but only
+    when it changed. Anything else can push with publish(), or ask for a
+    source to be re-read right away with refresh().
+
+    Upstream/DB work therefore depends on the number of sources, not on the
+    number of open tabs. The thread stops by itself once nobody listens.
+    """
+
+    def __init__(self, sources, keepalive_sec=15, client_queue_size=32):
+        self.sources = sources
+        self.keepalive_sec = keepalive_sec
+        self.client_queue_size = client_queue_size
+
+        self._clients = set()
+        self._last = {}  # event name → last serialized payload
+        self._lock = threading.Lock()
+        self._thread = None
+        self._due = {event: 0.0 for event in sources}
+        self._wake = threading.Event()
+
+    # ---------------------------------------------------------
+    def publish(self, event, data):
+        payload = json.dumps(data, default=str)
+
+        with self._lock:
+            if self._last.get(event) == payload:
+                return
+            self._last[event] = payload
+            clients = list(self._clients)
+
+        message = f"event: {event}\ndata: {payload}\n\n"
+        for q in clients:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # slow client → drop its oldest message rather than block everyone
+                try:
+                    q.get_nowait()
+                    q.put_nowait(message)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def refresh(self, event):
+        """Re-read one source on the producer thread as soon as possible."""
+        self._due[event] = 0.0
+        self._wake.set()
+
+    def stream(self, max_seconds=None):
+        """Generator of SSE frames for one client (use as a Flask response body)."""
+        q = self._subscribe()
+        deadline = time.monotonic() + max_seconds if max_seconds else None
+
+        try:
+            yield "retry: 2000\n\n"
+
+            while deadline is None or time.monotonic() < deadline:
+                try:
+                    yield q.get(timeout=self.keepalive_sec)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            self._unsubscribe(q)
+
+    @property
+    def client_count(self):
+        with self._lock:
+            return len(self._clients)
+
+    # ---------------------------------------------------------
+    def _subscribe(self):
+        q = queue.Queue(maxsize=self.client_queue_size)
+
+        with self._lock:
+            # replay the last known state so a new tab paints immediately
+            for event, payload in self._last.items():
+                q.put_nowait(f"event: {event}\ndata: {payload}\n\n")
+            self._clients.add(q)
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return q
+
+    def _unsubscribe(self, q):
+        with self._lock:
+            self._clients.discard(q)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._clients:
+                    self._thread = None
+                    return
+
+            now = time.monotonic()
+            for event, (read_fn, interval) in self.sources.items():
+                if now < self._due[event]:
+                    continue
+                self._due[event] = now + interval
+                try:
+                    data = read_fn()
+                    if data is not None:  # nothing to report yet
+                        self.publish(event, data)
+                except Exception as e:
+                    print(f"[LIVE STREAM] {event} read error:", e)
+
+            self._wake.wait(max(0.05, min(self._due.values()) - time.monotonic()))
+            self._wake.clear()
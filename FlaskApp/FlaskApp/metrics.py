@@ -0,0 +1,329 @@
+# metrics.py
+"""
+Minimal Prometheus instrumentation, no client library needed.
+
+    Counter / Histogram      → updated from hooks, labelled by keyword
+    Gauge(fn)                → read at scrape time from a callback
+    REGISTRY.render()        → text exposition format for /metrics
+
+Hooks provided here:
+
+    instrument_flask(app)    → per-route latency (before/after_request)
+    instrument_engine(eng)   → DB time per endpoint (cursor execute events)
+    InstrumentedClient(c)    → per-feed upstream latency and status codes
+
+Under several worker processes (gunicorn), REGISTRY.enable_multiprocess(dir)
+makes /metrics report the sum over every worker instead of whichever
+worker happened to answer the scrape.
+"""
+import glob
+import json
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = (f'{k}="{_escape(v)}"' for k, v in zip(labelnames, values))
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, _labels(self.labelnames, key), value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # labels → [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            names, values = self.labelnames + ("le",), key
+            for bound, count in zip(self.buckets, series):
+                yield f"{self.name}_bucket", _labels(names, values + (bound,)), count
+            yield f"{self.name}_bucket", _labels(names, values + ("+Inf",)), series[-2]
+            yield f"{self.name}_count", _labels(self.labelnames, key), series[-2]
+            yield f"{self.name}_sum", _labels(self.labelnames, key), series[-1]
+
+
+class Gauge:
+    """
+    Value(s) computed at scrape time: fn() → number, or {label values tuple: number}.
+    type="counter" for totals kept elsewhere (e.g. cache hit counters).
+    mode: how the workers' values combine in multiprocess mode, "sum" or "max".
+    """
+
+    def __init__(self, name, help, fn, labelnames=(), type="gauge", mode="sum"):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+        self.type = type
+        self.mode = mode
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return
+        if not isinstance(value, dict):
+            value = {(): value}
+        for key, v in value.items():
+            if v is not None:
+                yield self.name, _labels(self.labelnames, key), v
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.multiproc_dir = None
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    # ---------------------------------------------------------
+    def enable_multiprocess(self, directory, interval=5.0):
+        """
+        Every `interval` seconds this process writes its samples to
+        `directory` (metrics_<pid>.json); render() adds up the files of the
+        other processes. Their figures are therefore up to `interval` old.
+        Counters of workers that exited are kept, so totals never go
+        backwards; their gauges are dropped. Empty the directory when the
+        server (not a worker) starts, see gunicorn.conf.py.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.multiproc_dir = directory
+
+        def run():
+            while True:
+                try:
+                    self.write_snapshot()
+                except Exception as e:
+                    print("[METRICS] snapshot failed:", e)
+                time.sleep(interval)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.multiproc_dir, f"metrics_{pid}.json")
+
+    def write_snapshot(self):
+        data = {m.name: list(m.samples()) for m in self.metrics}
+        path = self._snapshot_path(os.getpid())
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)  # readers never see a half-written file
+
+    def _other_snapshots(self):
+        """[(alive, {metric name: samples}), ...] of the other processes."""
+        out = []
+        for path in glob.glob(os.path.join(self.multiproc_dir, "metrics_*.json")):
+            try:
+                pid = int(os.path.basename(path)[len("metrics_"):-len(".json")])
+                if pid == os.getpid():
+                    continue
+                with open(path) as f:
+                    out.append((_pid_alive(pid), json.load(f)))
+            except (ValueError, OSError):
+                continue
+        return out
+
+    def render(self):
+        others = self._other_snapshots() if self.multiproc_dir else []
+        lines = []
+        for m in self.metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.type}")
+
+            merged = {}
+            combine = max if getattr(m, "mode", "sum") == "max" else (lambda a, b: a + b)
+            for name, labels, value in m.samples():
+                merged[name, labels] = value
+            for alive, snapshot in others:
+                if m.type == "gauge" and not alive:
+                    continue
+                for name, labels, value in snapshot.get(m.name, ()):
+                    key = (name, labels)
+                    merged[key] = combine(merged[key], value) if key in merged else value
+
+            for (name, labels), value in merged.items():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "Flask request latency by route",
+    ("endpoint", "method", "status"),
+)
+DB_QUERY_LATENCY = REGISTRY.histogram(
+    "db_query_duration_seconds", "Database statement time by Flask endpoint (or 'background')",
+    ("endpoint",),
+)
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    "upstream_request_duration_seconds", "Adafruit IO REST latency (retries included) by feed",
+    ("feed", "method", "status"),
+)
+
+
+# -------------------------------------------------------------
+# HOOKS
+# -------------------------------------------------------------
+def _endpoint():
+    if has_request_context():
+        return request.endpoint or "unknown"
+    return "background"
+
+
+def instrument_flask(app, exclude=("static",)):
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        start = g.pop("metrics_start", None)
+        if start is not None and request.endpoint not in exclude:
+            # streamed bodies (SSE, exports): time to the first byte, not to the end
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - start,
+                endpoint=request.endpoint or "unknown",
+                method=request.method,
+                status=response.status_code,
+            )
+        return response
+
+
+def instrument_engine(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("metrics_start")
+        if starts:
+            DB_QUERY_LATENCY.observe(time.perf_counter() - starts.pop(), endpoint=_endpoint())
+
+
+def pool_stats(engine):
+    """{(state,): connections} for QueuePool-style pools, {} otherwise."""
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return {}
+    return {
+        ("size",): pool.size(),
+        ("checked_out",): pool.checkedout(),
+        ("checked_in",): pool.checkedin(),
+        ("overflow",): pool.overflow(),
+    }
+
+
+class InstrumentedClient:
+    """Wraps an AdafruitClient; same get/post/request, timed per feed."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def request(self, method, path, **kwargs):
+        start = time.perf_counter()
+        status = "error"
+        try:
+            r = self.client.request(method, path, **kwargs)
+            status = r.status_code
+            return r
+        finally:
+            UPSTREAM_LATENCY.observe(
+                time.perf_counter() - start,
+                feed=_feed_of(path),
+                method=method.upper(),
+                status=status,
+            )
+
+
+def _feed_of(path):
+    """'feeds/<feed>/data' → '<feed>'"""
+    parts = path.strip("/").split("/")
+    if len(parts) >= 2 and parts[0] == "feeds":
+        return parts[1]
+    return parts[0] if parts else ""
@@ -0,0 +1,230 @@
+# migrations.py
+"""
+Versioned schema migrations, replacing a bare Base.metadata.create_all.
+
+Applied versions are recorded in `schema_migrations`, so an existing Neon
+database only runs what it is missing:
+
+    python migrations.py            → apply pending migrations
+    python migrations.py status     → show applied / pending versions
+    python migrations.py explain    → check the history range query uses its index
+
+Every migration must be safe to re-run (IF NOT EXISTS & co.): a fresh
+database gets the current models from the baseline and then replays the
+later steps on top.
+"""
+import datetime as dt
+import sys
+
+from sqlalchemy import text
+
+from db import Base, get_engine
+
+MIGRATIONS = []  # (version, description, fn(engine)), in order
+
+# any constant; serializes migrations across gunicorn workers / instances
+ADVISORY_LOCK_ID = 727001
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+# -------------------------------------------------------------
+# MIGRATIONS
+# -------------------------------------------------------------
+@migration(1, "baseline tables")
+def _baseline(eng):
+    import models  # noqa: F401  (registers the tables on Base)
+    Base.metadata.create_all(bind=eng)
+
+
+@migration(2, "timestamp indexes for range queries")
+def _timestamp_indexes(eng):
+    # CONCURRENTLY → existing Postgres tables keep accepting writes while indexing
+    concurrently = "CONCURRENTLY " if eng.dialect.name == "postgresql" else ""
+    with eng.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS ix_environment_data_timestamp "
+            "ON environment_data (timestamp)"
+        ))
+        conn.execute(text(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS ix_motion_events_timestamp "
+            "ON motion_events (timestamp)"
+        ))
+
+
+@migration(3, "daily range partitions for environment_data / motion_events (Postgres)")
+def _partition_raw_tables(eng):
+    """
+    Rebuild both raw tables as PARTITION BY RANGE (timestamp), one
+    partition per UTC day, so retention can drop partitions instead of
+    DELETE-ing rows. The primary key becomes (id, timestamp) because
+    Postgres requires the partition key in it; the id sequence is kept.
+    No-op on other databases (retention falls back to chunked deletes).
+    """
+    if eng.dialect.name != "postgresql":
+        return
+
+    import retention
+
+    columns = {
+        "environment_data": "temperature DOUBLE PRECISION, humidity DOUBLE PRECISION, pressure DOUBLE PRECISION",
+        "motion_events": "image_path VARCHAR",
+    }
+
+    with eng.begin() as conn:
+        for table, extra in columns.items():
+            if retention.is_partitioned(conn, table):
+                continue
+
+            legacy = f"{table}_legacy"
+            conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+            # index / constraint names are schema-wide: free them for the new table
+            conn.execute(text(f"ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey"))
+            conn.execute(text(f"DROP INDEX IF EXISTS ix_{table}_timestamp"))
+            conn.execute(text(f"DROP INDEX IF EXISTS ix_{table}_id"))
+
+            conn.execute(text(
+                f"CREATE TABLE {table} ("
+                f" id INTEGER NOT NULL DEFAULT nextval('{table}_id_seq'),"
+                f" timestamp TIMESTAMPTZ NOT NULL DEFAULT now(),"
+                f" {extra},"
+                f" PRIMARY KEY (id, timestamp)"
+                f") PARTITION BY RANGE (timestamp)"
+            ))
+            conn.execute(text(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id"))
+            # safety net for rows outside every daily partition
+            conn.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+
+            oldest = conn.execute(text(f"SELECT min(timestamp) FROM {legacy}")).scalar()
+            today = dt.datetime.now(dt.timezone.utc).date()
+            first_day = oldest.astimezone(dt.timezone.utc).date() if oldest else today
+            retention.ensure_partitions(conn, table, first_day, today + dt.timedelta(days=7))
+
+            conn.execute(text(
+                f"INSERT INTO {table} SELECT id, COALESCE(timestamp, now()), "
+                f"{', '.join(c.split()[0] for c in extra.split(', '))} FROM {legacy}"
+            ))
+            conn.execute(text(f"DROP TABLE {legacy}"))
+            conn.execute(text(f"CREATE INDEX ix_{table}_timestamp ON {table} (timestamp)"))
+
+
+@migration(4, "app_state table for state shared between workers")
+def _app_state(eng):
+    from models import AppState
+    AppState.__table__.create(bind=eng, checkfirst=True)
+
+
+# -------------------------------------------------------------
+# RUNNER
+# -------------------------------------------------------------
+def _ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INTEGER PRIMARY KEY,"
+        " description VARCHAR NOT NULL,"
+        " applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def applied_versions(eng=None):
+    eng = eng or get_engine()
+    with eng.begin() as conn:
+        _ensure_version_table(conn)
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def pending_versions(eng=None):
+    applied = applied_versions(eng)
+    return [version for version, _, _ in MIGRATIONS if version not in applied]
+
+
+def migrate(eng=None):
+    """Apply every pending migration, in order. Returns the versions applied."""
+    eng = eng or get_engine()
+    is_pg = eng.dialect.name == "postgresql"
+    done = []
+
+    with eng.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+        if is_pg:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+        try:
+            applied = applied_versions(eng)
+            for version, description, fn in MIGRATIONS:
+                if version in applied:
+                    continue
+                print(f"[MIGRATIONS] Applying {version}: {description}")
+                fn(eng)
+                with eng.begin() as conn:
+                    conn.execute(
+                        text("INSERT INTO schema_migrations (version, description, applied_at) "
+                             "VALUES (:v, :d, :t)"),
+                        {"v": version, "d": description, "t": dt.datetime.utcnow()},
+                    )
+                done.append(version)
+        finally:
+            if is_pg:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+
+    return done
+
+
+def explain_range_query(eng=None, table="environment_data", index="ix_environment_data_timestamp"):
+    """
+    EXPLAIN the range filter the history/cleanup queries use.
+    Returns (plan_text, index_used).
+    """
+    eng = eng or get_engine()
+    sql = f"SELECT * FROM {table} WHERE timestamp >= :start AND timestamp < :end"
+    end = dt.datetime.now(dt.timezone.utc)
+    params = {"start": end - dt.timedelta(days=1), "end": end}
+
+    names = {index}
+    with eng.begin() as conn:
+        if eng.dialect.name == "postgresql":
+            # tiny tables are cheaper to seq-scan; ask whether the index *can* serve the query
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+            rows = conn.execute(text("EXPLAIN " + sql), params).fetchall()
+            # partitioned table: the plan names each partition's own copy of the index
+            names.update(name for (name,) in conn.execute(text(
+                "SELECT child.relname FROM pg_inherits i "
+                "JOIN pg_class parent ON parent.oid = i.inhparent "
+                "JOIN pg_class child ON child.oid = i.inhrelid "
+                "WHERE parent.relname = :index"
+            ), {"index": index}))
+        else:
+            rows = conn.execute(text("EXPLAIN QUERY PLAN " + sql), params).fetchall()
+
+    plan = "\n".join(str(row[-1]) for row in rows)
+    return plan, any(name in plan for name in names)
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+
+    if cmd == "upgrade":
+        applied = migrate()
+        print(f"[MIGRATIONS] Applied {applied}" if applied else "[MIGRATIONS] Up to date")
+
+    elif cmd == "status":
+        applied = applied_versions()
+        for version, description, _ in MIGRATIONS:
+            print(f"{'x' if version in applied else ' '} {version:3d}  {description}")
+
+    elif cmd == "explain":
+        ok = True
+        for table, index in (("environment_data", "ix_environment_data_timestamp"),
+                             ("motion_events", "ix_motion_events_timestamp")):
+            plan, used = explain_range_query(table=table, index=index)
+            print(f"--- {table}: index {'USED' if used else 'NOT USED'}\n{plan}")
+            ok = ok and used
+        sys.exit(0 if ok else 1)
+
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -1,5 +1,5 @@
 # models.py
-from sqlalchemy import Column, Integer, Float, String, DateTime
+from sqlalchemy import Column, Integer, Float, String, Text, DateTime
 from sqlalchemy.sql import func
 from db import Base
 
@@ -8,7 +8,7 @@ class EnvironmentData(Base):
     __tablename__ = "environment_data"
 
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
     temperature = Column(Float)
     humidity = Column(Float)
@@ -22,3 +22,38 @@ class MotionEvent(Base):
     timestamp = Column(DateTime(timezone=True), index=True)
 
     image_path = Column(String, nullable=True)
+
+
+# -------------------------------------------------------------
+# 5-MINUTE ROLLUPS (kept up to date at ingest time, see rollups.py)
+# -------------------------------------------------------------
+class EnvironmentRollup(Base):
+    __tablename__ = "environment_rollup_5m"
+
+    sensor = Column(String, primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+
+    count = Column(Integer, nullable=False, default=0)
+    sum = Column(Float, nullable=False, default=0.0)
+    min = Column(Float)
+    max = Column(Float)
+
+
+class MotionRollup(Base):
+    __tablename__ = "motion_rollup_5m"
+
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+
+    count = Column(Integer, nullable=False, default=0)
+
+
+# -------------------------------------------------------------
+# SHARED APP STATE (one row per key, see shared_state.py)
+# -------------------------------------------------------------
+class AppState(Base):
+    __tablename__ = "app_state"
+
+    key = Column(String, primary_key=True)
+    value = Column(Text)          # JSON
+    claimed_at = Column(Float)    # epoch seconds, for interval claims
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
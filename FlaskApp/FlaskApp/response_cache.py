@@ -0,0 +1,60 @@
+# response_cache.py
+import collections
+import hashlib
+import threading
+
+
+class ResponseCache:
+    """
+    Memory-bounded LRU of rendered response bodies.
+
+    Entries are (body bytes, strong ETag); the ETag is a content hash, so
+    it stays identical across workers and restarts for the same answer.
+    The total size of the cached bodies never exceeds `max_bytes`.
+    """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def etag_for(body):
+        return hashlib.sha256(body).hexdigest()[:32]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body):
+        etag = self.etag_for(body)
+        if len(body) > self.max_bytes:
+            return etag
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[0])
+
+            self._entries[key] = (body, etag)
+            self.size += len(body)
+
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+        return etag
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
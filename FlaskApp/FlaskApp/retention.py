@@ -0,0 +1,198 @@
+# retention.py
+"""
+Data retention for the raw tables.
+
+On PostgreSQL, environment_data and motion_events are range-partitioned
+by day (see migration 3): expiring data means dropping whole
+`<table>_pYYYYMMDD` partitions, which is instant and leaves no bloat.
+Upcoming partitions are created ahead of time by the same job.
+
+Anywhere partitioning isn't available (SQLite, a DB not migrated yet),
+rows are deleted in small batches, one short transaction each.
+"""
+import datetime as dt
+
+from sqlalchemy import text, select, delete
+
+from models import EnvironmentData, MotionEvent, EnvironmentRollup, MotionRollup
+
+PARTITIONED_TABLES = ("environment_data", "motion_events")
+DELETE_BATCH_SIZE = 1000
+
+# any constant (migrations.py uses 727001); one retention run at a time per database
+ADVISORY_LOCK_ID = 727002
+
+
+# -------------------------------------------------------------
+# PARTITIONS (PostgreSQL)
+# -------------------------------------------------------------
+def is_partitioned(conn, table):
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :t AND pg_table_is_visible(c.oid)"
+    ), {"t": table}).first() is not None
+
+
+def partition_name(table, day):
+    return f"{table}_p{day:%Y%m%d}"
+
+
+def list_partitions(conn, table):
+    """{day: partition_name} of the daily partitions of `table`."""
+    rows = conn.execute(text(
+        "SELECT child.relname FROM pg_inherits i "
+        "JOIN pg_class parent ON parent.oid = i.inhparent "
+        "JOIN pg_class child ON child.oid = i.inhrelid "
+        "WHERE parent.relname = :t"
+    ), {"t": table}).fetchall()
+
+    out = {}
+    prefix = f"{table}_p"
+    for (name,) in rows:
+        if name.startswith(prefix):
+            try:
+                out[dt.datetime.strptime(name[len(prefix):], "%Y%m%d").date()] = name
+            except ValueError:
+                pass
+    return out
+
+
+def default_partition(conn, table):
+    """Name of the DEFAULT partition of `table` (rows outside every daily one), or None."""
+    name = f"{table}_default"
+    return name if conn.execute(text("SELECT to_regclass(:n)"), {"n": name}).scalar() else None
+
+
+def ensure_partitions(conn, table, first_day, last_day):
+    """
+    Create the daily partitions of `table` for first_day..last_day (UTC days).
+
+    Rows of a day that had no partition yet (a late replay, a device with
+    a wrong clock) sit in the DEFAULT partition, and Postgres refuses to
+    create the day's partition while they are there: they are moved out
+    first and re-inserted once it exists.
+    """
+    existing = list_partitions(conn, table)
+    default = default_partition(conn, table)
+    day = first_day
+    created = 0
+    while day <= last_day:
+        if day not in existing:
+            start = dt.datetime.combine(day, dt.time(), dt.timezone.utc)
+            bounds = {"start": start, "end": start + dt.timedelta(days=1)}
+            stray = default and conn.execute(text(
+                f"SELECT 1 FROM {default} WHERE timestamp >= :start AND timestamp < :end LIMIT 1"
+            ), bounds).first() is not None
+            if stray:
+                conn.execute(text(
+                    f"CREATE TEMP TABLE _stray_rows ON COMMIT DROP AS "
+                    f"SELECT * FROM {default} WHERE timestamp >= :start AND timestamp < :end"
+                ), bounds)
+                conn.execute(text(f"DELETE FROM {default} WHERE timestamp >= :start AND timestamp < :end"), bounds)
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(table, day)} "
+                f"PARTITION OF {table} FOR VALUES FROM ('{start.isoformat()}') "
+                f"TO ('{(start + dt.timedelta(days=1)).isoformat()}')"
+            ))
+            if stray:
+                conn.execute(text(f"INSERT INTO {table} SELECT * FROM _stray_rows"))
+                conn.execute(text("DROP TABLE _stray_rows"))
+            created += 1
+        day += dt.timedelta(days=1)
+    return created
+
+
+def drop_partitions_before(conn, table, cutoff_day):
+    """
+    Drop every daily partition that ends on or before `cutoff_day`, and
+    delete the rows before it from the DEFAULT partition, which is never
+    dropped. Returns (partitions dropped, default rows deleted).
+    """
+    dropped = 0
+    for day, name in sorted(list_partitions(conn, table).items()):
+        if day < cutoff_day:
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped += 1
+
+    deleted = 0
+    default = default_partition(conn, table)
+    if default:
+        cutoff = dt.datetime.combine(cutoff_day, dt.time(), dt.timezone.utc)
+        deleted = conn.execute(text(f"DELETE FROM {default} WHERE timestamp < :cutoff"), {"cutoff": cutoff}).rowcount
+    return dropped, deleted
+
+
+# -------------------------------------------------------------
+# CHUNKED DELETES (everything else)
+# -------------------------------------------------------------
+def delete_in_batches(engine, model, cutoff, batch_size=DELETE_BATCH_SIZE):
+    """DELETE rows older than `cutoff` by primary key, batch_size at a time."""
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            ids = select(model.id).where(model.timestamp < cutoff).limit(batch_size)
+            deleted = conn.execute(delete(model).where(model.id.in_(ids.scalar_subquery()))).rowcount
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+def delete_rollups_before(engine, cutoff):
+    with engine.begin() as conn:
+        env = conn.execute(delete(EnvironmentRollup).where(EnvironmentRollup.bucket_start < cutoff)).rowcount
+        motion = conn.execute(delete(MotionRollup).where(MotionRollup.bucket_start < cutoff)).rowcount
+    return env + motion
+
+
+# -------------------------------------------------------------
+# JOB
+# -------------------------------------------------------------
+def run_retention(engine, raw_days=7, rollup_days=90, partitions_ahead=7):
+    """
+    Expire raw rows after `raw_days` and rollups after `rollup_days`. Returns counts.
+
+    On PostgreSQL the run holds an advisory lock: if another worker or
+    instance is already running it (partition DDL included), this one
+    returns {"skipped": ...} straight away instead of racing it.
+    """
+    if engine.dialect.name != "postgresql":
+        return _expire(engine, raw_days, rollup_days, partitions_ahead)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+        locked = lock_conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID}).scalar()
+        if not locked:
+            return {"skipped": "already running elsewhere"}
+        try:
+            return _expire(engine, raw_days, rollup_days, partitions_ahead)
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+
+
+def _expire(engine, raw_days, rollup_days, partitions_ahead):
+    now = dt.datetime.now(dt.timezone.utc)
+    raw_cutoff = now - dt.timedelta(days=raw_days)
+    report = {}
+
+    for model in (EnvironmentData, MotionEvent):
+        table = model.__tablename__
+
+        with engine.begin() as conn:
+            partitioned = is_partitioned(conn, table)
+            if partitioned:
+                ensure_partitions(conn, table, now.date(), now.date() + dt.timedelta(days=partitions_ahead))
+
+        if partitioned:
+            # whole days only: a partition goes once all of its rows are past the cutoff
+            with engine.begin() as conn:
+                dropped, deleted = drop_partitions_before(conn, table, raw_cutoff.date())
+            report[table] = f"{dropped} partitions dropped"
+            if deleted:
+                report[table] += f", {deleted} rows deleted from {table}_default"
+        else:
+            report[table] = f"{delete_in_batches(engine, model, raw_cutoff)} rows deleted"
+
+    report["rollups"] = f"{delete_rollups_before(engine, now - dt.timedelta(days=rollup_days))} rows deleted"
+    return report
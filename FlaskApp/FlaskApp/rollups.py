@@ -0,0 +1,301 @@
+# rollups.py
+import datetime as dt
+
+from sqlalchemy import func, cast, extract, select, literal, BigInteger, Float, Integer
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import EnvironmentData, MotionEvent, EnvironmentRollup, MotionRollup
+
+BUCKET_SECONDS = 5 * 60
+ENV_SENSORS = ("temperature", "humidity", "pressure")
+
+
+def as_utc(ts):
+    """Aware UTC datetime; naive values (SQLite) are taken as already UTC."""
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=dt.timezone.utc)
+    return ts.astimezone(dt.timezone.utc)
+
+
+def bucket_start(ts):
+    """Start of the 5-minute bucket containing `ts`, in UTC."""
+    epoch = int(as_utc(ts).timestamp())
+    return dt.datetime.fromtimestamp(epoch - epoch % BUCKET_SECONDS, dt.timezone.utc)
+
+
+def _dialect(db):
+    """Dialect name for a Session or a Connection."""
+    bind = db if hasattr(db, "dialect") else db.bind
+    return bind.dialect.name
+
+
+def _insert(db, table):
+    if _dialect(db) == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+# -------------------------------------------------------------
+# WRITE SIDE (call inside the ingest transaction)
+# -------------------------------------------------------------
+def apply(db, table, rows):
+    """Write-behind hook: fold freshly inserted raw rows (dicts) into the rollups."""
+    if table is EnvironmentData.__table__:
+        apply_environment(db, rows)
+    elif table is MotionEvent.__table__:
+        apply_motion(db, rows)
+
+
+def apply_environment(db, rows):
+    """Fold new environment_data rows (dicts) into environment_rollup_5m."""
+    aggs = {}
+    for r in rows:
+        bucket = bucket_start(r["timestamp"])
+        for sensor in ENV_SENSORS:
+            value = r.get(sensor)
+            if value is None:
+                continue
+            a = aggs.setdefault((sensor, bucket), [0, 0.0, value, value])
+            a[0] += 1
+            a[1] += value
+            a[2] = min(a[2], value)
+            a[3] = max(a[3], value)
+
+    table = EnvironmentRollup.__table__
+    for (sensor, bucket), (count, total, lo, hi) in aggs.items():
+        stmt = _insert(db, table).values(
+            sensor=sensor, bucket_start=bucket, count=count, sum=total, min=lo, max=hi
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.sensor, table.c.bucket_start],
+            set_={
+                "count": table.c.count + stmt.excluded.count,
+                "sum": table.c.sum + stmt.excluded.sum,
+                "min": _least(db, table.c.min, stmt.excluded.min),
+                "max": _greatest(db, table.c.max, stmt.excluded.max),
+            },
+        )
+        db.execute(stmt)
+
+
+def apply_motion(db, rows):
+    """Fold new motion_events rows (dicts) into motion_rollup_5m."""
+    counts = {}
+    for r in rows:
+        bucket = bucket_start(r["timestamp"])
+        counts[bucket] = counts.get(bucket, 0) + 1
+
+    table = MotionRollup.__table__
+    for bucket, count in counts.items():
+        stmt = _insert(db, table).values(bucket_start=bucket, count=count)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.bucket_start],
+            set_={"count": table.c.count + stmt.excluded.count},
+        )
+        db.execute(stmt)
+
+
+def _least(db, a, b):
+    return func.least(a, b) if _dialect(db) == "postgresql" else func.min(a, b)
+
+
+def _greatest(db, a, b):
+    return func.greatest(a, b) if _dialect(db) == "postgresql" else func.max(a, b)
+
+
+# -------------------------------------------------------------
+# SQL-SIDE BUCKETING (raw tables, GROUP BY in the database)
+# -------------------------------------------------------------
+def _bucket_epoch(db, column):
+    """Epoch seconds of the 5-minute bucket containing `column`, computed in SQL."""
+    if _dialect(db) == "postgresql":
+        epoch = func.floor(extract("epoch", column) / BUCKET_SECONDS)
+        return cast(epoch * BUCKET_SECONDS, BigInteger)
+    # SQLite: timestamps are stored as UTC text
+    epoch = cast(func.strftime("%s", column), Integer)
+    return (epoch // BUCKET_SECONDS) * BUCKET_SECONDS
+
+
+def _epoch_to_timestamp(db, epoch):
+    if _dialect(db) == "postgresql":
+        return func.to_timestamp(epoch)
+    # same text layout SQLAlchemy uses for DateTime on SQLite, so comparisons line up
+    return func.strftime("%Y-%m-%d %H:%M:%S.000000", epoch, "unixepoch")
+
+
+def _from_epoch(epoch):
+    return dt.datetime.fromtimestamp(int(epoch), dt.timezone.utc)
+
+
+def raw_environment_buckets(db, sensor, start, end):
+    """Same shape as environment_buckets(), aggregated from the raw rows."""
+    column = getattr(EnvironmentData, sensor)
+    bucket = _bucket_epoch(db, EnvironmentData.timestamp).label("bucket")
+
+    rows = db.query(bucket, func.avg(column)).filter(
+        EnvironmentData.timestamp >= as_utc(start),
+        EnvironmentData.timestamp < as_utc(end),
+        column.isnot(None),
+    ).group_by(bucket).order_by(bucket).all()
+
+    return [(_from_epoch(b), float(avg)) for b, avg in rows]
+
+
+def raw_motion_buckets(db, start, end):
+    """Same shape as motion_buckets(), aggregated from the raw rows."""
+    bucket = _bucket_epoch(db, MotionEvent.timestamp).label("bucket")
+
+    rows = db.query(bucket, func.count()).filter(
+        MotionEvent.timestamp >= as_utc(start),
+        MotionEvent.timestamp < as_utc(end),
+    ).group_by(bucket).order_by(bucket).all()
+
+    return [(_from_epoch(b), count) for b, count in rows]
+
+
+def rebuild(db, start, end):
+    """
+    Recompute the rollups for [start, end) from the raw tables, e.g. to
+    backfill data recorded before the rollups existed. The aggregation
+    runs entirely in SQL (INSERT ... SELECT ... GROUP BY). Caller commits.
+    """
+    start, end = bucket_start(start), bucket_start(end)
+
+    db.query(EnvironmentRollup).filter(
+        EnvironmentRollup.bucket_start >= start,
+        EnvironmentRollup.bucket_start < end
+    ).delete(synchronize_session=False)
+    db.query(MotionRollup).filter(
+        MotionRollup.bucket_start >= start,
+        MotionRollup.bucket_start < end
+    ).delete(synchronize_session=False)
+
+    env_bucket = _bucket_epoch(db, EnvironmentData.timestamp)
+    for sensor in ENV_SENSORS:
+        column = getattr(EnvironmentData, sensor)
+        query = select(
+            literal(sensor),
+            _epoch_to_timestamp(db, env_bucket),
+            func.count(column),
+            cast(func.sum(column), Float),
+            func.min(column),
+            func.max(column),
+        ).where(
+            EnvironmentData.timestamp >= start,
+            EnvironmentData.timestamp < end,
+            column.isnot(None),
+        ).group_by(env_bucket)
+
+        db.execute(EnvironmentRollup.__table__.insert().from_select(
+            ["sensor", "bucket_start", "count", "sum", "min", "max"], query
+        ))
+
+    motion_bucket = _bucket_epoch(db, MotionEvent.timestamp)
+    query = select(
+        _epoch_to_timestamp(db, motion_bucket),
+        func.count(),
+    ).where(
+        MotionEvent.timestamp >= start,
+        MotionEvent.timestamp < end,
+    ).group_by(motion_bucket)
+
+    db.execute(MotionRollup.__table__.insert().from_select(
+        ["bucket_start", "count"], query
+    ))
+
+
+# -------------------------------------------------------------
+# READ SIDE
+# -------------------------------------------------------------
+def environment_buckets(db, sensor, start, end):
+    """[(bucket_start_utc, avg), ...] for one sensor, oldest first."""
+    rows = db.query(
+        EnvironmentRollup.bucket_start,
+        EnvironmentRollup.sum,
+        EnvironmentRollup.count,
+    ).filter(
+        EnvironmentRollup.sensor == sensor,
+        EnvironmentRollup.bucket_start >= as_utc(start),
+        EnvironmentRollup.bucket_start < as_utc(end),
+    ).order_by(EnvironmentRollup.bucket_start).all()
+
+    return [(as_utc(b), total / count) for b, total, count in rows if count]
+
+
+def motion_buckets(db, start, end):
+    """[(bucket_start_utc, count), ...], oldest first."""
+    rows = db.query(MotionRollup.bucket_start, MotionRollup.count).filter(
+        MotionRollup.bucket_start >= as_utc(start),
+        MotionRollup.bucket_start < as_utc(end),
+    ).order_by(MotionRollup.bucket_start).all()
+
+    return [(as_utc(b), count) for b, count in rows]
+
+
+# -------------------------------------------------------------
+# HISTORY (rollups, raw rows for the days that have none)
+# -------------------------------------------------------------
+def _utc_days(start, end):
+    """UTC dates touched by [start, end)."""
+    day = as_utc(start).date()
+    last = as_utc(end - dt.timedelta(microseconds=1)).date()
+    while day <= last:
+        yield day
+        day += dt.timedelta(days=1)
+
+
+def _fill_missing_days(points, raw_buckets, start, end):
+    """
+    Rollup `points` for [start, end), plus raw_buckets(a, b) for every UTC
+    day of the range without a single rollup row: days recorded before the
+    rollups existed, or never backfilled (`python rollups.py`). One raw
+    query covers all of them; days that do have rollups are left as is.
+    """
+    covered = {b.date() for b, _ in points}
+    missing = [day for day in _utc_days(start, end) if day not in covered]
+    if not missing:
+        return points
+
+    lo = max(as_utc(start), dt.datetime.combine(missing[0], dt.time(), dt.timezone.utc))
+    hi = min(as_utc(end), dt.datetime.combine(missing[-1] + dt.timedelta(days=1), dt.time(), dt.timezone.utc))
+    missing = set(missing)
+
+    merged = dict(points)
+    for b, value in raw_buckets(lo, hi):
+        if b.date() in missing:
+            merged[b] = value
+    return sorted(merged.items())
+
+
+def environment_history(db, sensor, start, end):
+    """environment_buckets(), completed from the raw rows where whole days are missing."""
+    return _fill_missing_days(
+        environment_buckets(db, sensor, start, end),
+        lambda a, b: raw_environment_buckets(db, sensor, a, b),
+        start, end,
+    )
+
+
+def motion_history(db, start, end):
+    """motion_buckets(), completed from the raw rows where whole days are missing."""
+    return _fill_missing_days(
+        motion_buckets(db, start, end),
+        lambda a, b: raw_motion_buckets(db, a, b),
+        start, end,
+    )
+
+
+if __name__ == "__main__":
+    # Backfill: python rollups.py [days]  (default: the 7 days kept in the raw tables)
+    import sys
+    from db import session_scope, init_db
+
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    end = dt.datetime.now(dt.timezone.utc) + dt.timedelta(seconds=BUCKET_SECONDS)
+    start = end - dt.timedelta(days=days)
+
+    init_db()
+    with session_scope() as db:
+        rebuild(db, start, end)
+        db.commit()
+        print(f"[ROLLUPS] Rebuilt rollups for the last {days} days")
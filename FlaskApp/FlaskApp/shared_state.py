@@ -0,0 +1,193 @@
+# shared_state.py
+"""
+State that must be the same for every gunicorn worker / instance
+(armed flag, "last stored at" timestamps...).
+
+Two interchangeable backends:
+
+    DatabaseStateStore(engine)  → app_state table, atomic upserts
+    MemoryStateStore()          → plain dict, single-process runs only
+
+Both offer get / set and claim_interval(): "may I do X now, given it
+must happen at most once every N seconds?" — answered atomically, so
+exactly one worker wins each interval. A claim can also serve as a
+lease: claim it with the lease length, release() it when done.
+increment() is an atomic counter, prune() forgets old keys.
+"""
+import datetime as dt
+import json
+import threading
+import time
+
+from sqlalchemy import select, update, delete, func, cast, inspect, Integer, Text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import AppState
+
+
+class MemoryStateStore:
+    def __init__(self):
+        self._values = {}
+        self._claims = {}
+        self._updated = {}  # key → time.time() of the last write
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._values.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self._values[key] = value
+            self._updated[key] = time.time()
+
+    def increment(self, key):
+        """Add 1 to the integer at `key` (missing = 0) and return the new value."""
+        with self._lock:
+            value = self._values.get(key, 0) + 1
+            self._values[key] = value
+            self._updated[key] = time.time()
+            return value
+
+    def claim_interval(self, key, now, interval):
+        """True (and records `now`) if the last claim of `key` is at least `interval` seconds old."""
+        ts = now.timestamp()
+        with self._lock:
+            last = self._claims.get(key)
+            if last is not None and ts - last < interval:
+                return False
+            self._claims[key] = ts
+            self._updated[key] = time.time()
+            return True
+
+    def release(self, key):
+        """Forget the claim of `key`: the next claim_interval() succeeds."""
+        with self._lock:
+            self._claims.pop(key, None)
+
+    def prune(self, prefix, older_than):
+        """Drop the keys starting with `prefix` not written for `older_than` seconds."""
+        cutoff = time.time() - older_than
+        with self._lock:
+            old = [k for k, t in self._updated.items() if k.startswith(prefix) and t < cutoff]
+            for key in old:
+                self._values.pop(key, None)
+                self._claims.pop(key, None)
+                del self._updated[key]
+            return len(old)
+
+
+class DatabaseStateStore:
+    """
+    Until the app_state table exists (a deploy that hasn't run `python
+    migrations.py` yet), calls are served by a per-process MemoryStateStore
+    instead of failing; the table is looked for again every `recheck` seconds.
+    """
+
+    def __init__(self, engine, recheck=60):
+        self.engine = engine
+        self.table = AppState.__table__
+        self.recheck = recheck
+        self.fallback = MemoryStateStore()
+        self._missing_until = 0.0
+
+    def _call(self, name, *args):
+        if time.monotonic() < self._missing_until:
+            return getattr(self.fallback, name)(*args)
+        try:
+            return getattr(self, f"_db_{name}")(*args)
+        except DBAPIError:
+            if inspect(self.engine).has_table(self.table.name):
+                raise
+            print("[STATE] app_state table missing (run python migrations.py), "
+                  "using per-process memory state for now")
+            self._missing_until = time.monotonic() + self.recheck
+            return getattr(self.fallback, name)(*args)
+
+    def get(self, key, default=None):
+        return self._call("get", key, default)
+
+    def set(self, key, value):
+        return self._call("set", key, value)
+
+    def claim_interval(self, key, now, interval):
+        return self._call("claim_interval", key, now, interval)
+
+    def increment(self, key):
+        return self._call("increment", key)
+
+    def release(self, key):
+        return self._call("release", key)
+
+    def prune(self, prefix, older_than):
+        return self._call("prune", prefix, older_than)
+
+    # ---------------------------------------------------------
+    def _insert(self):
+        if self.engine.dialect.name == "postgresql":
+            return postgresql.insert(self.table)
+        return sqlite.insert(self.table)
+
+    def _db_get(self, key, default=None):
+        with self.engine.connect() as conn:
+            value = conn.execute(select(self.table.c.value).where(self.table.c.key == key)).scalar()
+        return default if value is None else json.loads(value)
+
+    def _db_set(self, key, value):
+        stmt = self._insert().values(key=key, value=json.dumps(value))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[self.table.c.key],
+            set_={"value": stmt.excluded.value, "updated_at": func.now()},
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+
+    def _db_claim_interval(self, key, now, interval):
+        """
+        True (and records `now`) if the last claim of `key` is at least
+        `interval` seconds old. One conditional upsert: concurrent callers
+        serialize on the row and only the first one updates it.
+        """
+        ts = now.timestamp()
+        c = self.table.c
+        stmt = self._insert().values(key=key, claimed_at=ts)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[c.key],
+            set_={"claimed_at": stmt.excluded.claimed_at, "updated_at": func.now()},
+            where=(c.claimed_at.is_(None)) | (c.claimed_at <= ts - interval),
+        )
+        with self.engine.begin() as conn:
+            return conn.execute(stmt).rowcount == 1
+
+    def _db_increment(self, key):
+        """Add 1 to the integer at `key` (missing = 0) and return the new value, in one upsert."""
+        c = self.table.c
+        stmt = self._insert().values(key=key, value="1")
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[c.key],
+            set_={"value": cast(cast(c.value, Integer) + 1, Text), "updated_at": func.now()},
+        ).returning(c.value)
+        with self.engine.begin() as conn:
+            return int(conn.execute(stmt).scalar())
+
+    def _db_release(self, key):
+        """Forget the claim of `key`: the next claim_interval() succeeds."""
+        with self.engine.begin() as conn:
+            conn.execute(update(self.table).where(self.table.c.key == key).values(claimed_at=None))
+
+    def _db_prune(self, prefix, older_than):
+        """Delete the keys starting with `prefix` not written for `older_than` seconds."""
+        c = self.table.c
+        cutoff = dt.datetime.now(dt.timezone.utc) - dt.timedelta(seconds=older_than)
+        with self.engine.begin() as conn:
+            return conn.execute(delete(self.table).where(c.key.startswith(prefix), c.updated_at < cutoff)).rowcount
+
+
+def make_state_store(backend, engine=None):
+    """'db' (default, shared) or 'memory' (per process)."""
+    if backend == "memory":
+        return MemoryStateStore()
+    if backend == "db":
+        return DatabaseStateStore(engine)
+    raise ValueError(f"unknown state backend: {backend}")
@@ -0,0 +1,36 @@
+# conftest.py
+import os
+import sys
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, text
+
+# the app modules import each other flat (`import db`, `from models import ...`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Postgres-only tests run when this points at a server they may create databases on:
+#   TEST_POSTGRES_URL=postgresql://postgres@localhost/postgres python -m pytest tests
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+@pytest.fixture
+def pg_engine():
+    """Engine on a fresh, empty database, dropped afterwards."""
+    if not TEST_POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL not set")
+
+    admin = create_engine(TEST_POSTGRES_URL, isolation_level="AUTOCOMMIT")
+    name = f"domisafe_test_{uuid.uuid4().hex[:12]}"
+    with admin.connect() as conn:
+        conn.execute(text(f"CREATE DATABASE {name}"))
+
+    engine = create_engine(admin.url.set(database=name))
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+        with admin.connect() as conn:
+            conn.execute(text(f"DROP DATABASE IF EXISTS {name}"))
+        admin.dispose()
+
@@ -0,0 +1,153 @@
+# test_commands.py
+import time
+
+from commands import CommandDispatcher
+from shared_state import MemoryStateStore
+
+
+class FakeInfo:
+    def __init__(self, ok=True):
+        self.ok = ok
+
+    def wait_for_publish(self, timeout=None):
+        pass
+
+    def is_published(self):
+        return self.ok
+
+
+class FakePublisher:
+    def __init__(self, connected=True):
+        self.connected = connected
+        self.sent = []
+
+    def publish(self, feed_key, value):
+        self.sent.append((feed_key, value))
+        return FakeInfo()
+
+
+class UnreachableState:
+    """A state store that must not be used."""
+
+    def __getattr__(self, name):
+        raise AssertionError(f"state.{name}() called")
+
+
+def _wait_status(dispatcher, command_id, *statuses, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        command = dispatcher.get(command_id)
+        if command and command["status"] in statuses:
+            return command
+        time.sleep(0.01)
+    return dispatcher.get(command_id)
+
+
+def test_submit_does_not_touch_the_state_store():
+    dispatcher = CommandDispatcher(UnreachableState(), publisher=FakePublisher())
+    command = dispatcher.submit("living_room_light", 1)
+
+    assert command["status"] == "queued"
+    # this worker can report it before it reached the store
+    assert dispatcher.get(command["id"])["status"] == "queued"
+
+
+def test_command_is_recorded_and_sent_over_mqtt():
+    state = MemoryStateStore()
+    publisher = FakePublisher()
+    dispatcher = CommandDispatcher(state, publisher=publisher)
+    dispatcher.start()
+    try:
+        command = dispatcher.submit("living_room_light", 1)
+        sent = _wait_status(dispatcher, command["id"], "sent")
+    finally:
+        dispatcher.stop()
+
+    assert sent["status"] == "sent" and sent["via"] == "mqtt"
+    assert sent["seq"] == 1
+    assert state.get(f"command.rec.{command['id']}")["status"] == "sent"
+    assert state.get("command.last")["id"] == command["id"]
+    assert publisher.sent == [("living_room_light", 1)]
+
+
+def test_commands_to_one_device_coalesce():
+    state = MemoryStateStore()
+    publisher = FakePublisher()
+    dispatcher = CommandDispatcher(state, publisher=publisher)
+    commands = [dispatcher.submit("bedroom_fan", value) for value in (1, 0, 1)]
+    other = dispatcher.submit("front_door", 1)
+    dispatcher.start()
+    try:
+        assert _wait_status(dispatcher, commands[-1]["id"], "sent")["status"] == "sent"
+        assert _wait_status(dispatcher, other["id"], "sent")["status"] == "sent"
+    finally:
+        dispatcher.stop()
+
+    assert publisher.sent == [("bedroom_fan", 1), ("front_door", 1)]
+    for older, newer in zip(commands, commands[1:]):
+        # every id answered by the store, even the ones never sent
+        recorded = state.get(f"command.rec.{older['id']}")
+        assert recorded["status"] == "superseded"
+        assert recorded["superseded_by"] == newer["id"]
+
+
+def test_older_command_from_another_worker_is_superseded():
+    state = MemoryStateStore()
+    first, second = FakePublisher(), FakePublisher()
+    worker1 = CommandDispatcher(state, publisher=first)
+    worker2 = CommandDispatcher(state, publisher=second)
+
+    old = worker1.submit("garage_door", "open")
+    worker1._record([], list(worker1._pending.values()))   # numbered, not sent yet
+    worker2.start()
+    try:
+        new = worker2.submit("garage_door", "close")
+        assert _wait_status(worker2, new["id"], "sent")["seq"] == 2
+        worker1.start()
+        assert _wait_status(worker1, old["id"], "superseded")["status"] == "superseded"
+    finally:
+        worker1.stop()
+        worker2.stop()
+
+    # the older command is never published after the newer one
+    assert second.sent == [("garage_door", "close")]
+    assert first.sent == []
+    assert worker2.get(old["id"])["status"] == "superseded"
+
+
+def test_fallback_when_mqtt_is_down():
+    state = MemoryStateStore()
+    calls = []
+    dispatcher = CommandDispatcher(state, publisher=FakePublisher(connected=False),
+                                   fallback=lambda device, value: calls.append((device, value)))
+    dispatcher.start()
+    try:
+        command = dispatcher.submit("bedroom_fan", 1)
+        assert _wait_status(dispatcher, command["id"], "sent")["via"] == "rest"
+        failing = CommandDispatcher(state)
+        failing.start()
+        broken = failing.submit("bedroom_fan", 0)
+        assert _wait_status(failing, broken["id"], "failed")["error"] == "no publisher available"
+        failing.stop()
+    finally:
+        dispatcher.stop()
+    assert calls == [("bedroom_fan", 1)]
+
+
+def test_prune_keeps_the_sequences():
+    state = MemoryStateStore()
+    dispatcher = CommandDispatcher(state, publisher=FakePublisher(), keep=3600)
+    dispatcher.start()
+    try:
+        first = dispatcher.submit("bedroom_fan", 1)
+        _wait_status(dispatcher, first["id"], "sent")
+        for key in list(state._updated):
+            state._updated[key] -= 7200   # everything is two hours old
+
+        assert dispatcher.prune() == 1
+        assert dispatcher.get(first["id"]) is None
+
+        second = dispatcher.submit("bedroom_fan", 0)
+        assert _wait_status(dispatcher, second["id"], "sent")["seq"] == 2
+    finally:
+        dispatcher.stop()
@@ -0,0 +1,72 @@
+# test_downsample.py
+import datetime as dt
+from zoneinfo import ZoneInfo
+
+from downsample import lttb, sum_rebucket
+
+UTC = dt.timezone.utc
+TORONTO = ZoneInfo("America/Toronto")
+
+
+def _series(n, value=lambda i: 0.0, start=dt.datetime(2026, 1, 1, tzinfo=UTC), step=60):
+    return [(start + dt.timedelta(seconds=i * step), value(i)) for i in range(n)]
+
+
+def test_lttb_keeps_threshold_points_and_the_ends():
+    points = _series(1000, lambda i: (i % 17) * 1.5)
+    out = lttb(points, 100)
+    assert len(out) == 100
+    assert out[0] == points[0]
+    assert out[-1] == points[-1]
+    # a subset of the input, still in time order
+    assert all(p in points for p in out)
+    assert [p[0] for p in out] == sorted(p[0] for p in out)
+
+
+def test_lttb_keeps_a_single_spike():
+    points = _series(1000)
+    points[437] = (points[437][0], 50.0)
+    assert points[437] in lttb(points, 50)
+
+
+def test_lttb_returns_short_series_unchanged():
+    points = _series(10, float)
+    assert lttb(points, 10) == points
+    assert lttb(points, 2) == points
+    assert lttb(points, 50) is not points
+
+
+def test_sum_rebucket_keeps_totals_and_step_multiples():
+    start = dt.datetime(2026, 1, 1, tzinfo=UTC)
+    end = start + dt.timedelta(days=7)
+    points = [(start + dt.timedelta(minutes=5 * i), i % 4) for i in range(7 * 288)]
+
+    out, width = sum_rebucket(points, start, end, 300, 300)
+    assert width % 300 == 0
+    assert len(out) <= 300
+    assert sum(c for _, c in out) == sum(c for _, c in points)
+    # every label is a bucket boundary
+    assert all((ts - start).total_seconds() % width == 0 for ts, _ in out)
+
+
+def test_sum_rebucket_short_range_is_unchanged():
+    start = dt.datetime(2026, 1, 1, tzinfo=UTC)
+    points = [(start, 2), (start + dt.timedelta(minutes=5), 1)]
+    out, width = sum_rebucket(points, start, start + dt.timedelta(hours=1), 300, 300)
+    assert (out, width) == (points, 300)
+
+
+def test_sum_rebucket_labels_across_dst_change():
+    # 2026-03-08 02:00 EST → 03:00 EDT falls inside the range
+    start = dt.datetime(2026, 3, 7, tzinfo=TORONTO)
+    end = start + dt.timedelta(days=2)
+    event = dt.datetime(2026, 3, 8, 7, 0, tzinfo=TORONTO)
+
+    out, width = sum_rebucket([(start, 1), (event, 3)], start, end, 96, 300)
+    assert width == 1800
+    (first, c1), (label, c2) = out
+    assert (first, c1) == (start, 1)
+    # the bucket is labelled with the real instant it starts at, not an hour off
+    assert c2 == 3
+    assert label == event
+    assert label.astimezone(TORONTO).hour == 7
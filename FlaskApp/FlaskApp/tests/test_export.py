@@ -0,0 +1,69 @@
+# test_export.py
+import csv
+import datetime as dt
+import gzip
+import io
+import json
+
+import pytest
+from sqlalchemy import create_engine
+
+import export
+import migrations
+from models import EnvironmentData
+
+UTC = dt.timezone.utc
+T0 = dt.datetime(2026, 5, 1, 12, 0, tzinfo=UTC)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    migrations.migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(EnvironmentData.__table__.insert(), [
+            {"timestamp": T0 + dt.timedelta(minutes=i), "temperature": 20.0 + i, "humidity": 40.0, "pressure": 1000.0}
+            for i in range(5)
+        ])
+    yield engine
+    engine.dispose()
+
+
+def _body(chunks):
+    return b"".join(chunks).decode("utf-8")
+
+
+def test_ndjson_in_range_oldest_first(engine):
+    body = _body(export.stream(engine, "environment", "ndjson",
+                               start=T0 + dt.timedelta(minutes=1), end=T0 + dt.timedelta(minutes=4)))
+    rows = [json.loads(line) for line in body.splitlines()]
+    assert [r["temperature"] for r in rows] == [21.0, 22.0, 23.0]
+    assert rows[0]["timestamp"] == "2026-05-01T12:01:00Z"
+
+
+def test_csv_has_a_header_and_every_row(engine):
+    rows = list(csv.DictReader(io.StringIO(_body(export.stream(engine, "environment", "csv")))))
+    assert len(rows) == 5
+    assert list(rows[0]) == export.columns(EnvironmentData)
+
+
+def test_empty_csv_is_just_the_header(engine):
+    body = _body(export.stream(engine, "motion", "csv"))
+    assert body == ",".join(export.columns(export.EXPORT_MODELS["motion"])) + "\n"
+
+
+def test_gzip_round_trip(engine):
+    plain = b"".join(export.stream(engine, "environment", "ndjson"))
+    packed = b"".join(export.stream(engine, "environment", "ndjson", compress=True))
+    assert gzip.decompress(packed) == plain
+
+
+def test_small_fetches_give_the_same_rows(engine):
+    assert _body(export.stream(engine, "environment", batch_size=2)) == _body(export.stream(engine, "environment"))
+
+
+def test_chunks_group_lines():
+    lines = [f"{i:09d}\n" for i in range(100)]   # 10 bytes each
+    chunks = list(export.chunked(lines, size=250))
+    assert [len(c) for c in chunks] == [250] * 4
+    assert b"".join(chunks).decode() == "".join(lines)
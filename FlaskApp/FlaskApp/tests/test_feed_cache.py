@@ -0,0 +1,76 @@
+# test_feed_cache.py
+import threading
+import time
+
+import pytest
+
+from feed_cache import FeedCache
+
+
+def test_concurrent_misses_share_one_fetch():
+    release = threading.Event()
+    calls = []
+
+    def loader(key):
+        calls.append(key)
+        release.wait(5)
+        return f"value of {key}"
+
+    cache = FeedCache(loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("temp"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    # everyone is waiting on the single fetch
+    deadline = time.monotonic() + 5
+    while cache.misses < 8 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert calls == ["temp"]
+    assert results == ["value of temp"] * 8
+    assert cache.misses == 8
+
+
+def test_fresh_value_is_served_from_memory():
+    calls = []
+    cache = FeedCache(lambda key: calls.append(key) or len(calls), ttl=60)
+    assert cache.get("temp") == 1
+    assert cache.get("temp") == 1
+    assert calls == ["temp"]
+    assert cache.hits == 1
+
+
+def test_stale_value_is_served_while_refreshing():
+    values = iter([1, 2])
+    cache = FeedCache(lambda key: next(values), ttl=0, stale_ttl=60)
+    assert cache.get("temp") == 1
+    assert cache.get("temp") == 1   # stale: returned right away, refresh in the background
+    assert cache.stale_hits == 1
+
+    deadline = time.monotonic() + 5
+    while cache._flights and time.monotonic() < deadline:
+        time.sleep(0.01)
+    cache.ttl = 60
+    assert cache.get("temp") == 2
+
+
+def test_errors_are_not_cached_and_old_value_wins():
+    state = {"fail": False}
+
+    def loader(key):
+        if state["fail"]:
+            raise RuntimeError("upstream down")
+        return 1
+
+    cache = FeedCache(loader, ttl=0, stale_ttl=0)
+    assert cache.get("temp") == 1
+    state["fail"] = True
+    assert cache.get("temp") == 1   # expired, refresh failed → last known value
+
+    with pytest.raises(RuntimeError):
+        cache.get("other")
+    state["fail"] = False
+    assert cache.get("other") == 1
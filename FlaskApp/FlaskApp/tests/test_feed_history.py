@@ -0,0 +1,124 @@
+# test_feed_history.py
+import datetime as dt
+
+import feed_history
+from feed_history import FeedHistory, parse_created_at
+
+UTC = dt.timezone.utc
+NOW = dt.datetime(2026, 5, 1, 12, 0, tzinfo=UTC)
+
+
+def _iso(ts):
+    return ts.isoformat().replace("+00:00", "Z")
+
+
+class FakeResponse:
+    def __init__(self, rows, links=None):
+        self.rows = rows
+        self.links = links or {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.rows
+
+
+class FakeFeedClient:
+    """Adafruit-like feed data: newest first, start_time/end_time inclusive, `limit` per page."""
+
+    def __init__(self):
+        self.rows = []   # dicts, any order
+        self.calls = []
+
+    def add(self, minutes_ago, value):
+        ts = NOW - dt.timedelta(minutes=minutes_ago)
+        self.rows.append({"id": f"id-{len(self.rows)}", "created_at": _iso(ts), "value": str(value)})
+
+    def get(self, path, params=None):
+        self.calls.append(dict(params))
+        start = parse_created_at(params["start_time"])
+        end = parse_created_at(params["end_time"]) if "end_time" in params else None
+        rows = [r for r in self.rows
+                if parse_created_at(r["created_at"]) >= start
+                and (end is None or parse_created_at(r["created_at"]) <= end)]
+        rows.sort(key=lambda r: r["created_at"], reverse=True)
+        return FakeResponse(rows[:int(params["limit"])])
+
+
+def test_first_read_back_fills_the_window():
+    client = FakeFeedClient()
+    for minutes_ago, value in ((90, 1), (50, 2), (10, 3)):
+        client.add(minutes_ago, value)
+    history = FeedHistory(client)
+
+    points = history.points_since("temp", NOW - dt.timedelta(hours=1), now=NOW)
+    assert [v for _, v in points] == [2.0, 3.0]
+    assert client.calls[0]["start_time"] == _iso(NOW - dt.timedelta(hours=1))
+
+
+def test_later_reads_only_fetch_the_delta_without_duplicates():
+    client = FakeFeedClient()
+    client.add(10, 1)
+    client.add(5, 2)
+    history = FeedHistory(client, min_interval=0)
+    history.points_since("temp", NOW - dt.timedelta(hours=1), now=NOW)
+
+    client.add(1, 3)
+    points = history.points_since("temp", NOW - dt.timedelta(hours=1), now=NOW)
+
+    # asks from the newest point held; that point comes back and is not added twice
+    assert client.calls[-1]["start_time"] == _iso(NOW - dt.timedelta(minutes=5))
+    assert [v for _, v in points] == [1.0, 2.0, 3.0]
+
+
+def test_reads_within_min_interval_are_served_from_memory():
+    client = FakeFeedClient()
+    client.add(5, 1)
+    history = FeedHistory(client, min_interval=60)
+    for _ in range(3):
+        history.points_since("temp", NOW - dt.timedelta(hours=1), now=NOW)
+    assert len(client.calls) == 1
+
+
+def test_pages_until_everything_is_fetched(monkeypatch):
+    monkeypatch.setattr(feed_history, "PAGE_LIMIT", 4)
+    client = FakeFeedClient()
+    for i in range(10):
+        client.add(50 - i, i)
+    history = FeedHistory(client)
+
+    points = history.points_since("temp", NOW - dt.timedelta(hours=1), now=NOW)
+    assert [v for _, v in points] == [float(i) for i in range(10)]
+    assert len(client.calls) > 1
+
+
+def test_follows_the_link_header():
+    pages = [
+        FakeResponse([{"id": "b", "created_at": _iso(NOW - dt.timedelta(minutes=1)), "value": "2"}],
+                     links={"next": {"url": "https://io.example/api/v2/u/feeds/temp/data?start_time=x&limit=1000&before=b"}}),
+        FakeResponse([{"id": "a", "created_at": _iso(NOW - dt.timedelta(minutes=2)), "value": "1"}]),
+    ]
+
+    class Client:
+        calls = []
+
+        def get(self, path, params=None):
+            self.calls.append(params)
+            return pages.pop(0)
+
+    client = Client()
+    points = FeedHistory(client).points_since("temp", NOW - dt.timedelta(hours=1), now=NOW)
+    assert [v for _, v in points] == [1.0, 2.0]
+    assert client.calls[1]["before"] == "b"
+
+
+def test_points_leave_with_the_window():
+    client = FakeFeedClient()
+    client.add(50, 1)
+    client.add(5, 2)
+    history = FeedHistory(client, min_interval=60)
+    history.points_since("temp", NOW - dt.timedelta(hours=1), now=NOW)
+
+    later = NOW + dt.timedelta(minutes=20)
+    assert [v for _, v in history.points_since("temp", later - dt.timedelta(hours=1), now=later)] == [2.0]
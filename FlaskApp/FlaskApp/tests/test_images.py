@@ -0,0 +1,94 @@
+# test_images.py
+import os
+
+import pytest
+
+import app as app_module
+import images
+from images import ImageStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    root = tmp_path / "captured_images"
+    root.mkdir()
+    (root / "intruder_1.jpg").write_bytes(bytes(range(256)) * 4)
+    os.utime(root / "intruder_1.jpg", (1_700_000_000, 1_700_000_000))
+    return ImageStore(str(root), str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def client(store, monkeypatch):
+    monkeypatch.setattr(app_module, "image_store", store)
+    monkeypatch.setattr(app_module, "STATE_BACKEND", "memory")
+    return app_module.create_app(start_background=False).test_client()
+
+
+def test_listing_links_carry_the_version(client, store):
+    data = client.get("/api/images").get_json()
+    assert data["total"] == 1
+    (info,) = data["images"]
+    version = store.version(os.path.join(store.root, "intruder_1.jpg"))
+    assert info["name"] == "intruder_1.jpg"
+    assert info["urls"]["original"].endswith(f"size=original&v={version}")
+
+
+def test_etag_and_conditional_get(client):
+    first = client.get("/api/images/intruder_1.jpg?size=original")
+    assert first.status_code == 200
+    assert first.data == bytes(range(256)) * 4
+    etag = first.headers["ETag"]
+
+    again = client.get("/api/images/intruder_1.jpg?size=original", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+
+
+def test_range_request(client):
+    r = client.get("/api/images/intruder_1.jpg?size=original", headers={"Range": "bytes=10-19"})
+    assert r.status_code == 206
+    assert r.data == bytes(range(10, 20))
+    assert r.headers["Content-Range"] == "bytes 10-19/1024"
+
+
+def test_versioned_url_is_immutable(client, store):
+    version = store.version(os.path.join(store.root, "intruder_1.jpg"))
+    pinned = client.get(f"/api/images/intruder_1.jpg?size=original&v={version}")
+    assert pinned.cache_control.immutable
+    assert pinned.cache_control.max_age == app_module.IMAGE_MAX_AGE
+
+    unpinned = client.get("/api/images/intruder_1.jpg?size=original")
+    assert not unpinned.cache_control.immutable
+    assert unpinned.cache_control.max_age == 300
+
+
+def test_bad_requests(client):
+    assert client.get("/api/images/intruder_1.jpg?size=huge").status_code == 400
+    assert client.get("/api/images/missing.jpg").status_code == 404
+    assert client.get("/api/images/..%2Fsecret.jpg").status_code == 404
+
+
+def test_version_follows_the_file(store):
+    path = os.path.join(store.root, "intruder_1.jpg")
+    before = store.version(path)
+    with open(path, "ab") as f:
+        f.write(b"more")
+    assert store.version(path) != before
+
+
+@pytest.mark.skipif(images.cv2 is None, reason="OpenCV not installed")
+def test_derivative_is_rendered_once_and_shared_by_identical_files(tmp_path):
+    import numpy as np
+
+    root = tmp_path / "captured_images"
+    root.mkdir()
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    images.cv2.imwrite(str(root / "a.jpg"), frame)
+    (root / "b.jpg").write_bytes((root / "a.jpg").read_bytes())
+    store = ImageStore(str(root), str(tmp_path / "cache"))
+
+    thumb, digest = store.derivative(str(root / "a.jpg"), "thumb")
+    assert thumb.endswith(f"{digest}_thumb.jpg")
+    assert max(images.cv2.imread(thumb).shape[:2]) == images.SIZES["thumb"]
+    # same bytes under another name: the cached file is reused
+    assert store.derivative(str(root / "b.jpg"), "thumb")[0] == thumb
+    assert len(os.listdir(tmp_path / "cache")) == 1
@@ -0,0 +1,93 @@
+# test_ingest.py
+import datetime as dt
+
+from ingest import FeedIngestor, parse_payload
+from models import EnvironmentData, MotionEvent
+from shared_state import MemoryStateStore
+
+UTC = dt.timezone.utc
+T0 = dt.datetime(2026, 5, 1, 12, 0, tzinfo=UTC)
+FEEDS = {"temperature": "temp", "humidity": "hum", "pressure": "pres", "motion": "motion"}
+
+
+class FakeWriter:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, model, row):
+        self.rows.append((model, row))
+
+
+class CountingState(MemoryStateStore):
+    def __init__(self):
+        super().__init__()
+        self.claims = 0
+
+    def claim_interval(self, key, now, interval):
+        self.claims += 1
+        return super().claim_interval(key, now, interval)
+
+
+def _ingestor(state=None, on_reading=None):
+    return FeedIngestor("user", "key", FEEDS, FakeWriter(), UTC,
+                        env_store_interval_min=5, state=state, on_reading=on_reading)
+
+
+def _env(ingestor, now):
+    for sensor, value in (("temperature", "21.5"), ("humidity", "40"), ("pressure", "1012")):
+        ingestor.handle_reading(sensor, value, now)
+
+
+def test_one_environment_snapshot_per_interval():
+    ingestor = _ingestor()
+    for minute in range(0, 12):
+        _env(ingestor, T0 + dt.timedelta(minutes=minute))
+
+    stored = [row for model, row in ingestor.writer.rows if model is EnvironmentData]
+    assert [row["timestamp"] for row in stored] == [T0, T0 + dt.timedelta(minutes=5), T0 + dt.timedelta(minutes=10)]
+    assert stored[0]["temperature"] == 21.5
+
+
+def test_claims_only_hit_the_state_store_when_due():
+    state = CountingState()
+    ingestor = _ingestor(state)
+    for second in range(0, 600, 10):
+        _env(ingestor, T0 + dt.timedelta(seconds=second))
+    # one claim per 5-minute interval, not one per message
+    assert state.claims == 2
+
+
+def test_workers_sharing_state_store_each_row_once():
+    state = MemoryStateStore()
+    workers = [_ingestor(state), _ingestor(state)]
+    for minute in range(0, 11):
+        for worker in workers:
+            _env(worker, T0 + dt.timedelta(minutes=minute))
+            worker.handle_reading("motion", "1", T0 + dt.timedelta(minutes=minute))
+
+    rows = [row for worker in workers for row in worker.writer.rows]
+    assert sum(model is EnvironmentData for model, _ in rows) == 3
+    assert sum(model is MotionEvent for model, _ in rows) == 11
+
+
+def test_motion_is_deduplicated():
+    ingestor = _ingestor()
+    for second in (0, 5, 14, 15, 16):
+        ingestor.handle_reading("motion", "1", T0 + dt.timedelta(seconds=second))
+    ingestor.handle_reading("motion", "0", T0 + dt.timedelta(seconds=40))
+
+    stamps = [row["timestamp"] for model, row in ingestor.writer.rows if model is MotionEvent]
+    assert stamps == [T0, T0 + dt.timedelta(seconds=15)]
+
+
+def test_on_reading_gets_the_rest_shape():
+    seen = []
+    ingestor = _ingestor(on_reading=lambda sensor, latest: seen.append((sensor, latest)))
+    ingestor.handle_reading("temperature", "21.5", T0)
+    assert seen == [("temperature", {"value": "21.5", "created_at": "2026-05-01T12:00:00Z", "feed_key": "temp"})]
+
+
+def test_parse_payload():
+    assert parse_payload(" 21.5 ") == ("21.5", None)
+    assert parse_payload('{"value": 3, "created_at": "2026-05-01T12:00:00Z"}') == ("3", T0)
+    assert parse_payload('{"value": 3}') == ("3", None)
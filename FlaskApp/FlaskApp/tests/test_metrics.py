@@ -0,0 +1,95 @@
+# test_metrics.py
+import json
+import os
+import subprocess
+import sys
+
+import metrics
+from metrics import Registry
+
+
+def _lines(registry):
+    return [line for line in registry.render().splitlines() if not line.startswith("#")]
+
+
+def test_counter_and_labels():
+    registry = Registry()
+    hits = registry.counter("hits_total", "Hits", ("route",))
+    hits.inc(route="/a")
+    hits.inc(2, route="/a")
+    hits.inc(route='say "hi"')
+    assert _lines(registry) == ['hits_total{route="/a"} 3', 'hits_total{route="say \\"hi\\""} 1']
+    assert "# TYPE hits_total counter" in registry.render()
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value)
+    assert _lines(registry) == [
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1.0"} 2',
+        'latency_seconds_bucket{le="+Inf"} 3',
+        "latency_seconds_count 3",
+        "latency_seconds_sum 5.55",
+    ]
+
+
+def test_gauge_is_read_at_scrape_time_and_errors_are_skipped():
+    registry = Registry()
+    depth = {"value": 1}
+    registry.gauge("depth", "Depth", lambda: depth["value"])
+    registry.gauge("pool", "Pool", lambda: {("size",): 5, ("overflow",): None}, ("state",))
+    registry.gauge("broken", "Broken", lambda: 1 / 0)
+
+    depth["value"] = 7
+    assert _lines(registry) == ["depth 7", 'pool{state="size"} 5']
+
+
+def _dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def _snapshot(directory, pid, data):
+    with open(os.path.join(directory, f"metrics_{pid}.json"), "w") as f:
+        json.dump(data, f)
+
+
+def test_multiprocess_adds_up_the_workers(tmp_path):
+    registry = Registry()
+    registry.multiproc_dir = str(tmp_path)   # as enable_multiprocess(), without the writer thread
+    requests_total = registry.counter("requests_total", "Requests")
+    registry.gauge("queue_depth", "Depth", lambda: 2)
+    registry.gauge("circuit_open", "Open", lambda: 0, mode="max")
+    requests_total.inc(5)
+
+    alive, dead = os.getppid(), _dead_pid()
+    _snapshot(tmp_path, alive, {"requests_total": [["requests_total", "", 10]],
+                                "queue_depth": [["queue_depth", "", 3]],
+                                "circuit_open": [["circuit_open", "", 1]]})
+    _snapshot(tmp_path, dead, {"requests_total": [["requests_total", "", 100]],
+                               "queue_depth": [["queue_depth", "", 50]]})
+
+    # counters keep what exited workers counted; gauges only count live ones
+    assert _lines(registry) == ["requests_total 115", "queue_depth 5", "circuit_open 1"]
+
+
+def test_snapshot_round_trip(tmp_path):
+    writer = Registry()
+    writer.multiproc_dir = str(tmp_path)
+    writer.counter("jobs_total", "Jobs").inc(4)
+    writer.write_snapshot()
+
+    with open(tmp_path / f"metrics_{os.getpid()}.json") as f:
+        assert json.load(f) == {"jobs_total": [["jobs_total", "", 4]]}
+    # its own file is not added a second time
+    assert _lines(writer) == ["jobs_total 4"]
+
+
+def test_feed_of():
+    assert metrics._feed_of("feeds/temperature/data") == "temperature"
+    assert metrics._feed_of("/feeds/motion") == "motion"
+    assert metrics._feed_of("groups") == "groups"
@@ -0,0 +1,37 @@
+# test_migrations.py
+"""
+Migrations and the EXPLAIN index check on SQLite (no server needed);
+the Postgres-specific steps are in test_migrations_postgres.py.
+"""
+from sqlalchemy import create_engine, inspect
+
+import migrations
+
+
+def _engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+
+
+def test_fresh_database_gets_every_migration(tmp_path):
+    engine = _engine(tmp_path)
+    assert migrations.migrate(engine) == [v for v, _, _ in migrations.MIGRATIONS]
+    assert migrations.pending_versions(engine) == []
+    assert migrations.migrate(engine) == []
+
+    indexes = {ix["name"] for ix in inspect(engine).get_indexes("environment_data")}
+    assert "ix_environment_data_timestamp" in indexes
+
+
+def test_range_query_uses_timestamp_index(tmp_path):
+    engine = _engine(tmp_path)
+    migrations.migrate(engine)
+    for table in ("environment_data", "motion_events"):
+        plan, used = migrations.explain_range_query(engine, table, f"ix_{table}_timestamp")
+        assert used, plan
+
+
+def test_explain_reports_a_missing_index(tmp_path):
+    engine = _engine(tmp_path)
+    migrations.migrate(engine)
+    plan, used = migrations.explain_range_query(engine, "environment_data", "ix_does_not_exist")
+    assert not used
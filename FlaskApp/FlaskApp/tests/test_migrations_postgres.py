@@ -0,0 +1,116 @@
+# test_migrations_postgres.py
+"""
+Migration 3 (daily partitions) and partition retention against a real
+PostgreSQL server. Skipped unless TEST_POSTGRES_URL is set (see conftest).
+"""
+import datetime as dt
+
+from sqlalchemy import text
+
+import migrations
+import retention
+
+UTC = dt.timezone.utc
+
+
+def _legacy_schema(engine):
+    """The schema of a deploy from before migration 3: plain tables, timestamp indexes."""
+    for version, _, fn in migrations.MIGRATIONS:
+        if version < 3:
+            fn(engine)
+
+
+def test_partition_migration_keeps_rows_and_ids(pg_engine):
+    _legacy_schema(pg_engine)
+    now = dt.datetime.now(UTC)
+    with pg_engine.begin() as conn:
+        for days_ago in (3, 2, 0):
+            conn.execute(
+                text("INSERT INTO environment_data (timestamp, temperature, humidity, pressure) "
+                     "VALUES (:t, 20.5, 40, 1000)"),
+                {"t": now - dt.timedelta(days=days_ago)},
+            )
+            conn.execute(text("INSERT INTO motion_events (timestamp) VALUES (:t)"),
+                         {"t": now - dt.timedelta(days=days_ago)})
+        before = conn.execute(text("SELECT id, timestamp FROM environment_data ORDER BY id")).fetchall()
+
+    assert 3 in migrations.migrate(pg_engine)
+    assert migrations.pending_versions(pg_engine) == []
+
+    with pg_engine.begin() as conn:
+        for table in retention.PARTITIONED_TABLES:
+            assert retention.is_partitioned(conn, table)
+            days = retention.list_partitions(conn, table)
+            assert (now - dt.timedelta(days=3)).date() in days
+            assert now.date() + dt.timedelta(days=7) in days
+
+        after = conn.execute(text("SELECT id, timestamp FROM environment_data ORDER BY id")).fetchall()
+        assert after == before
+
+        # the id sequence carried over: new rows continue after the old ones
+        new_id = conn.execute(text(
+            "INSERT INTO environment_data (temperature) VALUES (21) RETURNING id"
+        )).scalar()
+        assert new_id > before[-1][0]
+
+        # every row sits in a daily partition, none fell through to the default one
+        assert conn.execute(text("SELECT count(*) FROM environment_data_default")).scalar() == 0
+
+
+def test_migrations_rerun_is_noop(pg_engine):
+    migrations.migrate(pg_engine)
+    assert migrations.migrate(pg_engine) == []
+
+
+def test_range_query_uses_timestamp_index(pg_engine):
+    migrations.migrate(pg_engine)
+    for table in retention.PARTITIONED_TABLES:
+        plan, used = migrations.explain_range_query(pg_engine, table, f"ix_{table}_timestamp")
+        assert used, plan
+
+
+def test_retention_drops_old_partitions(pg_engine):
+    migrations.migrate(pg_engine)
+    old_day = dt.datetime.now(UTC).date() - dt.timedelta(days=10)
+    with pg_engine.begin() as conn:
+        retention.ensure_partitions(conn, "motion_events", old_day, old_day)
+
+    report = retention.run_retention(pg_engine, raw_days=7)
+
+    assert report["motion_events"] != "0 partitions dropped"
+    with pg_engine.begin() as conn:
+        assert old_day not in retention.list_partitions(conn, "motion_events")
+
+
+def test_retention_skips_while_another_run_holds_the_lock(pg_engine):
+    migrations.migrate(pg_engine)
+    with pg_engine.connect() as other:
+        other.execute(text("SELECT pg_advisory_lock(:id)"), {"id": retention.ADVISORY_LOCK_ID})
+        try:
+            assert "skipped" in retention.run_retention(pg_engine)
+        finally:
+            other.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": retention.ADVISORY_LOCK_ID})
+
+    assert "skipped" not in retention.run_retention(pg_engine)
+
+
+def test_rows_in_the_default_partition_are_moved_and_expired(pg_engine):
+    migrations.migrate(pg_engine)
+    today = dt.datetime.now(UTC).date()
+    future = dt.datetime.combine(today + dt.timedelta(days=30), dt.time(12), UTC)
+    old = dt.datetime.combine(today - dt.timedelta(days=30), dt.time(12), UTC)
+    with pg_engine.begin() as conn:
+        for ts in (future, old):
+            conn.execute(text("INSERT INTO motion_events (timestamp) VALUES (:t)"), {"t": ts})
+        assert conn.execute(text("SELECT count(*) FROM motion_events_default")).scalar() == 2
+
+    # creating the future day's partition must not trip over the row waiting for it
+    with pg_engine.begin() as conn:
+        retention.ensure_partitions(conn, "motion_events", future.date(), future.date())
+    report = retention.run_retention(pg_engine, raw_days=7)
+
+    assert "1 rows deleted from motion_events_default" in report["motion_events"]
+    with pg_engine.begin() as conn:
+        assert conn.execute(text("SELECT count(*) FROM motion_events_default")).scalar() == 0
+        name = retention.partition_name("motion_events", future.date())
+        assert conn.execute(text(f"SELECT timestamp FROM {name}")).scalar() == future
@@ -0,0 +1,57 @@
+# test_response_cache.py
+from response_cache import ResponseCache
+
+
+def test_etag_is_a_content_hash():
+    cache = ResponseCache()
+    etag = cache.put("a", b'{"x": 1}')
+    assert etag == ResponseCache.etag_for(b'{"x": 1}')
+    # same body under another key (or in another worker): same ETag
+    assert ResponseCache().put("b", b'{"x": 1}') == etag
+    assert cache.put("a", b'{"x": 2}') != etag
+    assert cache.get("a") == (b'{"x": 2}', ResponseCache.etag_for(b'{"x": 2}'))
+
+
+def test_hits_and_misses():
+    cache = ResponseCache()
+    assert cache.get("a") is None
+    cache.put("a", b"1")
+    assert cache.get("a") is not None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used_within_max_bytes():
+    cache = ResponseCache(max_bytes=30)
+    for key in "abc":
+        cache.put(key, b"x" * 10)
+    cache.get("a")              # a is now the most recently used
+    cache.put("d", b"x" * 10)   # over budget → b goes
+
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in "acd")
+    assert cache.size == 30
+
+
+def test_replacing_a_key_updates_the_size():
+    cache = ResponseCache(max_bytes=100)
+    cache.put("a", b"x" * 40)
+    cache.put("a", b"x" * 10)
+    assert cache.size == 10
+
+
+def test_oversized_body_is_not_cached():
+    cache = ResponseCache(max_bytes=10)
+    cache.put("small", b"x" * 5)
+    etag = cache.put("big", b"x" * 11)
+    assert etag == ResponseCache.etag_for(b"x" * 11)
+    assert cache.get("big") is None
+    assert cache.get("small") is not None
+    assert cache.size == 5
+
+
+def test_clear():
+    cache = ResponseCache()
+    cache.put("a", b"1")
+    cache.clear()
+    assert cache.get("a") is None
+    assert cache.size == 0
@@ -0,0 +1,98 @@
+# test_shared_state.py
+import datetime as dt
+import threading
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import migrations
+from shared_state import DatabaseStateStore, MemoryStateStore
+
+UTC = dt.timezone.utc
+T0 = dt.datetime(2026, 5, 1, 12, 0, tzinfo=UTC)
+
+
+@pytest.fixture(params=["memory", "sqlite", "postgres"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStateStore()
+    if request.param == "sqlite":
+        engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    else:
+        engine = request.getfixturevalue("pg_engine")
+    migrations.migrate(engine)
+    return DatabaseStateStore(engine)
+
+
+def _age(store, key, seconds):
+    """Pretend `key` was last written `seconds` ago."""
+    if isinstance(store, MemoryStateStore):
+        store._updated[key] -= seconds
+        return
+    with store.engine.begin() as conn:
+        conn.execute(text("UPDATE app_state SET updated_at = :t WHERE key = :k"),
+                     {"t": dt.datetime.now(UTC) - dt.timedelta(seconds=seconds), "k": key})
+
+
+def test_get_set_round_trip(store):
+    assert store.get("armed", "missing") == "missing"
+    store.set("armed", {"on": True, "by": "ui"})
+    assert store.get("armed") == {"on": True, "by": "ui"}
+    store.set("armed", False)
+    assert store.get("armed") is False
+
+
+def test_claim_interval_once_per_interval(store):
+    assert store.claim_interval("job", T0, 60)
+    assert not store.claim_interval("job", T0 + dt.timedelta(seconds=59), 60)
+    assert store.claim_interval("job", T0 + dt.timedelta(seconds=60), 60)
+    # keys are independent
+    assert store.claim_interval("other", T0, 60)
+
+
+def test_released_lease_can_be_claimed_again(store):
+    assert store.claim_interval("lock", T0, 30)
+    assert not store.claim_interval("lock", T0 + dt.timedelta(seconds=1), 30)
+    store.release("lock")
+    assert store.claim_interval("lock", T0 + dt.timedelta(seconds=1), 30)
+
+
+def test_concurrent_claims_have_one_winner(store):
+    wins = []
+    barrier = threading.Barrier(8)
+
+    def claim():
+        barrier.wait()
+        wins.append(store.claim_interval("race", T0, 60))
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(wins) == [False] * 7 + [True]
+
+
+def test_increment_counts_from_one(store):
+    assert [store.increment("seq") for _ in range(3)] == [1, 2, 3]
+    assert store.get("seq") == 3
+
+
+def test_prune_only_old_keys_with_the_prefix(store):
+    for key in ("command.a", "command.b", "armed"):
+        store.set(key, 1)
+    _age(store, "command.a", 7200)
+    _age(store, "armed", 7200)
+
+    assert store.prune("command.", 3600) == 1
+    assert store.get("command.a") is None
+    assert store.get("command.b") == 1
+    assert store.get("armed") == 1
+
+
+def test_missing_table_falls_back_to_memory(tmp_path):
+    store = DatabaseStateStore(create_engine(f"sqlite:///{tmp_path / 'empty.db'}"))
+    store.set("armed", True)
+    assert store.get("armed") is True
+    assert store.claim_interval("job", T0, 60)
+    assert not store.claim_interval("job", T0, 60)
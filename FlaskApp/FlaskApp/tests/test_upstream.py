@@ -0,0 +1,111 @@
+# test_upstream.py
+import time
+
+import pytest
+import requests
+
+from upstream import AdafruitClient, CircuitBreaker, CircuitOpenError
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeSession:
+    """Plays back responses (or raises exceptions) in order, recording the calls."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+def _client(outcomes, **kwargs):
+    client = AdafruitClient("https://io.example/api/v2/", {"X-AIO-Key": "k"}, **kwargs)
+    client.session = FakeSession(outcomes)
+    client._sleep_backoff = lambda attempt, retry_after=None: None
+    return client
+
+
+def test_get_is_retried_on_5xx_and_connection_errors():
+    client = _client([503, requests.ConnectionError("reset"), 200])
+    assert client.get("feeds/temp").status_code == 200
+    assert client.session.calls == [("GET", "https://io.example/api/v2/feeds/temp")] * 3
+    assert client.breaker.failures == 0
+
+
+def test_gives_up_after_max_retries_and_returns_the_last_response():
+    client = _client([500, 502, 503], max_retries=2)
+    assert client.get("feeds/temp").status_code == 503
+    assert client.breaker.failures == 1
+
+
+def test_4xx_is_not_retried():
+    client = _client([404])
+    assert client.get("feeds/missing").status_code == 404
+    assert len(client.session.calls) == 1
+
+
+def test_post_is_only_retried_when_it_surely_did_not_arrive():
+    client = _client([503])
+    assert client.post("feeds/x/data").status_code == 503
+    assert len(client.session.calls) == 1
+
+    client = _client([requests.ReadTimeout("slow")])
+    with pytest.raises(requests.ReadTimeout):
+        client.post("feeds/x/data")
+    assert len(client.session.calls) == 1
+
+    client = _client([429, requests.ConnectTimeout("no route"), 200])
+    assert client.post("feeds/x/data").status_code == 200
+    assert len(client.session.calls) == 3
+
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = CircuitBreaker(threshold=3, reset_after=60)
+    for _ in range(3):
+        assert breaker.state == "closed"
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_open_client_fails_fast_without_calling_upstream():
+    client = _client([], breaker=CircuitBreaker(threshold=1, reset_after=60))
+    client.breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        client.get("feeds/temp")
+    assert client.session.calls == []
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(threshold=1, reset_after=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+
+    breaker.before_call()               # the trial
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()           # everyone else still fails fast
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker(threshold=1, reset_after=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
@@ -0,0 +1,106 @@
+# test_write_behind.py
+import datetime as dt
+import sqlite3
+import time
+
+import pytest
+from sqlalchemy import create_engine, event, func, select
+
+import migrations
+from models import EnvironmentData, MotionEvent
+from write_behind import WriteBehindBuffer
+
+T0 = dt.datetime(2026, 5, 1, 12, 0)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    migrations.migrate(engine)
+    yield engine
+    engine.dispose()
+
+
+def _env_row(i):
+    return {"timestamp": T0 + dt.timedelta(seconds=i), "temperature": 20.0, "humidity": 40.0, "pressure": 1000.0}
+
+
+def _count(engine, model):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(model)).scalar()
+
+
+def test_large_backlog_is_written_in_chunks(engine):
+    # 10000 rows x 4 columns: one statement would exceed SQLite's default
+    # 32766 parameters (some builds raise it, so put it back for the test)
+    @event.listens_for(engine, "connect")
+    def _default_limit(dbapi_conn, record):
+        dbapi_conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 32766)
+
+    engine.dispose()
+    buffer = WriteBehindBuffer(engine, max_batch=500, max_queue=10000)
+    for i in range(10000):
+        assert buffer.add(EnvironmentData, _env_row(i))
+
+    assert buffer.flush() == 10000
+    assert _count(engine, EnvironmentData) == 10000
+    assert buffer.depth == 0
+
+
+def test_on_flush_sees_every_row_of_each_table_in_the_transaction(engine):
+    seen = []
+    buffer = WriteBehindBuffer(engine, max_batch=2,
+                               on_flush=lambda conn, table, rows: seen.append((table.name, len(rows))))
+    for i in range(5):
+        buffer.add(EnvironmentData, _env_row(i))
+    buffer.add(MotionEvent, {"timestamp": T0})
+
+    assert buffer.flush() == 6
+    assert seen == [("environment_data", 5), ("motion_events", 1)]
+
+
+def test_full_batch_wakes_the_flusher(engine):
+    buffer = WriteBehindBuffer(engine, max_batch=10, max_delay=60)
+    buffer.start()
+    try:
+        for i in range(10):
+            buffer.add(EnvironmentData, _env_row(i))
+        deadline = time.monotonic() + 5
+        while buffer.written < 10 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert buffer.written == 10
+    finally:
+        buffer.stop()
+
+
+def test_stop_flushes_what_is_left(engine):
+    buffer = WriteBehindBuffer(engine, max_batch=100, max_delay=60)
+    buffer.start()
+    buffer.add(MotionEvent, {"timestamp": T0})
+    buffer.stop()
+    assert _count(engine, MotionEvent) == 1
+
+
+def test_queue_is_bounded(engine):
+    buffer = WriteBehindBuffer(engine, max_queue=3)
+    assert all(buffer.add(MotionEvent, {"timestamp": T0}) for _ in range(3))
+    assert not buffer.add(MotionEvent, {"timestamp": T0})
+    assert buffer.dropped == 1
+    assert buffer.depth == 3
+
+
+def test_failed_flush_keeps_the_rows_for_the_next_try(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'empty.db'}")   # no tables yet
+    buffer = WriteBehindBuffer(engine)
+    buffer.add(MotionEvent, {"timestamp": T0})
+    buffer.add(MotionEvent, {"timestamp": T0 + dt.timedelta(seconds=1)})
+
+    assert buffer.flush() == 0
+    assert buffer.failed_flushes == 1
+    assert buffer.depth == 2
+
+    migrations.migrate(engine)
+    assert buffer.flush() == 2
+    with engine.connect() as conn:
+        stamps = conn.execute(select(MotionEvent.timestamp).order_by(MotionEvent.id)).scalars().all()
+    assert stamps == [T0, T0 + dt.timedelta(seconds=1)]
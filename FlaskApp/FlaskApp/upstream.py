@@ -0,0 +1,148 @@
+# upstream.py
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker.
+
+    - closed: calls go through, failures are counted
+    - open: after `threshold` failures in a row, calls fail fast for `reset_after` seconds
+    - half-open: one trial call is let through; success closes, failure re-opens
+    """
+
+    def __init__(self, threshold=5, reset_after=30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now):
+        if self.opened_at is None:
+            return "closed"
+        if now - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "open" or (state == "half-open" and self.trial_in_flight):
+                raise CircuitOpenError("Adafruit IO circuit is open")
+            if state == "half-open":
+                self.trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    print(f"[UPSTREAM] Circuit opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+
+
+class AdafruitClient:
+    """
+    Shared HTTP client for the Adafruit IO REST API.
+
+    One pooled keep-alive session for the whole process, (connect, read)
+    timeouts on every call, bounded retries with full-jitter backoff on
+    429/5xx and connection errors, and a circuit breaker in front of it all.
+
+    Non-GET calls are only retried when the request surely did not reach
+    Adafruit (connect timeout, 429), so a slow POST is never sent twice.
+    """
+
+    def __init__(self, base_url, headers, connect_timeout=3.05, read_timeout=10.0,
+                 max_retries=2, backoff_base=0.25, backoff_cap=4.0,
+                 pool_size=10, breaker=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        self.session.headers.update({k: v for k, v in headers.items() if v is not None})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def request(self, method, path, **kwargs):
+        """
+        Returns the final `requests.Response` (which may still be a 4xx/5xx).
+        Raises CircuitOpenError when failing fast, or the last connection
+        error when every attempt failed without a response.
+        """
+        self.breaker.before_call()
+
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        kwargs.setdefault("timeout", self.timeout)
+        idempotent = method.upper() in ("GET", "HEAD", "OPTIONS")
+
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            try:
+                r = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                retryable = idempotent or isinstance(e, requests.ConnectTimeout)
+                if last or not retryable:
+                    self.breaker.record_failure()
+                    raise
+                self._sleep_backoff(attempt)
+                continue
+            except Exception:
+                self.breaker.record_failure()
+                raise
+
+            if r.status_code not in RETRY_STATUSES:
+                self.breaker.record_success()
+                return r
+
+            if last or (not idempotent and r.status_code != 429):
+                self.breaker.record_failure()
+                return r
+
+            self._sleep_backoff(attempt, r.headers.get("Retry-After"))
+
+    def _sleep_backoff(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_cap))
+            except ValueError:
+                pass
+        time.sleep(delay)
@@ -0,0 +1,119 @@
+# write_behind.py
+import collections
+import threading
+
+
+class WriteBehindBuffer:
+    """
+    Bounded write-behind queue for inserts.
+
+    add() only appends to memory. A flusher thread writes everything that
+    is pending in one transaction, as multi-row INSERTs of at most
+    `max_batch` rows (a backlog in one statement would go past SQLite's
+    bind-parameter limit), as soon as `max_batch` rows are waiting or
+    `max_delay` seconds passed.
+
+    - at most `max_queue` rows are held; beyond that new rows are dropped
+      (and counted) so memory can't grow without limit during a DB outage
+    - a failed flush puts the rows back in front of the queue for the next try
+    - stop() flushes what is left (call it on shutdown)
+
+    `on_flush(conn, table, rows)` runs inside the same transaction, after
+    the INSERT (used to keep the rollup tables in step).
+    """
+
+    def __init__(self, engine, max_batch=500, max_delay=5.0, max_queue=10000, on_flush=None):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.on_flush = on_flush
+
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+
+        self._pending = collections.deque()  # (table, row dict)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+    @property
+    def depth(self):
+        with self._lock:
+            return len(self._pending)
+
+    # ---------------------------------------------------------
+    def add(self, model, row):
+        """Queue one row for `model` (ORM class or Table). False if it was dropped."""
+        table = getattr(model, "__table__", model)
+
+        with self._lock:
+            if len(self._pending) >= self.max_queue:
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 100 == 0:
+                    print(f"[WRITE BEHIND] Queue full, {self.dropped} rows dropped so far")
+                return False
+            self._pending.append((table, row))
+            full = len(self._pending) >= self.max_batch
+
+        if full:
+            self._wake.set()
+        return True
+
+    def flush(self):
+        """Write everything pending now. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+                self._pending.clear()
+            if not batch:
+                return 0
+
+            by_table = collections.OrderedDict()
+            for table, row in batch:
+                by_table.setdefault(table, []).append(row)
+
+            try:
+                with self.engine.begin() as conn:
+                    for table, rows in by_table.items():
+                        for i in range(0, len(rows), self.max_batch):
+                            conn.execute(table.insert().values(rows[i:i + self.max_batch]))
+                        if self.on_flush is not None:
+                            self.on_flush(conn, table, rows)
+            except Exception as e:
+                self.failed_flushes += 1
+                print(f"[WRITE BEHIND] Flush of {len(batch)} rows failed:", e)
+                self._requeue(batch)
+                return 0
+
+            self.written += len(batch)
+            return len(batch)
+
+    def _requeue(self, batch):
+        with self._lock:
+            room = max(0, self.max_queue - len(self._pending))
+            keep = batch[:room]
+            self.dropped += len(batch) - len(keep)
+            self._pending.extendleft(reversed(keep))
+
+    # ---------------------------------------------------------
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.max_delay + 5)
+        self.flush()
+
+    def _run(self):
+        while self._running:
+            self._wake.wait(self.max_delay)
+            self._wake.clear()
+            self.flush()